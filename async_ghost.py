@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+异步幽灵键鼠模块 - subLD项目
+asyncio 接口：设备调用仍全部在 GhostMouse 的设备线程上执行，协程通过 asyncio.wrap_future 等待结果。
+定时点击由协程算好绝对时间后提前 lead 秒交给设备线程，准点由设备线程的自旋保证，
+因此事件循环的唤醒抖动不影响点击时间；同一轮事件循环中产生的点击合并为一批提交，
+成千上万个并发节奏只占用一个事件循环线程和一个设备线程。
+"""
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from device_metrics import LatencyHistogram
+from ghost_mouse import GhostMouse, get_ghost_mouse
+from clicker_log import get_logger
+
+logger = get_logger("async_ghost")
+
+
+class AsyncGhostMouse:
+    """GhostMouse 的 asyncio 封装"""
+
+    def __init__(self, ghost: Optional[GhostMouse] = None, lead: float = 0.005):
+        """
+        :param ghost: 使用的 GhostMouse 实例，默认为全局单例
+        :param lead: 定时点击提前交给设备线程的时间(秒)，需大于事件循环的唤醒抖动
+        """
+        self.ghost = ghost if ghost is not None else get_ghost_mouse()
+        if not isinstance(self.ghost, GhostMouse):
+            # 异步封装直接使用单台设备的设备线程和按键通道，设备池没有单一的设备线程
+            raise TypeError("AsyncGhostMouse 只支持单台 GhostMouse，不支持设备池")
+        self.lead_ns = int(lead * 1e9)
+        self._pending_items: List[Tuple[int, str, tuple]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self.batches = 0
+        self.scheduled = 0
+
+    # ==================== 连接 ====================
+
+    async def connect(self) -> bool:
+        """连接设备（设备线程启动在线程池中进行，不阻塞事件循环）"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.ghost.connect)
+
+    async def disconnect(self):
+        """断开设备（先提交尚未提交的定时点击）"""
+        self._flush()
+        await asyncio.get_running_loop().run_in_executor(None, self.ghost.disconnect)
+
+    @property
+    def is_connected(self) -> bool:
+        return self.ghost.check_connection()
+
+    # ==================== 设备调用 ====================
+
+    async def call(self, op: str, *args):
+        """
+        在设备线程上调用设备方法并等待结果
+        :param op: 设备方法名，如 "MoveTo"
+        :return: 设备方法返回值；未连接时返回None
+        """
+        if not self.ghost.check_connection():
+            return None
+        return await asyncio.wrap_future(self.ghost.engine.call(op, *args))
+
+    async def _call_ok(self, op: str, *args) -> bool:
+        try:
+            return await self.call(op, *args) == 1
+        except Exception as e:
+            logger.error("❌ 设备调用失败 (%s): %s", op, e)
+            return False
+
+    async def left_down(self) -> bool:
+        return await self._call_ok("LeftDown")
+
+    async def left_up(self) -> bool:
+        return await self._call_ok("LeftUp")
+
+    async def right_down(self) -> bool:
+        return await self._call_ok("RightDown")
+
+    async def right_up(self) -> bool:
+        return await self._call_ok("RightUp")
+
+    async def move_to(self, x: int, y: int) -> bool:
+        return await self._call_ok("MoveTo", x, y)
+
+    async def move_relative(self, dx: int, dy: int) -> bool:
+        return await self._call_ok("MoveR", dx, dy)
+
+    async def key_down(self, key: str) -> bool:
+        return await self._call_ok("KeyDown", key)
+
+    async def key_up(self, key: str) -> bool:
+        return await self._call_ok("KeyUp", key)
+
+    async def key_up_all(self) -> bool:
+        return await self._call_ok("KeyUpAll")
+
+    # ==================== 定时点击 ====================
+
+    def _flush(self):
+        """把本轮事件循环中累积的定时命令一次性交给设备线程"""
+        self._flush_handle = None
+        items = self._pending_items
+        if not items:
+            return
+        self._pending_items = []
+        engine = self.ghost.engine
+        if engine is not None:
+            engine.schedule_batch(items)
+            self.batches += 1
+            self.scheduled += len(items)
+
+    def schedule_click(self, due_ns: int = 0, button: str = "left") -> bool:
+        """
+        预约一次点击（不等待执行结果）
+        同一轮事件循环中的预约在本轮结束时合并提交，只唤醒设备线程一次。
+        :param due_ns: 按下时间（time.perf_counter_ns 时间基准），0 表示立即
+        :param button: "left"/"right"/"middle" 或按键名
+        :return: 成功预约返回True；未连接或之前的命令执行失败时返回False
+        """
+        ghost = self.ghost
+        if not ghost.check_connection() or ghost.engine.consume_errors():
+            return False
+        args = () if button in ("left", "right", "middle") else (button,)
+        self._pending_items.extend(ghost.button_channel(button).plan(args, due_ns))
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+        return True
+
+    async def sleep_until(self, due_ns: int):
+        """睡眠到指定时间（精度取决于事件循环，通常为毫秒级）"""
+        delay = (due_ns - time.perf_counter_ns()) / 1e9
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def click_at(self, due_ns: int, button: str = "left") -> bool:
+        """
+        在指定时间点击：提前 lead 醒来把命令交给设备线程，由设备线程准点执行
+        :return: 成功预约返回True
+        """
+        await self.sleep_until(due_ns - self.lead_ns)
+        return self.schedule_click(due_ns, button)
+
+    async def left_click(self) -> bool:
+        """立即点击左键并等待按下/松开执行完毕"""
+        if not self.ghost.check_connection():
+            return False
+        down, up = self.ghost.button_channel("left").plan()
+        engine = self.ghost.engine
+        futures = [engine.call_at(due_ns, op, *args) for due_ns, op, args in (down, up)]
+        try:
+            results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        except Exception as e:
+            logger.error("❌ 点击失败: %s", e)
+            return False
+        return all(result == 1 for result in results)
+
+    async def play_sequence(self, steps: Iterable[Tuple[float, str, tuple]], start_ns: int = 0):
+        """
+        按时间表执行设备命令序列
+        :param steps: (相对开始时间秒, 设备方法名, 参数元组) 序列，需按时间排序
+        :param start_ns: 开始时间，0 表示从现在起 lead 之后
+        """
+        base = start_ns or time.perf_counter_ns() + self.lead_ns
+        for offset, op, args in steps:
+            due_ns = base + int(offset * 1e9)
+            await self.sleep_until(due_ns - self.lead_ns)
+            self._pending_items.append((due_ns, op, tuple(args)))
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+
+class ClickPattern:
+    """一个周期性点击节奏的配置与统计"""
+
+    def __init__(self, interval: float, button: str = "left", count: int = 0,
+                 duration: float = 0.0):
+        """
+        :param interval: 点击间隔(秒)
+        :param button: "left"/"right"/"middle" 或按键名
+        :param count: 点击次数，0 表示不限
+        :param duration: 持续时间(秒)，0 表示不限
+        """
+        self.interval_ns = int(interval * 1e9)
+        self.button = button
+        self.count = count
+        self.duration_ns = int(duration * 1e9)
+        self.clicks = 0
+        self.skipped = 0
+        # 协程醒来时间相对 (点击时间 - lead) 的延迟，反映事件循环负载
+        self.wake_lateness = LatencyHistogram()
+
+
+class AsyncClickEngine:
+    """
+    异步连点引擎
+    每个节奏是一个协程：按绝对截止时间计算下一次点击，提前 lead 醒来并把点击预约给设备线程；
+    醒得太晚（已过点击时间）的时间槽直接跳过，不连续补发。
+    """
+
+    def __init__(self, ghost: AsyncGhostMouse):
+        self.ghost = ghost
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._patterns: Dict[int, ClickPattern] = {}
+        self._next_id = 1
+
+    def start(self, pattern: ClickPattern, delay: float = 0.0) -> int:
+        """
+        启动一个节奏
+        :return: 节奏ID
+        """
+        pattern_id = self._next_id
+        self._next_id += 1
+        self._patterns[pattern_id] = pattern
+        task = asyncio.get_running_loop().create_task(self._run(pattern, delay))
+        task.add_done_callback(lambda _: self._tasks.pop(pattern_id, None))
+        self._tasks[pattern_id] = task
+        return pattern_id
+
+    async def stop(self, pattern_id: int):
+        """停止一个节奏"""
+        task = self._tasks.pop(pattern_id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def stop_all(self):
+        """停止所有节奏"""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def wait(self, pattern_id: int):
+        """等待节奏结束（达到次数或时长）"""
+        task = self._tasks.get(pattern_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def get_stats(self) -> dict:
+        """所有节奏的点击数、跳过的时间槽和合并的唤醒延迟"""
+        wake = LatencyHistogram()
+        clicks = skipped = 0
+        for pattern in self._patterns.values():
+            clicks += pattern.clicks
+            skipped += pattern.skipped
+            wake.merge(pattern.wake_lateness)
+        return {
+            'patterns': len(self._patterns),
+            'running': len(self._tasks),
+            'clicks': clicks,
+            'skipped_slots': skipped,
+            'wake_lateness': wake.snapshot(),
+            'batches': self.ghost.batches,
+            'scheduled_commands': self.ghost.scheduled,
+        }
+
+    async def _run(self, pattern: ClickPattern, delay: float):
+        ghost = self.ghost
+        lead_ns = ghost.lead_ns
+        interval_ns = pattern.interval_ns
+        perf_counter_ns = time.perf_counter_ns
+        start_ns = perf_counter_ns() + lead_ns + int(delay * 1e9)
+        end_ns = start_ns + pattern.duration_ns if pattern.duration_ns else 0
+        slot = start_ns
+        while not pattern.count or pattern.clicks < pattern.count:
+            if end_ns and slot >= end_ns:
+                break
+            wake_ns = slot - lead_ns
+            now = perf_counter_ns()
+            if wake_ns > now:
+                await asyncio.sleep((wake_ns - now) / 1e9)
+                now = perf_counter_ns()
+            pattern.wake_lateness.record(max(0, now - wake_ns))
+            if now >= slot:
+                # 醒得太晚，跳到下一个未来的时间槽
+                missed = (now - slot) // interval_ns + 1
+                pattern.skipped += missed
+                slot += missed * interval_ns
+                continue
+            if not ghost.schedule_click(slot, pattern.button):
+                break
+            pattern.clicks += 1
+            slot += interval_ns
+
+
+# 测试代码
+if __name__ == "__main__":
+    import sys
+    from ghost_backends import SimulatedBackend
+
+    async def main(pattern_count: int, interval: float, seconds: float):
+        print(f"=== 异步连点测试 - subLD: {pattern_count} 个并发节奏, 间隔 {interval * 1000:.0f} ms ===")
+        backend = SimulatedBackend(log_size=2_000_000)
+        ghost = AsyncGhostMouse(GhostMouse(backend=backend, metrics_enabled=False))
+        await ghost.connect()
+        print("单次点击:", await ghost.left_click())
+
+        engine = AsyncClickEngine(ghost)
+        # 每个节奏使用独立的按键通道，设备命令日志可还原每个节奏的实际点击时间
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for i in range(pattern_count):
+            engine.start(ClickPattern(interval, button=f"K{i}", duration=seconds),
+                         delay=i * interval / pattern_count)
+        while engine.running:
+            await asyncio.sleep(0.1)
+        ghost.ghost.wait_idle(timeout=5)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        stats = engine.get_stats()
+
+        # 设备实际执行 KeyDown 的时间相对计划时间（节奏内相邻点击间隔）的偏差
+        per_key: Dict[str, List[int]] = {}
+        for start, op, args, ok in backend.device.log:
+            if op == "KeyDown":
+                per_key.setdefault(args[0], []).append(start)
+        jitter = LatencyHistogram()
+        interval_ns = int(interval * 1e9)
+        for times in per_key.values():
+            for a, b in zip(times, times[1:]):
+                # 跳过的时间槽不计入抖动：取与最近整数倍间隔的偏差
+                offset = (b - a) % interval_ns
+                jitter.record(min(offset, interval_ns - offset))
+        await ghost.disconnect()
+
+        wake = stats['wake_lateness']
+        jit = jitter.snapshot()
+        print(f"点击: {stats['clicks']}, 跳过时间槽: {stats['skipped_slots']}, "
+              f"批次: {stats['batches']} (平均每批 {stats['scheduled_commands'] / max(1, stats['batches']):.1f} 条命令)")
+        print(f"协程唤醒延迟: p50 {wake['p50_ms']:.3f} ms, p99 {wake['p99_ms']:.3f} ms")
+        print(f"设备点击间隔抖动: p50 {jit['p50_ms']:.3f} ms, p99 {jit['p99_ms']:.3f} ms, max {jit['max_ms']:.3f} ms")
+        print(f"CPU: {100 * cpu / wall:.1f}%")
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(main(count, interval=1.0, seconds=5.0))
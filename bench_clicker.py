@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+连点器吞吐量基准测试 - subLD项目
+使用模拟设备后端，在无硬件的环境下测量连点引擎 在不同目标速率下的
+实际CPS、点击间隔抖动分位数和CPU占用
+
+用法: python bench_clicker.py [--targets 1 10 100 1000] [--duration 3] [--latency 0.0002] [--devices 1]
+"""
+import argparse
+import json
+import time
+
+from device_pool import DevicePool
+from ghost_backends import SimulatedBackend, lognormal_latency
+from ghost_mouse import GhostMouse
+from click_engine import ClickEngine
+
+DEFAULT_TARGETS = (1, 10, 100, 1000)
+
+
+def percentile(sorted_values, q: float) -> float:
+    """线性插值分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def run_target(target_cps: float, duration: float, latency_median: float,
+               latency_sigma: float, min_clicks: int = 10, devices: int = 1) -> dict:
+    """
+    以指定目标速率运行一次连点并统计设备实际收到的按下事件
+    :param target_cps: 目标每秒点击次数
+    :param duration: 运行时长(秒)，低速率时自动延长以获得至少 min_clicks 次点击
+    :param latency_median: 模拟设备每次调用的延迟中位数(秒)
+    :param latency_sigma: 延迟对数正态分布的 sigma
+    :param devices: 模拟设备数量，大于1时通过设备池分摊点击
+    :return: 统计结果字典
+    """
+    latency = lognormal_latency(latency_median, latency_sigma) if latency_median > 0 else None
+    backends = [SimulatedBackend(latency=latency, seed=1 + i, log_size=1_000_000)
+                for i in range(devices)]
+    ghost = GhostMouse(backend=backends[0]) if devices == 1 else DevicePool(backends)
+    clicker = ClickEngine(interval=1.0 / target_cps, ghost=ghost)
+    run_time = max(duration, min_clicks / target_cps)
+
+    if not clicker.enable():
+        raise RuntimeError("模拟设备连接失败")
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    clicker.start_clicking()
+    time.sleep(run_time)
+    clicker.stop_clicking()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    ghost.wait_idle(timeout=2)
+    status = clicker.get_status()
+    clicker.disable()
+
+    # 以设备实际收到 LeftDown 的时间计算点击间隔（多设备时合并所有设备的日志）
+    downs = sorted(t for backend in backends for t, op, _, ok in backend.device.log
+                   if op == "LeftDown" and ok)
+    gaps = sorted((b - a) / 1e6 for a, b in zip(downs, downs[1:]))
+    achieved = (len(downs) - 1) * 1e9 / (downs[-1] - downs[0]) if len(downs) > 1 else 0.0
+    period_ms = 1000.0 / target_cps
+    return {
+        'target_cps': target_cps,
+        'devices': devices,
+        'achieved_cps': achieved,
+        'clicks': len(downs),
+        'gap_p50_ms': percentile(gaps, 0.50),
+        'jitter_p50_ms': percentile(sorted(abs(g - period_ms) for g in gaps), 0.50),
+        'jitter_p99_ms': percentile(sorted(abs(g - period_ms) for g in gaps), 0.99),
+        'jitter_max_ms': max((abs(g - period_ms) for g in gaps), default=0.0),
+        'skipped_slots': status['timing']['skipped_slots'],
+        'cpu_percent': 100.0 * cpu / wall if wall > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="subLD 连点器吞吐量基准测试（模拟设备）")
+    parser.add_argument("--targets", type=float, nargs="+", default=DEFAULT_TARGETS,
+                        help="目标CPS列表")
+    parser.add_argument("--duration", type=float, default=3.0, help="每个目标的运行时长(秒)")
+    parser.add_argument("--latency", type=float, default=0.0002,
+                        help="模拟设备调用延迟中位数(秒)，0表示无延迟")
+    parser.add_argument("--sigma", type=float, default=0.3, help="延迟对数正态分布的sigma")
+    parser.add_argument("--devices", type=int, default=1, help="模拟设备数量")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    results = [run_target(t, args.duration, args.latency, args.sigma, devices=args.devices) for t in args.targets]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    print("=== subLD 连点器基准测试（模拟设备） ===")
+    print(f"{'目标CPS':>8} {'实际CPS':>9} {'点击数':>7} {'抖动p50':>9} {'抖动p99':>9} "
+          f"{'抖动max':>9} {'跳过槽':>6} {'CPU%':>6}")
+    for r in results:
+        print(f"{r['target_cps']:>8.0f} {r['achieved_cps']:>9.1f} {r['clicks']:>7d} "
+              f"{r['jitter_p50_ms']:>8.3f}ms {r['jitter_p99_ms']:>8.3f}ms "
+              f"{r['jitter_max_ms']:>8.3f}ms {r['skipped_slots']:>6d} {r['cpu_percent']:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+COM方法绑定开销基准测试 - subLD项目
+用本地的假 IDispatch 对象（GetIDsOfNames/Invoke 行为与 PyIDispatch 一致）测量每次设备调用的额外开销，
+无需硬件和 pywin32:
+  late      每次 km.LeftDown() 都查属性、解析名称、经过动态包装（旧的热循环写法）
+  cached    设备线程缓存动态包装返回的方法（DeviceWorker._resolve），仍经过包装层
+  dispid    BoundDispatch：连接时解析 DISPID，每次直接调用 Invoke
+  worker    完整路径：GhostMouse.left_click() → 设备线程执行 LeftDown/LeftUp（动态包装 / DISPID 绑定）
+在 Windows 上指定 --progid 时另外测量真实设备的 late / early / dispid 三种绑定。
+
+用法: python bench_com.py [--calls 200000] [--progid kmclass.kmsoft] [--json]
+"""
+import argparse
+import json
+import time
+
+from ghost_backends import (BINDINGS, BoundDispatch, ComBackend, DEVICE_METHODS, DeviceBackend,
+                            DISPATCH_METHOD)
+
+
+class FakeOleObject:
+    """
+    假的 PyIDispatch：名称 → DISPID 表和按 DISPID 分派的 Invoke，方法本身不做任何事并返回1，
+    测得的时间全部是调用方式本身的开销
+    """
+
+    def __init__(self, methods=DEVICE_METHODS):
+        self._ids = {name.lower(): index + 1 for index, name in enumerate(methods)}
+        self.name_lookups = 0
+        self.invokes = 0
+
+    def GetIDsOfNames(self, name: str) -> int:
+        self.name_lookups += 1
+        try:
+            return self._ids[name.lower()]
+        except KeyError:
+            raise AttributeError(f"未知的COM方法: {name}") from None
+
+    def Invoke(self, dispid: int, lcid: int, flags: int, result_wanted: bool, *args):
+        self.invokes += 1
+        return 1
+
+
+class FakeLateDispatch:
+    """
+    模拟 win32com.client.dynamic.CDispatch（无类型信息）：每次属性访问都解析名称并生成一个包装方法，
+    调用时把参数交给 Invoke
+    """
+
+    def __init__(self, oleobj: FakeOleObject):
+        self.__dict__['_oleobj_'] = oleobj
+
+    def __getattr__(self, name: str):
+        oleobj = self._oleobj_
+        dispid = oleobj.GetIDsOfNames(name)
+
+        def method(*args):
+            return oleobj.Invoke(dispid, 0, DISPATCH_METHOD, True, *args)
+        return method
+
+
+class FakeComBackend(DeviceBackend):
+    """用假 IDispatch 代替COM组件的后端，按绑定方式返回动态包装或 BoundDispatch"""
+
+    name = "fake-com"
+
+    def __init__(self, binding: str = "dispid"):
+        """
+        :param binding: "dynamic"（模拟动态 Dispatch）或 "dispid"（BoundDispatch）
+        """
+        self.binding = binding
+
+    def open(self):
+        oleobj = FakeOleObject()
+        return FakeLateDispatch(oleobj) if self.binding == "dynamic" else BoundDispatch(oleobj)
+
+
+def per_call_ns(fn, calls: int) -> float:
+    """重复调用 fn 并返回平均每次耗时(ns)"""
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter_ns() - start) / calls
+
+
+def bench_fake(calls: int) -> dict:
+    """假 IDispatch 上三种调用方式的每次耗时(ns)"""
+    late = FakeLateDispatch(FakeOleObject())
+    cached_method = late.LeftDown
+    bound = BoundDispatch(FakeOleObject())
+    lookups_before = bound._oleobj_.name_lookups
+    result = {
+        'late': per_call_ns(lambda: late.LeftDown(), calls),
+        'cached': per_call_ns(cached_method, calls),
+        'dispid': per_call_ns(bound.LeftDown, calls),
+    }
+    # 预绑定后调用不再解析名称
+    assert bound._oleobj_.name_lookups == lookups_before
+    return result
+
+
+def bench_worker(binding: str, clicks: int) -> float:
+    """完整路径：每次 left_click() 的平均耗时(ns)，直到设备线程执行完所有按下/松开"""
+    from ghost_mouse import GhostMouse
+    ghost = GhostMouse(hold=0.0, backend=FakeComBackend(binding), metrics_enabled=False)
+    ghost.connect()
+    try:
+        start = time.perf_counter_ns()
+        for _ in range(clicks):
+            ghost.left_click()
+        ghost.wait_idle(timeout=60)
+        return (time.perf_counter_ns() - start) / clicks
+    finally:
+        ghost.disconnect()
+
+
+def bench_real(progid: str, calls: int) -> dict:
+    """真实设备上各绑定方式的 LeftUp 每次耗时(ns)（需 Windows 和 pywin32，调用会发给设备）"""
+    result = {}
+    for binding in BINDINGS:
+        device = ComBackend(progid, binding=binding).open()
+        method = device.LeftUp
+        result[binding] = per_call_ns(method, calls)
+        result[binding + '_lookup'] = per_call_ns(lambda: device.LeftUp(), calls)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="subLD COM方法绑定开销基准测试")
+    parser.add_argument("--calls", type=int, default=200000, help="每种方式的调用次数")
+    parser.add_argument("--progid", default=None, help="同时测量真实设备（Windows，调用会发给设备）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args(argv)
+
+    result = {'fake': bench_fake(args.calls)}
+    clicks = max(1000, args.calls // 20)
+    result['worker'] = {binding: bench_worker(binding, clicks) for binding in ("dynamic", "dispid")}
+    if args.progid:
+        result['real'] = bench_real(args.progid, max(100, args.calls // 100))
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0
+    fake = result['fake']
+    print("=== COM方法绑定开销 - subLD ===")
+    print(f"假 IDispatch，每次调用（{args.calls} 次）:")
+    print(f"  late   (每次查属性+解析名称)  {fake['late']:8.0f} ns")
+    print(f"  cached (缓存动态包装方法)     {fake['cached']:8.0f} ns")
+    print(f"  dispid (预绑定 Invoke)        {fake['dispid']:8.0f} ns   "
+          f"比 late 少 {fake['late'] - fake['dispid']:.0f} ns/次")
+    worker = result['worker']
+    print(f"完整路径 left_click()（{clicks} 次，含设备线程执行按下/松开）:")
+    print(f"  dynamic {worker['dynamic']:8.0f} ns/次")
+    print(f"  dispid  {worker['dispid']:8.0f} ns/次")
+    if 'real' in result:
+        print(f"真实设备 {args.progid}（LeftUp）:")
+        for binding in BINDINGS:
+            print(f"  {binding:<6} 缓存方法 {result['real'][binding]:10.0f} ns, "
+                  f"每次查属性 {result['real'][binding + '_lookup']:10.0f} ns")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
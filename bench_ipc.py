@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+本地控制接口往返延迟基准测试 - subLD项目
+在后台线程中运行控制服务（模拟设备），用本地客户端测量:
+逐条请求的往返延迟分位数、流水线请求吞吐量、批量请求吞吐量
+
+用法: python bench_ipc.py [--requests 5000] [--depth 32] [--tcp] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+from control_client import ControlClient
+from control_server import ControlServer, USE_UNIX_SOCKET, create_engine
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def start_server_thread(use_unix_socket: bool):
+    """
+    在独立线程的事件循环中启动控制服务
+    :return: (已开始监听的服务, 服务所在的事件循环)
+    """
+    engine = create_engine("sim")
+    engine.enable()
+    directory = tempfile.mkdtemp(prefix="subld_bench_")
+    server = ControlServer(engine, path=os.path.join(directory, "bench.sock"), port=0,
+                           use_unix_socket=use_unix_socket, token_path=os.path.join(directory, "bench.token"))
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    def run():
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+        loop.run_until_complete(server.stop())
+        loop.close()
+
+    threading.Thread(target=run, name="subLD-bench-server", daemon=True).start()
+    ready.wait()
+    return server, loop
+
+
+async def run_client(server: ControlServer, requests: int, depth: int) -> dict:
+    client = ControlClient()
+    await client.connect(path=server.path, port=server.port, use_unix_socket=server.use_unix_socket,
+                         token=server.token)
+    async with client:
+        for _ in range(200):
+            await client.ping()
+
+        # 逐条请求：等待响应后再发下一条
+        rtts = []
+        for _ in range(requests):
+            start = time.perf_counter_ns()
+            await client.ping()
+            rtts.append((time.perf_counter_ns() - start) / 1000)
+        rtts.sort()
+
+        # 流水线：保持 depth 个请求同时在途
+        start = time.perf_counter()
+        for _ in range(requests // depth):
+            await asyncio.gather(*(client.ping() for _ in range(depth)))
+        pipelined = (requests // depth) * depth / (time.perf_counter() - start)
+
+        # 批量：每帧 depth 条命令
+        start = time.perf_counter()
+        batch = [("ping", {})] * depth
+        for _ in range(requests // depth):
+            await client.batch(batch)
+        batched = (requests // depth) * depth / (time.perf_counter() - start)
+
+        # 订阅：开始连点后收到第一条进度推送的延迟
+        await client.subscribe(rate_hz=100)
+        await client.set_interval(0.01)
+        start = time.perf_counter()
+        await client.start()
+        while True:
+            event, data = await client.events.get()
+            if event == "progress" and data["click_count"] > 0:
+                break
+        first_progress_ms = (time.perf_counter() - start) * 1000
+        await client.stop()
+
+    return {
+        'transport': 'unix' if server.use_unix_socket else 'tcp',
+        'requests': requests,
+        'rtt_p50_us': percentile(rtts, 0.50),
+        'rtt_p99_us': percentile(rtts, 0.99),
+        'rtt_max_us': rtts[-1],
+        'pipelined_rps': pipelined,
+        'batched_cps': batched,
+        'depth': depth,
+        'first_progress_ms': first_progress_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="subLD 本地控制接口基准测试")
+    parser.add_argument("--requests", type=int, default=5000, help="每项请求数")
+    parser.add_argument("--depth", type=int, default=32, help="流水线深度/每批命令数")
+    parser.add_argument("--tcp", action="store_true", help="强制使用TCP回环")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    server, loop = start_server_thread(USE_UNIX_SOCKET and not args.tcp)
+    try:
+        result = asyncio.run(run_client(server, args.requests, args.depth))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        server.engine.disable()
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+    print(f"=== subLD 控制接口基准测试 ({result['transport']}) ===")
+    print(f"往返延迟: p50 {result['rtt_p50_us']:.0f} us, p99 {result['rtt_p99_us']:.0f} us, "
+          f"max {result['rtt_max_us']:.0f} us")
+    print(f"流水线 (深度 {result['depth']}): {result['pipelined_rps']:.0f} 请求/秒")
+    print(f"批量 (每帧 {result['depth']} 条): {result['batched_cps']:.0f} 命令/秒")
+    print(f"开始连点到第一条进度推送: {result['first_progress_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准测试 - subLD项目
+在全新的子进程中分别测量无界面引擎路径和Qt界面路径的导入耗时，以及从进程启动到第一次点击的耗时
+（使用模拟设备后端，无需硬件）
+
+用法: python bench_startup.py [--runs 5] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 子进程脚本：导入指定模块，输出导入耗时(ms)
+IMPORT_SCRIPT = """
+import time
+t0 = time.perf_counter_ns()
+import {module}
+print((time.perf_counter_ns() - t0) / 1e6)
+"""
+
+# 子进程脚本：从解释器开始执行到模拟设备收到第一次 LeftDown 的耗时(ms)
+FIRST_CLICK_SCRIPT = """
+import time
+t0 = time.perf_counter_ns()
+import threading
+{setup}
+from ghost_backends import SimulatedBackend
+from ghost_mouse import GhostMouse
+backend = SimulatedBackend()
+engine = {engine_cls}(interval=0.01, ghost=GhostMouse(backend=backend))
+engine.enable()
+engine.start_clicking()
+while True:
+    device = backend.device
+    if device is not None and device.log:
+        first_ns = device.log[0][0]
+        break
+    time.sleep(0.0005)
+engine.disable()
+print((first_ns - t0) / 1e6)
+"""
+
+HEADLESS_SETUP = "from click_engine import ClickEngine"
+QT_SETUP = ("from PySide6.QtCore import QCoreApplication\n"
+            "app = QCoreApplication([])\n"
+            "from mouse_auto_clicker import MouseAutoClicker")
+
+CASES = (
+    ("import click_engine", IMPORT_SCRIPT.format(module="click_engine")),
+    ("import mouse_auto_clicker", IMPORT_SCRIPT.format(module="mouse_auto_clicker")),
+    ("import mouse_clicker_widget", IMPORT_SCRIPT.format(module="mouse_clicker_widget")),
+    ("first click (ClickEngine)", FIRST_CLICK_SCRIPT.format(setup=HEADLESS_SETUP, engine_cls="ClickEngine")),
+    ("first click (MouseAutoClicker)", FIRST_CLICK_SCRIPT.format(setup=QT_SETUP, engine_cls="MouseAutoClicker")),
+)
+
+
+def run_case(script: str, runs: int) -> dict:
+    """
+    在新进程中重复运行脚本，统计输出的耗时
+    :return: {'min_ms', 'median_ms', 'process_ms'}，依赖缺失时返回 {'error': ...}
+    """
+    import time
+    values = []
+    process_ms = []
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", script], cwd=HERE, env=env,
+                              capture_output=True, text=True)
+        process_ms.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'error': lines[-1] if lines else f"exit {proc.returncode}"}
+        values.append(float(proc.stdout.strip().splitlines()[-1]))
+    values.sort()
+    process_ms.sort()
+    return {
+        'min_ms': values[0],
+        'median_ms': values[len(values) // 2],
+        'process_ms': process_ms[len(process_ms) // 2],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="subLD 启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每项运行次数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    results = {name: run_case(script, args.runs) for name, script in CASES}
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    print("=== subLD 启动耗时基准测试（模拟设备） ===")
+    print(f"{'项目':<32} {'最小':>9} {'中位数':>9} {'进程总耗时':>10}")
+    for name, r in results.items():
+        if 'error' in r:
+            print(f"{name:<32} 跳过: {r['error']}")
+            continue
+        print(f"{name:<32} {r['min_ms']:>7.1f}ms {r['median_ms']:>7.1f}ms {r['process_ms']:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
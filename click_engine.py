@@ -0,0 +1,604 @@
+# -*- coding: utf-8 -*-
+"""
+连点引擎模块 - subLD项目
+不依赖Qt的连点核心：常驻连点线程、截止时间调度、进度合并发布，状态变化通过观察者回调通知。
+图形界面使用 mouse_auto_clicker.MouseAutoClicker（把回调转为Qt信号），
+脚本和命令行（clicker_cli.py）直接使用本模块，无需导入PySide6。
+"""
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, Tuple
+from ghost_mouse import get_ghost_mouse
+from click_timing import DeadlineScheduler, MISS_POLICY_SKIP, MISS_POLICIES
+from progress import ProgressPublisher, ProgressSnapshot
+from device_metrics import LatencyHistogram
+from perf_rings import DashboardMetrics
+from clicker_log import get_logger, get_stats as get_log_stats
+from rate_controller import AdaptiveRateController, CLICK_OPS
+from reconnect import NotificationThrottle, ReconnectSupervisor
+from clicker_state import (ClickerStateMachine, STATE_DISABLED, STATE_READY, STATE_CLICKING,
+                           STATE_STOPPING)
+
+logger = get_logger("click_engine")
+
+# 调度模式
+SCHEDULE_DEADLINE = "deadline"  # 绝对截止时间调度（无漂移）
+SCHEDULE_SLEEP = "sleep"        # 旧方式：每次点击后睡眠固定间隔
+
+
+# 引擎事件名及回调参数
+EVENT_STATUS_CHANGED = "status_changed"            # (是否在连点: bool)
+EVENT_CLICK_COUNT_CHANGED = "click_count_changed"  # (点击次数: int)，合并发布，非每次点击
+EVENT_PROGRESS_CHANGED = "progress_changed"        # (进度快照: ProgressSnapshot)
+EVENT_ERROR_OCCURRED = "error_occurred"            # (错误信息: str)，连点期间的错误经过限流合并
+EVENT_DEVICE_STATE_CHANGED = "device_state_changed"  # (设备状态: str)，见 reconnect.DEVICE_*
+EVENTS = (EVENT_STATUS_CHANGED, EVENT_CLICK_COUNT_CHANGED, EVENT_PROGRESS_CHANGED, EVENT_ERROR_OCCURRED,
+          EVENT_DEVICE_STATE_CHANGED)
+
+# 最小点击间隔(秒)；自适应模式下设定值只是速率上限，实际间隔由控制器按设备能力放慢，可以设得更小
+MIN_INTERVAL = 0.01
+MIN_ADAPTIVE_INTERVAL = 0.001
+
+
+class ClickEngine:
+    """
+    连点引擎（使用幽灵键鼠，不依赖Qt）
+    回调在产生事件的线程（连点线程或进度发布线程）中同步调用，应尽快返回；
+    订阅列表以元组保存，发布时无需加锁。
+    """
+    
+    def __init__(self, interval=0.1, schedule_mode=SCHEDULE_DEADLINE,
+                 miss_policy=MISS_POLICY_SKIP, progress_rate_hz=30.0, ghost=None, auto_reconnect=True):
+        """
+        初始化连点引擎
+        :param interval: 点击间隔时间(秒)，默认0.1秒
+        :param schedule_mode: 调度模式，"deadline"(默认) 或 "sleep"
+        :param miss_policy: 截止时间调度下错过时间槽的策略，"skip" 或 "catch_up"
+        :param progress_rate_hz: 进度信号的最大发布频率(Hz)
+        :param ghost: 使用的 GhostMouse 实例（或 device_pool.DevicePool 多设备池），默认为全局单例
+        :param auto_reconnect: 点击失败时是否自动重连设备并继续连点（否则结束本次连点）
+        """
+        self._observers: Dict[str, Tuple[Callable, ...]] = {event: () for event in EVENTS}
+        self._observers_lock = threading.Lock()
+        self.interval = interval
+        # 调用方设定的间隔（未按最小间隔截断），切换自适应模式时重新截断
+        self.requested_interval = interval
+        self.schedule_mode = schedule_mode
+        self.scheduler = DeadlineScheduler(interval, miss_policy=miss_policy)
+        # 间隔分布（interval_profiles），None 表示固定间隔
+        self.interval_profile = None
+        # 自适应速率控制器，None 表示按设定间隔点击；启用时实际间隔为 effective_interval
+        self.rate_controller = None
+        self.effective_interval = interval
+        # 连点器状态（disabled/ready/clicking/stopping），所有线程都通过状态机原子地转换
+        self.state = ClickerStateMachine()
+        # 启用/禁用（连接/断开设备）串行执行
+        self._lifecycle_lock = threading.Lock()
+        
+        # 常驻连点线程，由触发事件（按下/松开）驱动，不再每次按下创建新线程
+        self.click_thread = None
+        self._worker_running = False
+        self._triggers = deque()
+        self._trigger_event = threading.Event()
+        # 按下到第一次点击的延迟
+        self.trigger_latency = LatencyHistogram()
+        self.last_trigger_latency_ms = 0.0
+        # 计数只由点击线程写入，其他线程只读，无需加锁
+        self.click_count = 0
+        self.error_count = 0
+        # 单次会话的点击次数上限，0 表示不限
+        self.click_limit = 0
+        
+        # 进度按固定频率合并发布，避免每次点击都向GUI投递事件
+        self.publisher = ProgressPublisher(self._read_counters, self._publish_progress,
+                                           rate_hz=progress_rate_hz)
+        # 仪表盘曲线（CPS、间隔抖动、设备延迟），每次发布进度时采样一次
+        self.dashboard = DashboardMetrics()
+        
+        # 获取幽灵键鼠实例
+        self.ghost = ghost if ghost is not None else get_ghost_mouse()
+        
+        # 设备失败时的重连监督器，None 表示失败即结束连点
+        self.reconnect = None
+        if auto_reconnect:
+            self.set_auto_reconnect(True)
+        # 连点期间的错误通知合并发布，设备反复失败时不会连续弹窗
+        self.error_throttle = NotificationThrottle(
+            lambda message: self._emit(EVENT_ERROR_OCCURRED, message), min_interval=5.0)
+    
+    @property
+    def is_enabled(self) -> bool:
+        """是否已启用连点功能"""
+        return self.state.state != STATE_DISABLED
+    
+    @property
+    def is_clicking(self) -> bool:
+        """是否处于连点会话中（包括正在收尾）"""
+        return self.state.is_in(STATE_CLICKING, STATE_STOPPING)
+    
+    # ==================== 观察者 ====================
+    
+    def subscribe(self, event: str, callback: Callable) -> Callable:
+        """
+        订阅引擎事件
+        :param event: 事件名，见 EVENTS
+        :param callback: 回调函数，参数见各事件说明
+        :return: callback，便于之后取消订阅
+        """
+        if event not in self._observers:
+            raise ValueError(f"未知的引擎事件: {event}")
+        with self._observers_lock:
+            self._observers[event] = self._observers[event] + (callback,)
+        return callback
+    
+    def unsubscribe(self, event: str, callback: Callable):
+        """取消订阅引擎事件"""
+        with self._observers_lock:
+            self._observers[event] = tuple(cb for cb in self._observers.get(event, ()) if cb != callback)
+    
+    def _emit(self, event: str, *args):
+        """通知订阅者，单个回调出错不影响其他回调和连点线程"""
+        for callback in self._observers[event]:
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error("❌ 事件回调出错 (%s): %s", event, e)
+    
+    def enable(self) -> bool:
+        """
+        启用连点器（连接幽灵键鼠）
+        :return: 成功返回True
+        """
+        with self._lifecycle_lock:
+            if self.is_enabled:
+                return True
+            
+            # 连接幽灵键鼠
+            if not self.ghost.connect():
+                error_msg = "无法连接幽灵键鼠设备，请检查:\n1. 硬件是否已插入\n2. 驱动是否已安装\n3. 是否以管理员权限运行"
+                self._emit(EVENT_ERROR_OCCURRED, error_msg)
+                return False
+            self.publisher.start()
+            self._start_worker()
+            if self.reconnect is not None:
+                self.reconnect.set_connected()
+            self.state.transition(STATE_DISABLED, STATE_READY)
+            logger.info("✅ 连点器已启用")
+            return True
+    
+    def disable(self):
+        """禁用连点器"""
+        with self._lifecycle_lock:
+            if not self.is_enabled:
+                return
+            
+            # 停止当前连点和连点线程：等待均可被打断，连点线程立即收尾（由它松开左键）
+            self._request_stop()
+            self._stop_worker()
+            if not self.state.transition(STATE_READY, STATE_DISABLED):
+                if not self.state.wait_for(STATE_READY, timeout=1.0):
+                    logger.warning("⚠️ 连点线程未按时结束，强制禁用")
+                self.state.transition((STATE_READY, STATE_STOPPING), STATE_DISABLED)
+            
+            # 断开幽灵键鼠
+            self.ghost.disconnect()
+            self.publisher.stop()
+            logger.info("🔌 连点器已禁用")
+    
+    def start_clicking(self):
+        """开始连点（不阻塞，由常驻连点线程执行）"""
+        if not self.is_enabled:
+            self._emit(EVENT_ERROR_OCCURRED, "连点器未启用，请先点击【启用连点】")
+            return
+        self.on_trigger(True)
+    
+    def stop_clicking(self):
+        """停止连点（不阻塞，连点线程立即被唤醒，松开左键后回到 ready 状态）"""
+        self.on_trigger(False)
+    
+    def wait_stopped(self, timeout: float = None) -> bool:
+        """
+        等待当前连点会话结束（回到 ready 或 disabled）
+        :return: 已结束返回True，超时返回False
+        """
+        return self.state.wait_for((STATE_READY, STATE_DISABLED), timeout)
+    
+    def _request_stop(self):
+        """请求结束连点会话（任何线程都可调用），并唤醒连点线程"""
+        self.state.transition(STATE_CLICKING, STATE_STOPPING)
+        self._trigger_event.set()
+    
+    def on_trigger(self, pressed: bool, timestamp_ns: int = 0):
+        """
+        触发事件入口，可直接在输入钩子回调中调用
+        只追加一条带时间戳的事件并唤醒连点线程，耗时在微秒级，不会阻塞钩子
+        :param pressed: True 表示按下（开始连点），False 表示松开（停止连点）
+        :param timestamp_ns: 事件时间戳（time.perf_counter_ns），默认取当前时间
+        """
+        self._triggers.append((timestamp_ns or time.perf_counter_ns(), pressed))
+        self._trigger_event.set()
+    
+    def on_listener_event(self, pressed: bool, timestamp_ns: int = 0):
+        """
+        鼠标监听器收到的左键事件入口
+        幽灵键鼠发出的点击也会被监听器看到，先与合成事件记录匹配，只有真实用户输入才作为触发
+        :param pressed: True 为按下，False 为松开
+        :param timestamp_ns: 监听器收到事件的时间（time.perf_counter_ns），默认取当前时间
+        """
+        timestamp_ns = timestamp_ns or time.perf_counter_ns()
+        if self.ghost.synthetic_filter.is_synthetic("left", pressed, timestamp_ns):
+            return
+        self.on_trigger(pressed, timestamp_ns)
+    
+    # ==================== 常驻连点线程 ====================
+    
+    def _start_worker(self):
+        """启动常驻连点线程"""
+        if self.click_thread and self.click_thread.is_alive():
+            return
+        self._triggers.clear()
+        self._trigger_event.clear()
+        self._worker_running = True
+        self.click_thread = threading.Thread(target=self._worker_main, name="subLD-clicker",
+                                             daemon=True)
+        self.click_thread.start()
+    
+    def _stop_worker(self):
+        """停止常驻连点线程"""
+        self._worker_running = False
+        self._trigger_event.set()
+        if self.click_thread and self.click_thread is not threading.current_thread():
+            self.click_thread.join(timeout=1)
+        self.click_thread = None
+    
+    def _drain_triggers(self, armed: bool):
+        """
+        取出所有待处理的触发事件，最后一个事件决定最终状态
+        :param armed: 当前状态
+        :return: (最终状态, 最后一次按下的时间戳ns)
+        """
+        press_ns = 0
+        triggers = self._triggers
+        while triggers:
+            timestamp_ns, pressed = triggers.popleft()
+            armed = pressed
+            if pressed:
+                press_ns = timestamp_ns
+        return armed, press_ns
+    
+    def _worker_main(self):
+        """常驻连点线程：等待按下事件，按下后运行一次连点会话"""
+        while self._worker_running:
+            self._trigger_event.wait()
+            self._trigger_event.clear()
+            armed, press_ns = self._drain_triggers(False)
+            if armed and self._worker_running:
+                self._run_session(press_ns)
+    
+    def _run_session(self, press_ns: int):
+        """
+        连点会话：从按下开始，到松开、出错或连点器禁用为止
+        :param press_ns: 触发本次会话的按下事件时间戳
+        """
+        if not self.state.transition(STATE_READY, STATE_CLICKING):
+            return
+        self.click_count = 0
+        self.error_count = 0
+        self.publisher.reset()
+        self.dashboard.start_session()
+        self._emit(EVENT_STATUS_CHANGED, True)
+        logger.info("🖱️ 开始连点...")
+        if self.rate_controller is not None:
+            self.rate_controller.start()
+        
+        if self.schedule_mode == SCHEDULE_DEADLINE:
+            self._deadline_click_loop(press_ns)
+        else:
+            self._sleep_click_loop(press_ns)
+        
+        # 会话结束：确保左键松开，发布最终计数（只有连点线程发出松开，不与正在进行的点击竞争）
+        self.state.transition(STATE_CLICKING, STATE_STOPPING)
+        self.ghost.left_up()
+        self.publisher.publish_now()
+        self.error_throttle.flush()
+        self.state.transition(STATE_STOPPING, STATE_READY)
+        self._emit(EVENT_STATUS_CHANGED, False)
+        logger.info("⏹️ 停止连点，共点击 %d 次", self.click_count)
+    
+    def _check_release(self) -> bool:
+        """
+        处理会话期间到达的触发事件
+        :return: 需要停止连点时返回True
+        """
+        if self._trigger_event.is_set():
+            self._trigger_event.clear()
+            armed, _ = self._drain_triggers(True)
+            if not armed:
+                self._request_stop()
+        if self.click_limit and self.click_count >= self.click_limit:
+            self._request_stop()
+        return self.state.state != STATE_CLICKING or not self._worker_running
+    
+    def _record_trigger_latency(self, press_ns: int):
+        """记录从按下事件到第一次点击发出的延迟"""
+        latency_ns = time.perf_counter_ns() - press_ns
+        self.trigger_latency.record(latency_ns)
+        self.last_trigger_latency_ms = latency_ns / 1e6
+    
+    def _click_once(self) -> bool:
+        """
+        执行一次点击并更新计数
+        :return: 成功返回True，失败时发出错误信号并返回False
+        """
+        controller = self.rate_controller
+        if self.ghost.left_click():
+            self.click_count += 1
+            self.dashboard.on_click(time.perf_counter_ns())
+            if controller is not None:
+                controller.on_click()
+            return True
+        # 点击失败，可能设备断开
+        self.error_count += 1
+        if controller is not None and self.ghost.is_connected and controller.on_failure():
+            # 自适应模式：偶发失败视为过载，降速后继续
+            return True
+        if self.reconnect is not None:
+            return self._recover()
+        self.error_throttle.submit("点击失败，幽灵键鼠可能断开连接")
+        return False
+
+    def _recover(self) -> bool:
+        """
+        点击失败后检查设备，必要时在连点线程中按退避间隔重连，会话的计数和调度保持不变
+        :return: 可以继续连点返回True
+        """
+        supervisor = self.reconnect
+        transient = supervisor.transient_failures
+        notify_reconnecting = lambda: self.error_throttle.submit("幽灵键鼠连接中断，正在后台重连...")
+        if supervisor.recover(self._check_release, wake=self._trigger_event, on_reconnecting=notify_reconnecting):
+            if supervisor.transient_failures != transient:
+                self.error_throttle.submit("点击失败（设备仍在线），已继续连点")
+                return True
+            logger.info("✅ 幽灵键鼠已重连，中断 %.0f ms，继续连点", supervisor.last_downtime_ms)
+            if self.rate_controller is not None:
+                self.rate_controller.start()
+            return True
+        if self.state.state == STATE_CLICKING and self._worker_running:
+            self.error_throttle.submit("幽灵键鼠重连失败，连点已停止")
+        return False
+
+    def _read_counters(self):
+        """读取 (点击次数, 失败次数)，供进度发布线程调用"""
+        return self.click_count, self.error_count
+
+    def _publish_progress(self, snapshot: ProgressSnapshot):
+        """发布进度快照（在发布线程中调用）"""
+        self.dashboard.sample(snapshot.cps, self.ghost.get_call_totals(CLICK_OPS))
+        self._emit(EVENT_PROGRESS_CHANGED, snapshot)
+        self._emit(EVENT_CLICK_COUNT_CHANGED, snapshot.click_count)
+
+    def _deadline_click_loop(self, press_ns: int):
+        """按绝对截止时间点击，周期不受点击耗时影响"""
+        scheduler = self.scheduler
+        scheduler.start()
+        first = True
+        while not self._check_release():
+            try:
+                if scheduler.wait_next(self._trigger_event) is None:
+                    # 等待被触发事件打断，回到循环开头处理
+                    continue
+                if self._check_release():
+                    break
+                if not self._click_once():
+                    break
+                if first:
+                    self._record_trigger_latency(press_ns)
+                    first = False
+            except Exception as e:
+                self.error_count += 1
+                logger.error("❌ 连点出错: %s", e)
+                self.error_throttle.submit(f"连点出错: {str(e)}")
+                break
+
+    def _sleep_click_loop(self, press_ns: int):
+        """旧方式：点击后睡眠固定间隔（实际周期 = 间隔 + 点击耗时）"""
+        first = True
+        while not self._check_release():
+            try:
+                # 使用幽灵键鼠执行点击
+                if not self._click_once():
+                    break
+                if first:
+                    self._record_trigger_latency(press_ns)
+                    first = False
+                
+                # 等待间隔时间，松开/禁用时立即被唤醒
+                profile = self.interval_profile
+                delay = self.effective_interval if profile is None else profile.next_ns() / 1e9
+                deadline = time.perf_counter() + delay
+                while not self._check_release():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._trigger_event.wait(remaining)
+                
+            except Exception as e:
+                self.error_count += 1
+                logger.error("❌ 连点出错: %s", e)
+                self.error_throttle.submit(f"连点出错: {str(e)}")
+                break
+    
+    def set_interval(self, interval: float):
+        """
+        设置点击间隔
+        :param interval: 间隔时间(秒)，最小值为 MIN_INTERVAL，自适应模式下为 MIN_ADAPTIVE_INTERVAL
+        """
+        self.requested_interval = interval
+        self.interval = self._clamp_interval(interval)
+        if self.rate_controller is None:
+            self._apply_interval(self.interval)
+        else:
+            # 自适应模式下设定值作为速率上限
+            self.rate_controller.set_target(self.interval)
+        # 唤醒连点线程，按新间隔重新等待（不必等完旧的间隔）
+        if self.is_clicking:
+            self._trigger_event.set()
+        logger.debug("⏱️ 点击间隔已设置为: %s秒", self.interval)
+    
+    def _clamp_interval(self, interval: float) -> float:
+        """按当前模式截断到最小间隔"""
+        return max(MIN_ADAPTIVE_INTERVAL if self.rate_controller is not None else MIN_INTERVAL, interval)
+    
+    def _apply_interval(self, interval: float):
+        """把实际点击间隔写入调度器（自适应控制器在连点线程中调用）"""
+        self.effective_interval = interval
+        self.scheduler.set_interval(interval)
+    
+    def set_adaptive_rate(self, enabled: bool = True, **params):
+        """
+        开启/关闭自适应速率控制：按设备实际能力自动调整间隔，设定的间隔作为速率上限
+        :param enabled: 是否开启
+        :param params: AdaptiveRateController 的参数（window、decrease、max_utilization 等）
+        """
+        if enabled:
+            self.interval = max(MIN_ADAPTIVE_INTERVAL, self.requested_interval)
+            self.rate_controller = AdaptiveRateController(self.ghost, self.interval,
+                                                          apply=self._apply_interval, **params)
+        else:
+            self.rate_controller = None
+            self.interval = self._clamp_interval(self.requested_interval)
+            self._apply_interval(self.interval)
+        logger.info("📈 自适应速率控制: %s", "开启" if enabled else "关闭")
+    
+    def set_auto_reconnect(self, enabled: bool = True, **params):
+        """
+        开启/关闭点击失败时的自动重连
+        :param enabled: 是否开启
+        :param params: ReconnectSupervisor 的参数（base_delay、max_delay、max_attempts 等）
+        """
+        if enabled:
+            self.reconnect = ReconnectSupervisor(
+                self.ghost, on_state=lambda state: self._emit(EVENT_DEVICE_STATE_CHANGED, state), **params)
+        else:
+            self.reconnect = None
+    
+    def get_status(self) -> dict:
+        """获取当前状态"""
+        return {
+            'is_enabled': self.is_enabled,
+            'is_clicking': self.is_clicking,
+            'state': self.state.state,
+            'click_count': self.click_count,
+            'error_count': self.error_count,
+            'interval': self.interval,
+            'click_limit': self.click_limit,
+            'effective_interval': self.effective_interval,
+            'rate_control': self.rate_controller.get_stats() if self.rate_controller is not None else None,
+            'reconnect': self.reconnect.get_stats() if self.reconnect is not None else None,
+            'notifications': self.error_throttle.get_stats(),
+            'interval_profile': (self.interval_profile.describe() if self.interval_profile is not None
+                                 else {'profile': 'fixed', 'interval': self.interval}),
+            'ghost_connected': self.ghost.is_connected,
+            'probe': self.ghost.prober.get_stats() if getattr(self.ghost, "prober", None) else None,
+            'schedule_mode': self.schedule_mode,
+            'timing': self.scheduler.get_stats(),
+            'device_metrics': self.ghost.get_metrics(),
+            'devices': self.ghost.get_device_stats(),
+            'trigger_latency': self.trigger_latency.snapshot(),
+            'last_trigger_latency_ms': self.last_trigger_latency_ms,
+            'synthetic_filter': self.ghost.synthetic_filter.get_stats(),
+            'logging': get_log_stats(),
+            'trace': self.ghost.get_trace_stats()
+        }
+
+    def set_interval_profile(self, name: str, seed=None, **params):
+        """
+        设置点击间隔分布，基准间隔为当前 interval
+        :param name: 分布名称，见 interval_profiles.PROFILES，"fixed" 表示固定间隔
+        :param seed: 随机数种子，指定后每次连点的间隔序列相同
+        :param params: 分布参数（如 spread、std、sigma）
+        """
+        if name == "fixed" and not params:
+            profile = None
+        else:
+            from interval_profiles import create_profile
+            profile = create_profile(name, self.interval, seed=seed, **params)
+        self.interval_profile = profile
+        self.scheduler.set_profile(profile)
+        logger.info("🎲 点击间隔分布: %s", name)
+    
+    def set_click_limit(self, count: int):
+        """
+        设置单次会话的点击次数上限，达到后自动停止连点
+        :param count: 点击次数，0 表示不限
+        """
+        self.click_limit = max(0, int(count))
+    
+    def set_miss_policy(self, miss_policy: str):
+        """
+        设置截止时间调度下错过时间槽的策略
+        :param miss_policy: "skip" 跳过错过的时间槽，"catch_up" 连续补发
+        """
+        if miss_policy not in MISS_POLICIES:
+            raise ValueError(f"未知的错过策略: {miss_policy}")
+        self.scheduler.miss_policy = miss_policy
+    
+    def start_trace(self, path: str) -> bool:
+        """
+        开始追踪设备命令（每条命令的时间、参数、结果和耗时写入二进制文件，用 trace_analyzer.py 分析）
+        可在启用前后任意时刻开启，跨重连保留
+        :param path: 追踪文件路径
+        :return: 成功返回True
+        """
+        return self.ghost.start_trace(path)
+    
+    def stop_trace(self):
+        """
+        结束追踪并写完文件
+        :return: 追踪统计，未在追踪时返回None
+        """
+        return self.ghost.stop_trace()
+    
+    def simulate_left_button_press(self):
+        """模拟左键按下事件（用于外部触发）"""
+        if self.is_enabled:
+            self.on_trigger(True)
+    
+    def simulate_left_button_release(self):
+        """模拟左键松开事件（用于外部触发）"""
+        if self.is_enabled:
+            self.on_trigger(False)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import sys
+    
+    print("=== subLD 连点引擎测试（无Qt） ===")
+    
+    if sys.platform == "win32":
+        engine = ClickEngine(interval=0.1, progress_rate_hz=2)
+    else:
+        from ghost_backends import SimulatedBackend
+        from ghost_mouse import GhostMouse
+        engine = ClickEngine(interval=0.1, progress_rate_hz=2,
+                             ghost=GhostMouse(backend=SimulatedBackend()))
+    
+    engine.subscribe(EVENT_STATUS_CHANGED,
+                     lambda is_clicking: print(f"状态改变: {'连点中' if is_clicking else '已停止'}"))
+    engine.subscribe(EVENT_PROGRESS_CHANGED,
+                     lambda snapshot: print(f"已点击: {snapshot.click_count} 次, 速率: {snapshot.cps:.1f} CPS"))
+    engine.subscribe(EVENT_ERROR_OCCURRED, lambda error_msg: print(f"错误: {error_msg}"))
+    
+    if engine.enable():
+        engine.start_clicking()
+        time.sleep(2)
+        engine.stop_clicking()
+        time.sleep(0.2)
+        timing = engine.get_status()['timing']
+        print(f"目标 {timing['target_cps']:.1f} CPS, 实际 {timing['achieved_cps']:.1f} CPS, "
+              f"抖动 {timing['jitter_ms']:.3f} ms")
+        engine.disable()
+    
+    print("\n测试完成！")
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+点击定时调度模块 - subLD项目
+基于单调时钟绝对截止时间的无漂移调度器
+"""
+import math
+import threading
+import time
+from typing import Optional
+
+# 错过时间槽时的处理策略
+MISS_POLICY_SKIP = "skip"          # 跳过错过的时间槽，对齐到下一个未来时间槽
+MISS_POLICY_CATCH_UP = "catch_up"  # 连续补发错过的时间槽（有上限）
+MISS_POLICIES = (MISS_POLICY_SKIP, MISS_POLICY_CATCH_UP)
+
+_NS_PER_SEC = 1_000_000_000
+
+
+class DeadlineScheduler:
+    """
+    绝对截止时间调度器
+    第N次触发的截止时间为 起点 + N * 周期，与每次点击本身的耗时无关，
+    因此长时间运行也不会累积漂移。等待采用"先睡眠、后自旋"的混合方式：
+    距截止时间较远时交给系统睡眠，最后一小段用忙等待精确对齐。
+    """
+
+    def __init__(self, interval: float, miss_policy: str = MISS_POLICY_SKIP,
+                 spin_threshold: float = 0.002, max_catch_up: int = 10):
+        """
+        初始化调度器
+        :param interval: 触发周期(秒)
+        :param miss_policy: 错过时间槽的处理策略，"skip" 或 "catch_up"
+        :param spin_threshold: 截止前改为自旋等待的时间(秒)，用于吸收系统睡眠误差
+        :param max_catch_up: catch_up 策略下最多连续补发的时间槽数，超出部分跳过
+        """
+        if miss_policy not in MISS_POLICIES:
+            raise ValueError(f"未知的错过策略: {miss_policy}")
+        self.period_ns = max(1, int(interval * _NS_PER_SEC))
+        self.miss_policy = miss_policy
+        self.spin_threshold_ns = max(0, int(spin_threshold * _NS_PER_SEC))
+        self.max_catch_up = max(0, int(max_catch_up))
+        self._next_ns = 0
+        # 可选的间隔生成器（interval_profiles.IntervalProfile），为None时使用固定周期
+        self.profile = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """清空统计数据"""
+        self.fire_count = 0
+        self.skipped_slots = 0
+        self.caught_up_slots = 0
+        self._first_fire_ns = 0
+        self._last_fire_ns = 0
+        # 延迟(实际触发时间 - 截止时间)的在线统计（Welford算法）
+        self._late_mean = 0.0
+        self._late_m2 = 0.0
+        self._late_max = 0
+        # 相邻两次触发间隔的在线统计
+        self._gap_count = 0
+        self._gap_mean = 0.0
+        self._gap_m2 = 0.0
+
+    def start(self, delay: float = 0.0):
+        """
+        以当前时间为起点开始调度
+        :param delay: 第一次触发前的延迟(秒)
+        """
+        self.reset_stats()
+        if self.profile is not None:
+            self.profile.reset()
+        self._next_ns = time.perf_counter_ns() + int(delay * _NS_PER_SEC)
+
+    def set_interval(self, interval: float):
+        """
+        运行中修改周期，下一次截止时间以上一次截止时间为基准重新计算
+        :param interval: 新的触发周期(秒)
+        """
+        period_ns = max(1, int(interval * _NS_PER_SEC))
+        if self.profile is not None:
+            self.profile.set_interval(interval)
+        if self._next_ns:
+            self._next_ns += period_ns - self.period_ns
+        self.period_ns = period_ns
+
+    def set_profile(self, profile):
+        """
+        设置间隔生成器，之后每个时间槽的周期从生成器读取
+        :param profile: interval_profiles.IntervalProfile，None 恢复固定周期
+        """
+        self.profile = profile
+
+    def time_until_next(self) -> float:
+        """距离下一次截止时间的秒数（已过期时为负数）"""
+        return (self._next_ns - time.perf_counter_ns()) / _NS_PER_SEC
+
+    def wait_next(self, wake: Optional[threading.Event] = None) -> Optional[int]:
+        """
+        阻塞等待到下一个截止时间，并推进到再下一个时间槽
+        :param wake: 可打断等待的事件，事件被设置时立即返回None（不触发、不推进时间槽）
+        :return: 本次触发相对截止时间的延迟(纳秒)；被打断时返回None
+        """
+        deadline = self._next_ns
+        if not self._wait_until(deadline, wake):
+            return None
+        now = time.perf_counter_ns()
+        lateness = now - deadline
+        self._record_fire(now, lateness)
+        self._advance(deadline, now)
+        return lateness
+
+    def _wait_until(self, deadline_ns: int, wake: Optional[threading.Event] = None) -> bool:
+        """
+        混合等待：先睡眠（或等待唤醒事件）到截止前 spin_threshold，再自旋到截止时间
+        :return: 到达截止时间返回True，被唤醒事件打断返回False
+        """
+        remaining = deadline_ns - time.perf_counter_ns()
+        if remaining > self.spin_threshold_ns:
+            timeout = (remaining - self.spin_threshold_ns) / _NS_PER_SEC
+            if wake is None:
+                time.sleep(timeout)
+            elif wake.wait(timeout):
+                return False
+        while time.perf_counter_ns() < deadline_ns:
+            if wake is not None and wake.is_set():
+                return False
+            time.sleep(0)  # 自旋时让出GIL，避免饿死其他线程
+        return True
+
+    def _advance(self, deadline_ns: int, now_ns: int):
+        """根据错过策略计算下一次截止时间"""
+        period = self.period_ns if self.profile is None else self.profile.next_ns()
+        next_ns = deadline_ns + period
+        if now_ns < next_ns:
+            self._next_ns = next_ns
+            return
+
+        # 已经错过了至少一个时间槽
+        missed = (now_ns - next_ns) // period + 1
+        if self.miss_policy == MISS_POLICY_CATCH_UP and missed <= self.max_catch_up:
+            # 立即补发，下一次截止时间保持不变
+            self.caught_up_slots += 1
+            self._next_ns = next_ns
+        else:
+            # 跳过错过的时间槽，对齐到下一个未来时间槽，保持相位不变
+            self.skipped_slots += missed
+            self._next_ns = next_ns + missed * period
+
+    def _record_fire(self, now_ns: int, lateness_ns: int):
+        """记录一次触发的统计数据"""
+        self.fire_count += 1
+        n = self.fire_count
+        delta = lateness_ns - self._late_mean
+        self._late_mean += delta / n
+        self._late_m2 += delta * (lateness_ns - self._late_mean)
+        if lateness_ns > self._late_max:
+            self._late_max = lateness_ns
+
+        if n == 1:
+            self._first_fire_ns = now_ns
+        else:
+            gap = now_ns - self._last_fire_ns
+            self._gap_count += 1
+            g_delta = gap - self._gap_mean
+            self._gap_mean += g_delta / self._gap_count
+            self._gap_m2 += g_delta * (gap - self._gap_mean)
+        self._last_fire_ns = now_ns
+
+    def get_stats(self) -> dict:
+        """
+        获取调度统计
+        :return: 包含实际速率、抖动等信息的字典（时间单位为毫秒）
+        """
+        elapsed_ns = self._last_fire_ns - self._first_fire_ns
+        achieved_cps = 0.0
+        if self.fire_count > 1 and elapsed_ns > 0:
+            achieved_cps = (self.fire_count - 1) * _NS_PER_SEC / elapsed_ns
+        late_std = math.sqrt(self._late_m2 / self.fire_count) if self.fire_count > 1 else 0.0
+        gap_std = math.sqrt(self._gap_m2 / self._gap_count) if self._gap_count > 1 else 0.0
+        period_ns = self.period_ns if self.profile is None else self.profile.mean_interval * _NS_PER_SEC
+        return {
+            'target_cps': _NS_PER_SEC / period_ns,
+            'achieved_cps': achieved_cps,
+            'fire_count': self.fire_count,
+            'skipped_slots': self.skipped_slots,
+            'caught_up_slots': self.caught_up_slots,
+            'lateness_mean_ms': self._late_mean / 1e6,
+            'lateness_std_ms': late_std / 1e6,
+            'lateness_max_ms': self._late_max / 1e6,
+            'interval_mean_ms': self._gap_mean / 1e6,
+            'jitter_ms': gap_std / 1e6,
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    print("=== 截止时间调度器测试 - subLD ===")
+    for interval in (0.1, 0.01, 0.001):
+        scheduler = DeadlineScheduler(interval)
+        scheduler.start()
+        end = time.perf_counter() + 1.0
+        while time.perf_counter() < end:
+            scheduler.wait_next()
+        stats = scheduler.get_stats()
+        print(f"间隔 {interval}s: 目标 {stats['target_cps']:.1f} CPS, "
+              f"实际 {stats['achieved_cps']:.1f} CPS, "
+              f"抖动 {stats['jitter_ms']:.3f} ms, "
+              f"最大延迟 {stats['lateness_max_ms']:.3f} ms")
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+subLD 命令行连点器
+不导入Qt，直接使用 click_engine.ClickEngine 在后台连点，适合脚本和服务场景
+
+用法:
+    python -m clicker_cli --interval 0.05 --duration 10
+    python -m clicker_cli --interval 0.01 --count 500 --backend sim
+    python -m clicker_cli --channel left=0.01 --channel right=0.05 --channel A=0.2:1 --duration 5
+    python -m clicker_cli --channel left=0.02,trigger=hold,on=F6 --channel A=0.1,trigger=toggle,on=F7
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+# 进程启动后尽早取时间，用于统计启动到第一次点击的耗时
+_START_NS = time.perf_counter_ns()
+
+from click_engine import (ClickEngine, EVENT_ERROR_OCCURRED, EVENT_PROGRESS_CHANGED,
+                          EVENT_STATUS_CHANGED, SCHEDULE_DEADLINE, SCHEDULE_SLEEP)
+from click_timing import MISS_POLICIES, MISS_POLICY_SKIP
+from ghost_backends import BINDINGS, BINDING_DISPID
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m clicker_cli",
+                                     description="subLD 命令行连点器（无界面）")
+    parser.add_argument("--interval", type=float, default=0.1,
+                        help="点击间隔(秒)，最小0.01；--adaptive 时为速率上限，最小0.001")
+    parser.add_argument("--duration", type=float, default=0.0,
+                        help="连点时长(秒)，0表示不限（都不限时按 Ctrl+C 停止）")
+    parser.add_argument("--count", type=int, default=0, help="点击次数，0表示不限")
+    parser.add_argument("--delay", type=float, default=0.0, help="开始前的延迟(秒)")
+    parser.add_argument("--backend", choices=("com", "sim"), default="com",
+                        help="设备后端：com 为幽灵键鼠硬件，sim 为模拟设备")
+    parser.add_argument("--progid", default=None, help="COM组件ProgID，默认自动探测所有已知ProgID")
+    parser.add_argument("--binding", choices=BINDINGS, default=BINDING_DISPID,
+                        help="COM方法绑定：dispid 连接时解析DISPID，early 使用makepy类型库包装，late 动态调用"
+                             "（未指定 --progid 时作用于所有探测候选）")
+    parser.add_argument("--devices", type=int, default=1, help="模拟设备数量（仅 sim 后端）")
+    parser.add_argument("--schedule", choices=(SCHEDULE_DEADLINE, SCHEDULE_SLEEP),
+                        default=SCHEDULE_DEADLINE, help="调度模式")
+    parser.add_argument("--miss-policy", choices=MISS_POLICIES, default=MISS_POLICY_SKIP,
+                        help="错过时间槽的策略")
+    parser.add_argument("--profile", default="fixed",
+                        help="间隔分布: fixed / uniform / gaussian / lognormal / burst / ramp")
+    parser.add_argument("--seed", type=int, default=None, help="间隔分布的随机数种子")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="自适应速率：按设备能力自动调整间隔，--interval 作为速率上限")
+    parser.add_argument("--channel", action="append", default=[],
+                        metavar="按钮=间隔[:优先级[:权重]][,trigger=hold|toggle,on=触发键][,profile=分布,参数=值]",
+                        help="多通道连点：每个通道一个按钮或按键（可重复），指定后忽略 --interval 等单通道参数")
+    parser.add_argument("--max-cps", type=float, default=0.0, help="多通道合计速率上限，0表示只受设备能力限制")
+    parser.add_argument("--trace", default=None, metavar="文件",
+                        help="把每条设备命令追踪到二进制文件，用 trace_analyzer.py 分析")
+    parser.add_argument("--quiet", action="store_true", help="不输出进度（进度输出到 stderr）")
+    parser.add_argument("--json", action="store_true", help="结束时以JSON输出统计")
+    return parser
+
+
+def create_ghost(args):
+    """按命令行参数创建设备（单台 GhostMouse 或多台设备池）"""
+    from ghost_mouse import GhostMouse
+    if args.backend == "sim":
+        from ghost_backends import SimulatedBackend
+        if args.devices > 1:
+            from device_pool import DevicePool
+            return DevicePool.simulated(args.devices)
+        return GhostMouse(backend=SimulatedBackend())
+    from ghost_backends import ComBackend
+    if args.progid:
+        return GhostMouse(backend=ComBackend(args.progid, binding=args.binding))
+    # 未指定ProgID时在后台并行探测所有已知ProgID，连接时接管探测到的设备
+    from device_probe import DeviceProber, default_candidates
+    ghost = GhostMouse()
+    ghost.set_prober(DeviceProber(default_candidates(args.binding)).start())
+    return ghost
+
+
+def run(args) -> dict:
+    """
+    运行一次命令行连点
+    :return: 统计结果；设备连接失败时抛出 RuntimeError
+    时长和次数都不限时一直连点，直到 Ctrl+C
+    """
+    engine = ClickEngine(interval=args.interval, schedule_mode=args.schedule,
+                         miss_policy=args.miss_policy, progress_rate_hz=4.0,
+                         ghost=create_ghost(args))
+    engine.set_interval(args.interval)
+    engine.set_click_limit(args.count)
+    if args.adaptive:
+        engine.set_adaptive_rate(True)
+    if args.profile != "fixed":
+        engine.set_interval_profile(args.profile, seed=args.seed)
+    if args.trace:
+        engine.start_trace(args.trace)
+
+    finished = threading.Event()
+    errors = []
+
+    def on_status(is_clicking: bool):
+        if not is_clicking:
+            finished.set()
+
+    engine.subscribe(EVENT_STATUS_CHANGED, on_status)
+    engine.subscribe(EVENT_ERROR_OCCURRED, errors.append)
+    if not args.quiet:
+        # 进度写到 stderr，stdout 只输出结果（--json 时可直接解析）
+        engine.subscribe(EVENT_PROGRESS_CHANGED, lambda snapshot: print(
+            f"\r已点击: {snapshot.click_count} 次, 速率: {snapshot.cps:.1f} CPS", end="", flush=True,
+            file=sys.stderr))
+
+    try:
+        # 连接失败也要走 finally，关闭探测器的候选设备线程和追踪文件
+        if not engine.enable():
+            raise RuntimeError(errors[-1] if errors else "无法连接幽灵键鼠设备")
+        if args.delay > 0:
+            time.sleep(args.delay)
+        start_ns = time.perf_counter_ns()
+        engine.start_clicking()
+        deadline = start_ns + int(args.duration * 1e9) if args.duration > 0 else 0
+        try:
+            # 分段等待，使 Ctrl+C 在各平台上都能及时响应
+            while True:
+                timeout = 0.2
+                if deadline:
+                    remaining = (deadline - time.perf_counter_ns()) / 1e9
+                    if remaining <= 0:
+                        break
+                    timeout = min(timeout, remaining)
+                if finished.wait(timeout):
+                    break
+        except KeyboardInterrupt:
+            pass
+        engine.stop_clicking()
+        finished.wait(timeout=2)
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+        status = engine.get_status()
+    finally:
+        engine.disable()
+        trace = engine.stop_trace()
+        if getattr(engine.ghost, "prober", None) is not None:
+            engine.ghost.prober.close()
+    if not args.quiet:
+        print(file=sys.stderr)
+
+    return {
+        'clicks': status['click_count'],
+        'errors': status['error_count'],
+        'elapsed_s': elapsed,
+        'achieved_cps': status['timing']['achieved_cps'],
+        'jitter_ms': status['timing']['jitter_ms'],
+        'first_click_ms': status['last_trigger_latency_ms'],
+        'rate_control': status['rate_control'],
+        # 左键通道的设定/实际按住时长和压缩次数（多设备时为第一台）
+        'hold': status['devices'][0]['channels'].get('left') if status['devices'] else None,
+        # 不含 --delay 指定的等待
+        'startup_to_first_click_ms': ((start_ns - _START_NS) / 1e6 - max(0.0, args.delay) * 1000
+                                      + status['last_trigger_latency_ms']),
+        'trace': trace,
+    }
+
+
+def run_multi(args) -> dict:
+    """
+    运行多通道连点（所有通道合并到同一台设备的命令流）
+    :return: 统计结果；设备连接失败时抛出 RuntimeError
+    """
+    from multi_clicker import (ChannelTriggerListener, MultiChannelScheduler, TRIGGER_ALWAYS,
+                               parse_channel_spec)
+    channels = [parse_channel_spec(spec) for spec in args.channel]
+    ghost = create_ghost(args)
+    scheduler = MultiChannelScheduler(ghost, max_cps=args.max_cps)
+    # 按住/切换触发的通道由键盘/鼠标监听器触发，等待期间不因没有活动通道而结束
+    triggered = any(channel.trigger != TRIGGER_ALWAYS for channel in channels)
+    listener = None
+    try:
+        for channel in channels:
+            channel.limit = args.count
+            scheduler.add_channel(channel)
+        # 连接失败也要走 finally，关闭探测器的候选设备线程
+        if not ghost.connect():
+            raise RuntimeError("无法连接幽灵键鼠设备")
+        if args.trace:
+            ghost.start_trace(args.trace)
+        if args.delay > 0:
+            time.sleep(args.delay)
+        scheduler.start()
+        if triggered:
+            listener = ChannelTriggerListener(scheduler, ghost.synthetic_filter).start()
+            if not args.quiet:
+                print("等待触发键: " + ", ".join(f"{channel.name}({channel.trigger} {channel.trigger_input})"
+                                             for channel in channels if channel.trigger != TRIGGER_ALWAYS),
+                      file=sys.stderr)
+        deadline = time.monotonic() + args.duration if args.duration > 0 else 0
+        try:
+            while scheduler.is_running and (triggered or any(channel.active for channel in channels)):
+                if deadline and time.monotonic() >= deadline:
+                    break
+                time.sleep(0.2)
+                if not args.quiet:
+                    stats = scheduler.get_stats()
+                    print(f"\r已点击: {stats['granted']} 次, 速率: {stats['achieved_cps']:.1f} CPS",
+                          end="", flush=True, file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        if not args.quiet:
+            print(file=sys.stderr)
+        scheduler.stop()
+        ghost.wait_idle(timeout=2)
+        stats = scheduler.get_stats()
+    finally:
+        if listener is not None:
+            listener.stop()
+        ghost.disconnect()
+        trace = ghost.stop_trace()
+        if getattr(ghost, "prober", None) is not None:
+            ghost.prober.close()
+    return {
+        'clicks': stats['granted'],
+        'errors': sum(channel['failures'] for channel in stats['channels']),
+        'elapsed_s': stats['elapsed_s'],
+        'achieved_cps': stats['achieved_cps'],
+        'contended': stats['contended'],
+        'channels': stats['channels'],
+        'trace': trace,
+    }
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.channel:
+        try:
+            result = run_multi(args)
+        except (RuntimeError, ValueError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            for channel in result['channels']:
+                print(f"  {channel['name']:<8} {channel['count']} 次, 失败 {channel['failures']}, "
+                      f"跳过 {channel['skipped']}, 平均延后 {channel['late_avg_ms']:.2f} ms")
+            print(f"共点击 {result['clicks']} 次, 用时 {result['elapsed_s']:.2f} 秒, "
+                  f"实际 {result['achieved_cps']:.1f} CPS")
+        return 0
+    try:
+        result = run(args)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print(f"共点击 {result['clicks']} 次, 失败 {result['errors']} 次, 用时 {result['elapsed_s']:.2f} 秒, "
+              f"实际 {result['achieved_cps']:.1f} CPS")
+        print(f"启动到第一次点击: {result['startup_to_first_click_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
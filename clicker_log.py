@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+日志模块 - subLD项目
+各模块通过 get_logger() 记录日志，代替热路径上的 print()：
+- 调用线程只做级别判断和一次入队（不创建日志记录、不加锁），记录创建、限流、格式化和输出都在后台线程完成；
+- 消息使用 %s 占位符而不是 f-string，级别未启用时不产生任何格式化开销；
+- WARNING 及以上级别的同一消息模板（或 extra={'key': ...} 指定的键）在时间窗口内只放行前几条，
+  其余只计数，下一次放行时附上被合并的条数，设备反复失败时不会刷屏；INFO 等生命周期消息不限流；
+- 控制台日志输出到 stderr，stdout 只留给命令行和基准测试的结果；
+- 最近的日志保存在内存环形缓冲中，供界面显示。
+日志级别可用环境变量 SUBLD_LOG_LEVEL 指定（如 DEBUG）。
+"""
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+LOGGER_NAME = "subld"
+DEFAULT_LEVEL = os.environ.get("SUBLD_LOG_LEVEL", "INFO").upper()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按消息键限流去重（只对 min_level 及以上级别）
+    键默认为 (记录器, 级别, 消息模板)，参数不同的同类消息视为重复；
+    每个键在 window 秒内最多放行 burst 条，其余丢弃并计数，窗口结束后放行的第一条带上合并条数。
+    """
+
+    def __init__(self, burst: int = 3, window: float = 5.0, max_keys: int = 1024,
+                 min_level: int = logging.WARNING):
+        """
+        :param burst: 每个窗口内每个键放行的条数
+        :param window: 窗口长度(秒)
+        :param max_keys: 记录的键数上限，超过时清空过期的键
+        :param min_level: 限流的最低级别，更低级别的消息全部放行
+        """
+        super().__init__()
+        self.min_level = min_level
+        self.burst = burst
+        self.window = window
+        self.max_keys = max_keys
+        self.suppressed = 0
+        # 键 -> [窗口开始时间, 已放行条数, 被合并条数]
+        self._state: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, key) -> Optional[int]:
+        """
+        判断该键的消息是否放行
+        :return: 丢弃时返回None；放行时返回此前被合并的条数
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                merged = state[2] if state is not None else 0
+                if state is None and len(self._state) >= self.max_keys:
+                    self._expire(now)
+                self._state[key] = [now, 1, 0]
+                return merged
+            if state[1] < self.burst:
+                state[1] += 1
+                return 0
+            state[2] += 1
+            self.suppressed += 1
+            return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+        merged = self.admit(getattr(record, "key", None) or (record.name, record.levelno, record.msg))
+        if merged is None:
+            return False
+        record.merged = merged
+        return True
+
+    def _expire(self, now: float):
+        """清除窗口已结束且没有待报告合并条数的键（需持有锁）"""
+        for key in [k for k, s in self._state.items() if now - s[0] >= self.window and not s[2]]:
+            del self._state[key]
+
+
+class MergedFormatter(logging.Formatter):
+    """在消息后附上被限流合并的条数"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        merged = getattr(record, "merged", 0)
+        if merged:
+            text += f"（此前另有 {merged} 条同类消息已合并）"
+        return text
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    最近日志的内存环形缓冲（在日志后台线程中写入）
+    每条记录带递增序号，界面按上次读到的序号增量读取。
+    """
+
+    def __init__(self, capacity: int = 500):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+        self._ring_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._ring_lock:
+            self.seq += 1
+            self.records.append({'seq': self.seq, 'time': record.created, 'level': record.levelname,
+                                 'logger': record.name, 'message': message})
+
+    def get_recent(self, since: int = 0, limit: int = 200) -> List[dict]:
+        """
+        读取最近的日志
+        :param since: 只返回序号大于该值的记录
+        :param limit: 最多返回条数（取最新的）
+        :return: [{'seq', 'time', 'level', 'logger', 'message'}]，从旧到新
+        """
+        with self._ring_lock:
+            if since >= self.seq:
+                return []
+            records = [r for r in self.records if r['seq'] > since]
+        return records[-limit:]
+
+
+class FastLogger(logging.Logger):
+    """
+    subLD 模块使用的记录器
+    级别判断之后只把 (记录器名, 级别, 模板, 参数, 异常, extra, 时间) 追加到待处理队列（deque.append，
+    不加锁、不唤醒后台线程），不创建日志记录、不做限流判断；这些都由 RecordListener 在后台线程完成。
+    输出格式只有消息本身，不回溯调用栈查找调用位置。
+    """
+
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, stacklevel=1):
+        pending = _pending
+        if pending is None:
+            super()._log(level, msg, args, exc_info, extra, stack_info, stacklevel)
+            return
+        if exc_info:
+            # 异常信息必须在调用线程取得，后台线程中 sys.exc_info() 已不是这个异常
+            if isinstance(exc_info, BaseException):
+                exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+            elif not isinstance(exc_info, tuple):
+                exc_info = sys.exc_info()
+        pending.append((self.name, level, msg, args, exc_info, extra, time.time()))
+
+    def findCaller(self, stack_info=False, stacklevel=1):
+        return "(unknown file)", 0, "(unknown function)", None
+
+
+class DeferredHandler(logging.Handler):
+    """其他记录器的记录原样放入待处理队列（不在调用线程格式化），由后台线程格式化和输出"""
+
+    def __init__(self, pending: deque):
+        super().__init__()
+        self.pending = pending
+
+    def emit(self, record: logging.LogRecord):
+        self.pending.append(record)
+
+
+class RecordListener:
+    """
+    日志后台线程
+    每 flush_interval 秒取走待处理队列中的全部条目，把 FastLogger 追加的元组还原为日志记录，
+    限流后交给各输出；调用线程不需要唤醒它，日志最多延迟一个周期输出。
+    """
+
+    def __init__(self, pending: deque, rate_filter: RateLimitFilter, handlers: List[logging.Handler],
+                 flush_interval: float = 0.02):
+        """
+        :param pending: 调用线程追加条目的队列
+        :param rate_filter: 限流过滤器
+        :param handlers: 输出（环形缓冲、控制台）
+        :param flush_interval: 取走队列的周期(秒)
+        """
+        self.pending = pending
+        self.rate_filter = rate_filter
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="subLD-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程（先输出完队列中的日志）"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.drain()
+        self.drain()
+
+    def drain(self):
+        """处理队列中的全部条目（只在后台线程中调用）"""
+        pending = self.pending
+        while pending:
+            try:
+                self.handle(pending.popleft())
+            except Exception:
+                # 单条日志出错（如 extra 与记录属性重名）不能让后台线程退出
+                traceback.print_exc(file=sys.stderr)
+
+    def handle(self, item):
+        if isinstance(item, logging.LogRecord):
+            record = item
+        else:
+            name, level, msg, args, exc_info, extra, created = item
+            record = logging.getLogger(name).makeRecord(name, level, "(unknown file)", 0, msg, args,
+                                                        exc_info, None, extra)
+            # 时间用调用线程记录日志时的时间
+            record.created = created
+            record.msecs = (created - int(created)) * 1000
+        if not self.rate_filter.filter(record):
+            return
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+_setup_lock = threading.Lock()
+_listener: Optional[RecordListener] = None
+_pending: Optional[deque] = None
+_ring: Optional[RingBufferHandler] = None
+_rate_filter: Optional[RateLimitFilter] = None
+
+
+def setup_logging(level=None, console: bool = True, ring_size: int = 500, burst: int = 3,
+                  window: float = 5.0) -> RingBufferHandler:
+    """
+    配置 subLD 日志（只生效一次，之后的调用只修改级别）
+    :param level: 日志级别，默认为环境变量 SUBLD_LOG_LEVEL 或 INFO
+    :param console: 是否输出到控制台（stderr）
+    :param ring_size: 内存环形缓冲的条数
+    :param burst: 限流：WARNING 及以上级别每个消息键每个窗口放行的条数
+    :param window: 限流窗口(秒)
+    :return: 内存环形缓冲
+    """
+    global _listener, _ring, _rate_filter, _pending
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if level is not None or _listener is None:
+            logger.setLevel(level or DEFAULT_LEVEL)
+        if _listener is not None:
+            return _ring
+        pending = deque()
+        formatter = MergedFormatter("%(message)s")
+        _ring = RingBufferHandler(ring_size)
+        _ring.setFormatter(formatter)
+        handlers = [_ring]
+        if console:
+            # 输出到 stderr：日志由后台线程写出，不能与命令行/基准测试写到 stdout 的结果交错
+            stream = logging.StreamHandler(sys.stderr)
+            stream.setFormatter(formatter)
+            handlers.append(stream)
+        _rate_filter = RateLimitFilter(burst=burst, window=window)
+        _listener = RecordListener(pending, _rate_filter, handlers)
+        _listener.start()
+        _pending = pending
+        logger.addHandler(DeferredHandler(pending))
+        logger.propagate = False
+        atexit.register(shutdown_logging)
+        return _ring
+
+
+def shutdown_logging():
+    """停止后台线程（输出完已入队的日志）；之后的日志不再入队"""
+    global _listener, _pending
+    with _setup_lock:
+        listener, _listener = _listener, None
+        _pending = None
+    if listener is not None:
+        listener.stop()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    获取模块的记录器（首次调用时按默认参数配置日志）
+    :param name: 模块名，如 "ghost_mouse"
+    """
+    if _listener is None:
+        setup_logging()
+    full_name = f"{LOGGER_NAME}.{name}"
+    with _setup_lock:
+        # 只对 subLD 的记录器使用 FastLogger，不影响其他库
+        previous = logging.getLoggerClass()
+        logging.setLoggerClass(FastLogger)
+        try:
+            return logging.getLogger(full_name)
+        finally:
+            logging.setLoggerClass(previous)
+
+
+def get_recent_events(since: int = 0, limit: int = 200) -> List[dict]:
+    """读取内存环形缓冲中的最近日志，见 RingBufferHandler.get_recent"""
+    return _ring.get_recent(since, limit) if _ring is not None else []
+
+
+def get_stats() -> dict:
+    """
+    :return: {'level', 'events', 'suppressed'}
+    """
+    return {
+        'level': logging.getLevelName(logging.getLogger(LOGGER_NAME).level),
+        'events': _ring.seq if _ring is not None else 0,
+        'suppressed': _rate_filter.suppressed if _rate_filter is not None else 0,
+    }
+
+
+# 测试代码
+if __name__ == "__main__":
+    print("=== 日志模块测试 - subLD ===")
+    setup_logging(console=False)
+    log = get_logger("test")
+    N = 20000
+
+    def caller_ns(emit, count: int, batch: int = 500) -> float:
+        """
+        调用线程自身的CPU时间（thread_time_ns），不含后台线程创建记录和输出的时间；
+        每批之间等后台线程取走队列，模拟日志突发而不是无限积压（积压的条目会让GC越来越慢）
+        """
+        total = 0
+        for base in range(0, count, batch):
+            start = time.thread_time_ns()
+            for i in range(base, min(count, base + batch)):
+                emit(i)
+            total += time.thread_time_ns() - start
+            time.sleep(0.03)
+        return total / count
+
+    # 未启用的级别：只有一次级别判断
+    disabled_ns = caller_ns(lambda i: log.debug("点击 %d 完成，耗时 %.3f ms", i, 0.123), N)
+    # 重复的错误：调用线程照常入队，后台线程限流，同一模板只放行前几条
+    limited_ns = caller_ns(lambda i: log.error("❌ 左键按下失败: %s", i), N)
+    # 放行的消息：入队后由后台线程创建记录和格式化
+    enqueue_ns = caller_ns(lambda i: log.info("事件 %d", i), N)
+    # 同一模板的 INFO 生命周期消息不限流
+    for i in range(10):
+        log.info("✅ 连点器已启用 %d", i)
+
+    # 对照：同步 print 到 /dev/null
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        print_ns = caller_ns(lambda i: print(f"❌ 左键按下失败: {i}", file=devnull), N)
+
+    shutdown_logging()
+    stats = get_stats()
+    print(f"级别未启用: {disabled_ns:.0f} ns/条")
+    print(f"重复错误:   {limited_ns:.0f} ns/条（后台合并 {stats['suppressed']} 条）")
+    print(f"放行入队:   {enqueue_ns:.0f} ns/条")
+    print(f"同步 print: {print_ns:.0f} ns/条（输出到 /dev/null，控制台会慢得多）")
+    recent = get_recent_events(limit=3)
+    print("最近日志:", [event['message'] for event in recent])
+    assert stats['suppressed'] == N - 3 and stats['events'] == 3 + N + 10
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+连点器状态机模块 - subLD项目
+disabled → ready → clicking → stopping → ready → … → disabled
+所有状态转换都在同一个条件变量下以"比较并设置"的方式完成，GUI线程、输入钩子线程和连点线程
+可以同时请求转换而不会出现中间状态；等待某个状态时使用条件变量，状态一变立即唤醒。
+"""
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+STATE_DISABLED = "disabled"  # 未启用（设备未连接）
+STATE_READY = "ready"        # 已启用，等待按下
+STATE_CLICKING = "clicking"  # 连点中
+STATE_STOPPING = "stopping"  # 已请求停止，连点线程正在收尾（松开左键、发布最终计数）
+STATES = (STATE_DISABLED, STATE_READY, STATE_CLICKING, STATE_STOPPING)
+
+# 允许的状态转换
+TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    STATE_DISABLED: frozenset((STATE_READY,)),
+    STATE_READY: frozenset((STATE_CLICKING, STATE_DISABLED)),
+    STATE_CLICKING: frozenset((STATE_STOPPING,)),
+    # 连点线程未能按时收尾时，禁用操作可以直接从 stopping 进入 disabled
+    STATE_STOPPING: frozenset((STATE_READY, STATE_DISABLED)),
+}
+
+
+class InvalidTransition(RuntimeError):
+    """不允许的状态转换"""
+
+
+class ClickerStateMachine:
+    """
+    连点器状态机
+    transition() 只有当前状态等于预期状态时才转换，返回是否成功，调用方据此决定由谁负责后续动作；
+    转换成功后在锁外依次调用监听器 (旧状态, 新状态)。
+    """
+
+    def __init__(self, initial: str = STATE_DISABLED):
+        self._state = initial
+        self._cond = threading.Condition()
+        self._listeners: Tuple[Callable[[str, str], None], ...] = ()
+        self.transitions = 0
+        self.changed_ns = time.perf_counter_ns()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def is_in(self, *states: str) -> bool:
+        return self._state in states
+
+    def add_listener(self, callback: Callable[[str, str], None]):
+        """添加状态变化监听器 (旧状态, 新状态)"""
+        self._listeners = self._listeners + (callback,)
+
+    def transition(self, expected, new: str) -> bool:
+        """
+        比较并设置
+        :param expected: 预期的当前状态（字符串，或多个可接受状态的集合）
+        :param new: 目标状态
+        :return: 当前状态符合预期并已转换返回True，否则不做任何改变并返回False
+        :raises InvalidTransition: 预期状态到目标状态不是允许的转换
+        """
+        accepted = (expected,) if isinstance(expected, str) else tuple(expected)
+        with self._cond:
+            old = self._state
+            if old not in accepted:
+                return False
+            if new not in TRANSITIONS[old]:
+                raise InvalidTransition(f"不允许的状态转换: {old} -> {new}")
+            self._state = new
+            self.transitions += 1
+            self.changed_ns = time.perf_counter_ns()
+            self._cond.notify_all()
+        for callback in self._listeners:
+            callback(old, new)
+        return True
+
+    def wait_for(self, states: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """
+        等待进入指定状态之一
+        :param states: 目标状态
+        :param timeout: 超时时间(秒)
+        :return: 已处于目标状态返回True，超时返回False
+        """
+        targets = (states,) if isinstance(states, str) else tuple(states)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._state in targets, timeout)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import random
+    from click_engine import ClickEngine
+    from ghost_backends import SimulatedBackend
+    from ghost_mouse import GhostMouse
+
+    print("=== 连点器状态机压力测试 - subLD ===")
+    # 10秒间隔：停止必须打断等待，而不是等到下一次点击
+    backend = SimulatedBackend()
+    # 每次启用都会创建新的模拟设备，全部收集起来检查左键命令
+    devices = []
+    open_device = backend.open
+
+    def record_open():
+        device = open_device()
+        devices.append(device)
+        return device
+
+    backend.open = record_open
+    engine = ClickEngine(interval=10.0, progress_rate_hz=5, ghost=GhostMouse(backend=backend))
+    seen = []
+    engine.state.add_listener(lambda old, new: seen.append((old, new)))
+    engine.enable()
+
+    # 停止延迟：从 stop_clicking() 到回到 ready
+    latencies = []
+    for _ in range(200):
+        engine.start_clicking()
+        engine.state.wait_for(STATE_CLICKING, timeout=1)
+        time.sleep(0.002)
+        start = time.perf_counter_ns()
+        engine.stop_clicking()
+        assert engine.state.wait_for(STATE_READY, timeout=1), engine.state.state
+        latencies.append((time.perf_counter_ns() - start) / 1e6)
+    latencies.sort()
+    print(f"10 秒间隔下的停止延迟: p50 {latencies[len(latencies) // 2]:.3f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms, 最大 {latencies[-1]:.3f} ms")
+
+    # 多线程同时反复开始/停止，并穿插禁用/启用
+    engine.set_interval(0.01)
+    errors = []
+    stop_at = time.monotonic() + 3.0
+
+    def hammer(seed: int):
+        rng = random.Random(seed)
+        try:
+            while time.monotonic() < stop_at:
+                action = rng.random()
+                if action < 0.45:
+                    engine.start_clicking()
+                elif action < 0.9:
+                    engine.stop_clicking()
+                elif action < 0.95:
+                    engine.disable()
+                else:
+                    engine.enable()
+                time.sleep(rng.uniform(0, 0.002))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.enable()
+    engine.stop_clicking()
+    assert engine.state.wait_for(STATE_READY, timeout=2), engine.state.state
+    engine.ghost.wait_idle(timeout=1)
+    # 按开始时间合并所有设备的左键命令；每台设备的最后一条左键命令也必须是抬起
+    left_ops = sorted((entry[0], entry[1]) for device in devices for entry in device.log
+                      if entry[1] in ("LeftDown", "LeftUp"))
+    pressed = [device for device in devices
+               if [entry[1] for entry in device.log if entry[1] in ("LeftDown", "LeftUp")][-1:] == ["LeftDown"]]
+    bad = [t for t in seen if t[1] not in TRANSITIONS[t[0]]]
+    print(f"状态转换 {engine.state.transitions} 次，非法转换 {len(bad)} 次，线程异常 {len(errors)} 个")
+    print(f"设备 {len(devices)} 台，左键命令 {len(left_ops)} 条，最后一条: {left_ops[-1][1] if left_ops else '无'}，"
+          f"残留按下 {len(pressed)} 台")
+    assert not bad and not errors
+    assert left_ops and left_ops[-1][1] == "LeftUp" and not pressed
+    engine.disable()
+    assert engine.state.state == STATE_DISABLED
+    print("测试通过！")
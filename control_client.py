@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+本地控制客户端模块 - subLD项目
+control_server 的 asyncio 客户端：请求可以并发发出（流水线），响应按请求ID匹配；
+订阅推送通过回调或队列接收；TCP 连接时自动从令牌文件读取令牌并认证。
+"""
+import asyncio
+import itertools
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from control_server import (DEFAULT_HOST, DEFAULT_PORT, USE_UNIX_SOCKET, default_socket_path,
+                            default_token_path, encode_frame, read_frame, read_token)
+
+
+class ControlError(Exception):
+    """服务端返回的命令错误"""
+
+
+class ControlClient:
+    """连点器控制客户端"""
+
+    def __init__(self, on_event: Optional[Callable[[str, Any], None]] = None):
+        """
+        :param on_event: 推送回调 (事件名, 数据)，为None时推送放入 events 队列
+        """
+        self.on_event = on_event
+        # 推送队列在 connect() 中创建，绑定到运行中的事件循环
+        self.events: Optional["asyncio.Queue[Tuple[str, Any]]"] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._read_task: Optional[asyncio.Task] = None
+
+    async def connect(self, path: Optional[str] = None, host: str = DEFAULT_HOST,
+                      port: int = DEFAULT_PORT, use_unix_socket: bool = USE_UNIX_SOCKET,
+                      token: Optional[str] = None, token_path: Optional[str] = None):
+        """
+        连接控制服务
+        :param token: TCP 认证令牌，为None时从令牌文件读取
+        :param token_path: TCP 令牌文件路径，默认为 default_token_path(port)
+        :raises ConnectionError: 无法读取令牌
+        :raises ControlError: 令牌错误
+        """
+        self.events = asyncio.Queue()
+        if use_unix_socket:
+            self._reader, self._writer = await asyncio.open_unix_connection(path or default_socket_path())
+        else:
+            if token is None:
+                token = read_token(token_path or default_token_path(port))
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._read_task = asyncio.get_running_loop().create_task(self._read_loop())
+        if not use_unix_socket:
+            try:
+                await self.request("auth", token=token)
+            except ControlError:
+                await self.close()
+                raise
+
+    async def close(self):
+        """关闭连接，未完成的请求以 ConnectionError 结束"""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                message = await read_frame(self._reader)
+                if message is None:
+                    break
+                if "event" in message:
+                    if self.on_event is not None:
+                        self.on_event(message["event"], message.get("data"))
+                    else:
+                        self.events.put_nowait((message["event"], message.get("data")))
+                    continue
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("控制服务连接已关闭"))
+            self._pending.clear()
+
+    def _send(self, message: dict) -> asyncio.Future:
+        request_id = next(self._ids)
+        message["id"] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode_frame(message))
+        return future
+
+    async def request(self, cmd: str, **args) -> Any:
+        """
+        发送一条命令并等待结果（多个 request 可并发，共享同一连接）
+        :raises ControlError: 服务端执行失败
+        """
+        message = {"cmd": cmd, "args": args} if args else {"cmd": cmd}
+        response = await self._send(message)
+        if not response.get("ok"):
+            raise ControlError(response.get("error"))
+        return response.get("result")
+
+    async def batch(self, commands: Iterable[Tuple[str, dict]]) -> List[dict]:
+        """
+        在一帧中发送多条命令，服务端按顺序执行
+        :param commands: (命令名, 参数字典) 序列
+        :return: 每条命令的 {"ok", "result"/"error"}
+        """
+        items = [{"cmd": cmd, "args": args} if args else {"cmd": cmd} for cmd, args in commands]
+        response = await self._send({"batch": items})
+        if not response.get("ok"):
+            raise ControlError(response.get("error"))
+        return response["results"]
+
+    # ==================== 便捷方法 ====================
+
+    async def ping(self) -> str:
+        return await self.request("ping")
+
+    async def start(self) -> bool:
+        return await self.request("start")
+
+    async def stop(self) -> bool:
+        return await self.request("stop")
+
+    async def set_interval(self, interval: float) -> float:
+        return await self.request("set_interval", interval=interval)
+
+    async def click(self, count: int = 1, button: str = "left") -> int:
+        return await self.request("click", count=count, button=button)
+
+    async def move(self, dx: int, dy: int, duration: Optional[float] = None) -> bool:
+        return await self.request("move", dx=dx, dy=dy, duration=duration)
+
+    async def status(self) -> dict:
+        return await self.request("status")
+
+    async def subscribe(self, rate_hz: float = 10.0) -> bool:
+        return await self.request("subscribe", rate_hz=rate_hz)
+
+    async def unsubscribe(self) -> bool:
+        return await self.request("unsubscribe")
+
+
+# 测试代码
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="subLD 控制客户端")
+    parser.add_argument("cmd", help="命令，如 status / start / stop / set_interval")
+    parser.add_argument("args", nargs="*", help="参数，格式 key=value")
+    parser.add_argument("--socket", default=None, help="Unix 域套接字路径")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP 端口（Windows）")
+    cli = parser.parse_args()
+
+    def parse_value(text: str) -> Any:
+        for cast in (int, float):
+            try:
+                return cast(text)
+            except ValueError:
+                pass
+        return text
+
+    async def run():
+        client = ControlClient()
+        await client.connect(path=cli.socket, port=cli.port)
+        async with client:
+            kwargs = dict((k, parse_value(v)) for k, v in (a.split("=", 1) for a in cli.args))
+            print(await client.request(cli.cmd, **kwargs))
+
+    asyncio.run(run())
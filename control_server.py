@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+本地控制服务模块 - subLD项目
+基于 asyncio 的本地IPC服务，供外部进程启动/停止/调整连点器：
+Unix 平台使用 Unix 域套接字，Windows 使用仅监听 127.0.0.1 的 TCP 端口。
+套接字放在每用户目录（$XDG_RUNTIME_DIR 或临时目录下权限 0700 的 subld-<用户ID>）中，只有本用户能连接；
+TCP 端口任何本机进程都能连接，因此启动时生成随机令牌写入只有本用户可读的令牌文件
+（~/.subld/control-<端口>.token），连接后的第一条命令必须是 {"cmd": "auth", "args": {"token": ...}}。
+
+协议（每帧 = 4字节小端长度 + UTF-8 JSON）:
+    请求   {"id": 1, "cmd": "set_interval", "args": {"interval": 0.05}}
+    批量   {"id": 2, "batch": [{"cmd": "click", "args": {"count": 3}}, {"cmd": "status"}]}
+    响应   {"id": 1, "ok": true, "result": ...}  /  {"id": 1, "ok": false, "error": "..."}
+    批量响应 {"id": 2, "ok": true, "results": [{"ok": true, "result": ...}, ...]}
+    推送   {"event": "progress" | "status" | "error", "data": ...}（订阅后）
+客户端可以不等响应连续发送多个请求（流水线），同一连接上的响应按请求顺序返回。
+
+用法: python control_server.py [--backend sim] [--socket 路径 | --port 端口]
+"""
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import socket
+import stat
+import struct
+import sys
+import tempfile
+from typing import Any, Callable, Dict, Optional, Set
+
+from click_engine import (ClickEngine, EVENT_ERROR_OCCURRED, EVENT_PROGRESS_CHANGED,
+                          EVENT_STATUS_CHANGED)
+from clicker_log import get_logger
+
+logger = get_logger("control_server")
+
+FRAME_HEADER = struct.Struct("<I")
+MAX_FRAME_SIZE = 1 << 20
+SOCKET_NAME = "subld_clicker.sock"
+# TCP 令牌文件目录（与设备探测配置同目录）
+TOKEN_DIR = os.path.join(os.path.expanduser("~"), ".subld")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47321
+USE_UNIX_SOCKET = sys.platform != "win32" and hasattr(asyncio, "start_unix_server")
+
+# 需要在线程池中执行的阻塞命令（连接/断开设备）
+BLOCKING_COMMANDS = ("enable", "disable")
+# 单条 click 命令最多预约的点击次数（命令在事件循环线程中执行，次数过大会阻塞其他客户端）
+MAX_CLICK_COUNT = 1000
+
+
+class ProtocolError(Exception):
+    """帧格式或请求格式错误"""
+
+
+def runtime_dir() -> str:
+    """
+    本用户的套接字目录：优先 $XDG_RUNTIME_DIR，否则为临时目录下权限 0700 的 subld-<用户ID>
+    :raises RuntimeError: 目录不是本用户所有（可能被其他用户抢先创建）
+    """
+    xdg = os.environ.get("XDG_RUNTIME_DIR")
+    if xdg and os.path.isdir(xdg):
+        return xdg
+    path = os.path.join(tempfile.gettempdir(), f"subld-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"套接字目录不属于当前用户: {path}")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def default_socket_path() -> str:
+    """默认 Unix 域套接字路径"""
+    return os.path.join(runtime_dir(), SOCKET_NAME)
+
+
+def default_token_path(port: int) -> str:
+    """TCP 端口对应的默认令牌文件路径"""
+    return os.path.join(TOKEN_DIR, f"control-{port}.token")
+
+
+def write_token(path: str, token: str):
+    """
+    写入令牌文件（权限 0600，先写临时文件再替换）
+    Windows 上权限位不起作用，文件只受用户目录的访问控制保护
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+
+
+def read_token(path: str) -> str:
+    """
+    读取令牌文件
+    :raises ConnectionError: 令牌文件不存在或无法读取（控制服务未启动）
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError as e:
+        raise ConnectionError(f"无法读取控制服务令牌 {path}: {e}") from None
+
+
+def encode_frame(message: Any) -> bytes:
+    """消息 -> 帧"""
+    payload = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Any]:
+    """
+    读取一帧
+    :return: 解码后的消息，连接关闭时返回None
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"帧过大: {size} 字节")
+    try:
+        payload = await reader.readexactly(size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError as e:
+        raise ProtocolError(f"无效的JSON: {e}") from None
+
+
+class _Connection:
+    """一个客户端连接及其订阅状态"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.subscribed = False
+        self.rate_hz = 10.0
+        self.authenticated = False
+        self.progress_task: Optional[asyncio.Task] = None
+
+    def send(self, message: Any):
+        if not self.writer.is_closing():
+            self.writer.write(encode_frame(message))
+
+
+class ControlServer:
+    """
+    连点器控制服务
+    命令处理都在事件循环线程中进行，除 enable/disable 外都是不阻塞的调用（点击和移动只是预约设备命令）；
+    引擎事件从连点线程/发布线程经 call_soon_threadsafe 转到事件循环再推送给订阅者。
+    """
+
+    def __init__(self, engine: ClickEngine, path: Optional[str] = None,
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 use_unix_socket: bool = USE_UNIX_SOCKET, token_path: Optional[str] = None):
+        """
+        :param engine: 连点引擎（ClickEngine 或 MouseAutoClicker）
+        :param path: Unix 域套接字路径，默认为 default_socket_path()
+        :param host: TCP 监听地址（Windows），只应为本机回环地址
+        :param port: TCP 端口，0 表示由系统分配
+        :param use_unix_socket: 是否使用 Unix 域套接字
+        :param token_path: TCP 令牌文件路径，默认为 default_token_path(端口)
+        """
+        self.engine = engine
+        self.path = path or (default_socket_path() if use_unix_socket else None)
+        self.host = host
+        self.port = port
+        self.use_unix_socket = use_unix_socket
+        self.token_path = token_path
+        # Unix 域套接字由目录权限保护，不需要令牌
+        self.token: Optional[str] = None if use_unix_socket else secrets.token_urlsafe(32)
+        self.request_count = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connections: Set[_Connection] = set()
+        self._progress = None
+        self._progress_changed: Optional[asyncio.Event] = None
+        self._handlers: Dict[str, Callable[..., Any]] = {
+            "ping": lambda: "pong",
+            "enable": engine.enable,
+            "disable": engine.disable,
+            "start": self._cmd_start,
+            "stop": self._cmd_stop,
+            "set_interval": self._cmd_set_interval,
+            "set_click_limit": self._cmd_set_click_limit,
+            "set_profile": self._cmd_set_profile,
+            "click": self._cmd_click,
+            "move": self._cmd_move,
+            "status": engine.get_status,
+        }
+
+    @property
+    def address(self) -> str:
+        """监听地址（用于日志和客户端连接）"""
+        if self.use_unix_socket:
+            return self.path
+        return f"{self.host}:{self.port}"
+
+    # ==================== 启动/停止 ====================
+
+    async def start(self):
+        """开始监听"""
+        self._loop = asyncio.get_running_loop()
+        self._progress_changed = asyncio.Event()
+        if self.use_unix_socket:
+            self._remove_stale_socket()
+            self._server = await asyncio.start_unix_server(self._handle_client, path=self.path)
+            os.chmod(self.path, 0o600)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host=self.host, port=self.port)
+            self.port = self._server.sockets[0].getsockname()[1]
+            self.token_path = self.token_path or default_token_path(self.port)
+            write_token(self.token_path, self.token)
+        self.engine.subscribe(EVENT_PROGRESS_CHANGED, self._on_progress)
+        self.engine.subscribe(EVENT_STATUS_CHANGED, self._on_status)
+        self.engine.subscribe(EVENT_ERROR_OCCURRED, self._on_error)
+        logger.info("🛰️ 控制服务已启动: %s", self.address)
+
+    async def stop(self):
+        """停止监听并关闭所有连接"""
+        self.engine.unsubscribe(EVENT_PROGRESS_CHANGED, self._on_progress)
+        self.engine.unsubscribe(EVENT_STATUS_CHANGED, self._on_status)
+        self.engine.unsubscribe(EVENT_ERROR_OCCURRED, self._on_error)
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        for connection in list(self._connections):
+            connection.writer.close()
+        # 只删除自己创建的套接字/令牌文件
+        path = self.path if self.use_unix_socket else self.token_path
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+    def _remove_stale_socket(self):
+        """
+        删除上次异常退出留下的套接字文件
+        :raises RuntimeError: 路径不是套接字，或另一个控制服务仍在监听
+        """
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise RuntimeError(f"控制服务路径已存在且不是套接字: {self.path}")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"另一个控制服务正在运行: {self.path}")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    # ==================== 连接处理 ====================
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = _Connection(writer)
+        connection.authenticated = self.token is None
+        self._connections.add(connection)
+        try:
+            while True:
+                try:
+                    message = await read_frame(reader)
+                except ProtocolError as e:
+                    connection.send({"id": None, "ok": False, "error": str(e)})
+                    break
+                if message is None:
+                    break
+                response = await self._handle_message(connection, message)
+                connection.send(response)
+                # 流水线请求积压时只在缓冲区过大时等待，不对每个响应 drain
+                if writer.transport.get_write_buffer_size() > 65536:
+                    await writer.drain()
+        finally:
+            self._connections.discard(connection)
+            if connection.progress_task is not None:
+                connection.progress_task.cancel()
+            writer.close()
+
+    async def _handle_message(self, connection: _Connection, message: Any) -> dict:
+        if not isinstance(message, dict):
+            return {"id": None, "ok": False, "error": "请求必须是JSON对象"}
+        request_id = message.get("id")
+        batch = message.get("batch")
+        if batch is not None:
+            if not isinstance(batch, list):
+                return {"id": request_id, "ok": False, "error": "batch 必须是数组"}
+            results = []
+            clicks = 0
+            for item in batch:
+                result = await self._execute(connection, item)
+                results.append(result)
+                # 批量中累计预约的点击每满 MAX_CLICK_COUNT 次让出一次事件循环，长批量不独占服务
+                if result["ok"] and isinstance(item, dict) and item.get("cmd") == "click":
+                    clicks += result["result"]
+                    if clicks >= MAX_CLICK_COUNT:
+                        clicks = 0
+                        await asyncio.sleep(0)
+            return {"id": request_id, "ok": True, "results": results}
+        response = await self._execute(connection, message)
+        response["id"] = request_id
+        return response
+
+    async def _execute(self, connection: _Connection, item: Any) -> dict:
+        """执行单条命令，返回 {"ok": ..., "result"/"error": ...}"""
+        self.request_count += 1
+        if not isinstance(item, dict):
+            return {"ok": False, "error": "命令必须是JSON对象"}
+        cmd = item.get("cmd")
+        args = item.get("args") or {}
+        if not isinstance(args, dict):
+            return {"ok": False, "error": "args 必须是JSON对象"}
+        try:
+            if cmd == "auth":
+                return {"ok": True, "result": self._auth(connection, **args)}
+            if not connection.authenticated:
+                return {"ok": False, "error": "未认证：连接后请先发送 auth 命令"}
+            if cmd == "subscribe":
+                return {"ok": True, "result": self._subscribe(connection, **args)}
+            if cmd == "unsubscribe":
+                return {"ok": True, "result": self._unsubscribe(connection)}
+            handler = self._handlers.get(cmd)
+            if handler is None:
+                return {"ok": False, "error": f"未知命令: {cmd}"}
+            if cmd in BLOCKING_COMMANDS:
+                result = await self._loop.run_in_executor(None, lambda: handler(**args))
+            else:
+                result = handler(**args)
+            return {"ok": True, "result": result}
+        except TypeError as e:
+            return {"ok": False, "error": f"参数错误: {e}"}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    # ==================== 命令 ====================
+
+    def _auth(self, connection: _Connection, token: str) -> bool:
+        """校验令牌（常数时间比较）"""
+        if self.token is not None and not hmac.compare_digest(str(token).encode("utf-8"),
+                                                              self.token.encode("utf-8")):
+            raise PermissionError("令牌错误")
+        connection.authenticated = True
+        return True
+
+    def _cmd_start(self) -> bool:
+        if not self.engine.is_enabled:
+            raise RuntimeError("连点器未启用")
+        self.engine.start_clicking()
+        return True
+
+    def _cmd_stop(self) -> bool:
+        self.engine.stop_clicking()
+        return True
+
+    def _cmd_set_interval(self, interval: float) -> float:
+        self.engine.set_interval(float(interval))
+        return self.engine.interval
+
+    def _cmd_set_click_limit(self, count: int) -> int:
+        self.engine.set_click_limit(count)
+        return self.engine.click_limit
+
+    def _cmd_set_profile(self, name: str, seed: Optional[int] = None, **params) -> dict:
+        self.engine.set_interval_profile(name, seed=seed, **params)
+        return self.engine.get_status()['interval_profile']
+
+    def _cmd_click(self, count: int = 1, button: str = "left") -> int:
+        """预约 count 次点击（1 ~ MAX_CLICK_COUNT），返回成功预约的次数"""
+        method = {"left": "left_click", "right": "right_click", "middle": "middle_click"}.get(button)
+        if method is None:
+            raise ValueError(f"未知按钮: {button}")
+        count = int(count)
+        if not 1 <= count <= MAX_CLICK_COUNT:
+            raise ValueError(f"点击次数必须在 1 ~ {MAX_CLICK_COUNT} 之间: {count}")
+        click = getattr(self.engine.ghost, method)
+        accepted = 0
+        for _ in range(count):
+            if not click():
+                break
+            accepted += 1
+        return accepted
+
+    def _cmd_move(self, dx: int, dy: int, duration: Optional[float] = None) -> bool:
+        """沿拟人轨迹相对移动（不阻塞）"""
+        return self.engine.ghost.move_smooth(int(dx), int(dy), duration) is not None
+
+    # ==================== 订阅推送 ====================
+
+    def _subscribe(self, connection: _Connection, rate_hz: float = 10.0) -> bool:
+        connection.subscribed = True
+        connection.rate_hz = max(0.1, min(float(rate_hz), 1000.0))
+        if connection.progress_task is None:
+            connection.progress_task = self._loop.create_task(self._progress_stream(connection))
+        return True
+
+    def _unsubscribe(self, connection: _Connection) -> bool:
+        connection.subscribed = False
+        if connection.progress_task is not None:
+            connection.progress_task.cancel()
+            connection.progress_task = None
+        return True
+
+    async def _progress_stream(self, connection: _Connection):
+        """按订阅频率推送最新进度快照，中间的快照合并丢弃"""
+        last_sent = None
+        changed = self._progress_changed
+        while connection.subscribed:
+            await changed.wait()
+            snapshot = self._progress
+            if snapshot is not None and snapshot is not last_sent:
+                connection.send({"event": "progress", "data": snapshot._asdict()})
+                last_sent = snapshot
+            await asyncio.sleep(1.0 / connection.rate_hz)
+
+    def _broadcast(self, event: str, data: Any):
+        for connection in self._connections:
+            if connection.subscribed:
+                connection.send({"event": event, "data": data})
+
+    def _set_progress(self, snapshot):
+        self._progress = snapshot
+        # 唤醒所有等待中的推送任务，然后复位，下一个快照到来前推送任务会再次等待
+        self._progress_changed.set()
+        self._progress_changed.clear()
+
+    def _on_progress(self, snapshot):
+        """引擎回调（发布线程）"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._set_progress, snapshot)
+
+    def _on_status(self, is_clicking: bool):
+        """引擎回调（连点线程）"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._broadcast, "status", is_clicking)
+
+    def _on_error(self, message: str):
+        """引擎回调（连点线程）"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._broadcast, "error", message)
+
+
+def create_engine(backend: str = "com", devices: int = 1) -> ClickEngine:
+    """按后端名创建连点引擎（命令行使用）"""
+    from ghost_mouse import GhostMouse
+    if backend == "sim":
+        if devices > 1:
+            from device_pool import DevicePool
+            return ClickEngine(ghost=DevicePool.simulated(devices))
+        from ghost_backends import SimulatedBackend
+        return ClickEngine(ghost=GhostMouse(backend=SimulatedBackend()))
+    return ClickEngine()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="subLD 本地控制服务")
+    parser.add_argument("--backend", choices=("com", "sim"), default="com", help="设备后端")
+    parser.add_argument("--devices", type=int, default=1, help="模拟设备数量（仅 sim 后端）")
+    parser.add_argument("--socket", default=None, help="Unix 域套接字路径，默认在本用户的运行时目录下")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP 端口（Windows）")
+    parser.add_argument("--no-enable", action="store_true", help="启动时不连接设备")
+    args = parser.parse_args()
+
+    engine = create_engine(args.backend, args.devices)
+    if not args.no_enable:
+        engine.enable()
+    try:
+        server = ControlServer(engine, path=args.socket, port=args.port)
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    except (RuntimeError, OSError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        engine.disable()
+
+
+if __name__ == "__main__":
+    main()
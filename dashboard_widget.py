@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+实时性能仪表盘组件 - subLD项目
+显示 CPS、点击间隔抖动和设备调用延迟的迷你曲线，数据来自引擎的 perf_rings.DashboardMetrics。
+面板自身不带定时器，由所在窗口的帧定时器调用 refresh()：数据没有变化时直接返回，不重绘。
+"""
+from typing import List
+from PySide6.QtWidgets import QWidget, QFrame, QGridLayout, QLabel
+from PySide6.QtCore import QPointF, QSize
+from PySide6.QtGui import QColor, QPainter, QPen, QPolygonF
+from perf_rings import DashboardMetrics, RingBuffer
+
+
+class Sparkline(QWidget):
+    """迷你曲线：按环形缓冲中的数据画一条折线，纵轴随数据范围自动缩放"""
+
+    def __init__(self, ring: RingBuffer, color: str, parent=None):
+        """
+        :param ring: 数据来源
+        :param color: 折线颜色
+        """
+        super().__init__(parent)
+        self.ring = ring
+        self._values: List[float] = []
+        self._pen = QPen(QColor(color), 1.5)
+        self._background = QColor("#2c3e50")
+        self.setMinimumHeight(28)
+
+    def sizeHint(self):
+        return QSize(160, 28)
+
+    def refresh(self):
+        """复制最新数据并请求重绘"""
+        self.ring.snapshot(self._values)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self._background)
+        values = self._values
+        if len(values) < 2:
+            return
+        low, high = min(values), max(values)
+        span = high - low or 1.0
+        width, height = self.width() - 2, self.height() - 4
+        # x 轴按缓冲区容量固定刻度，数据从右侧进入
+        step = width / (self.ring.capacity - 1)
+        x0 = 1 + width - step * (len(values) - 1)
+        polygon = QPolygonF([QPointF(x0 + i * step, 2 + height - (v - low) / span * height)
+                             for i, v in enumerate(values)])
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self._pen)
+        painter.drawPolyline(polygon)
+
+
+class DashboardPanel(QFrame):
+    """实时性能面板：三行（名称、当前值、迷你曲线）"""
+
+    def __init__(self, metrics: DashboardMetrics, parent=None):
+        """
+        :param metrics: 引擎的仪表盘数据
+        """
+        super().__init__(parent)
+        self.metrics = metrics
+        self._seen_version = -1
+        self.setObjectName("dashboardPanel")
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setStyleSheet("""
+            QFrame#dashboardPanel {
+                background-color: #34495e;
+                border-radius: 5px;
+            }
+            QLabel {
+                color: #ecf0f1;
+                font-size: 10px;
+            }
+        """)
+        layout = QGridLayout()
+        layout.setContentsMargins(8, 6, 8, 6)
+        layout.setHorizontalSpacing(8)
+        layout.setVerticalSpacing(4)
+        self.rows = []
+        for row, (title, ring, color, fmt) in enumerate((
+                ("速率", metrics.cps, "#2ecc71", "{:.1f} CPS"),
+                ("抖动", metrics.jitter_ms, "#f1c40f", "{:.2f} ms"),
+                ("设备延迟", metrics.latency_ms, "#3498db", "{:.3f} ms"))):
+            layout.addWidget(QLabel(title), row, 0)
+            value_label = QLabel(fmt.format(0.0))
+            value_label.setMinimumWidth(70)
+            layout.addWidget(value_label, row, 1)
+            sparkline = Sparkline(ring, color)
+            layout.addWidget(sparkline, row, 2)
+            self.rows.append((ring, value_label, sparkline, fmt))
+        layout.setColumnStretch(2, 1)
+        self.setLayout(layout)
+
+    def refresh(self) -> bool:
+        """
+        由帧定时器调用：有新采样时更新数值和曲线
+        :return: 有更新返回True
+        """
+        version = self.metrics.version
+        if version == self._seen_version:
+            return False
+        self._seen_version = version
+        for ring, value_label, sparkline, fmt in self.rows:
+            text = fmt.format(ring.latest())
+            if text != value_label.text():
+                value_label.setText(text)
+            sparkline.refresh()
+        return True
+
+
+# 测试代码
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QEventLoop, QTimer
+    from ghost_backends import SimulatedBackend
+    from ghost_mouse import GhostMouse
+    from mouse_auto_clicker import MouseAutoClicker
+    from mouse_clicker_widget import MouseClickerWidget
+
+    app = QApplication(sys.argv)
+    print("=== 实时仪表盘界面线程开销测试 - subLD ===")
+    clicker = MouseAutoClicker(interval=0.001, ghost=GhostMouse(backend=SimulatedBackend()))
+    window = MouseClickerWidget(clicker=clicker)
+    window.show()
+
+    def measure(seconds: float) -> float:
+        """运行事件循环，返回界面线程每秒消耗的CPU时间(ms)"""
+        loop = QEventLoop()
+        QTimer.singleShot(int(seconds * 1000), loop.quit)
+        start_cpu = time.thread_time()
+        loop.exec()
+        return (time.thread_time() - start_cpu) * 1000 / seconds
+
+    # 不启动全局鼠标钩子，直接启用引擎
+    clicker.enable()
+    print(f"空闲: 界面线程CPU {measure(2.0):.1f} ms/s")
+    for interval in (0.01, 0.001):
+        clicker._apply_interval(interval)
+        clicker.start_clicking()
+        frames = window.frames
+        cpu = measure(5.0)
+        clicker.stop_clicking()
+        clicker.wait_stopped(1.0)
+        cps = clicker.dashboard.cps.latest()
+        print(f"目标 {1 / interval:.0f} CPS（实际 {cps:.0f}）: 界面线程CPU {cpu:.1f} ms/s，"
+              f"刷新 {window.frames - frames} 帧")
+    clicker.disable()
+    window.close()
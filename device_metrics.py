@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+设备调用指标模块 - subLD项目
+为每种设备调用记录对数分桶延迟直方图和错误计数，记录时不分配新对象
+"""
+import time
+from array import array
+from typing import Dict, Optional, Tuple
+
+# 幽灵键鼠设备方法名
+DEVICE_OPS = (
+    "LeftDown", "LeftUp", "RightDown", "RightUp", "MiddleDown", "MiddleUp",
+    "MoveTo", "MoveR", "KeyDown", "KeyUp", "KeyUpAll",
+)
+
+
+class LatencyHistogram:
+    """
+    HDR风格的对数分桶直方图（单位：纳秒）
+    每个2的幂区间再均分为 2**sub_bits 个子桶，相对误差不超过 1/2**sub_bits。
+    桶数组在创建时一次性分配，record() 只做整数运算和数组下标写入。
+    """
+
+    def __init__(self, sub_bits: int = 4, max_value_ns: int = 60 * 1_000_000_000):
+        """
+        :param sub_bits: 每个2的幂区间的子桶位数，4表示16个子桶（约6%精度）
+        :param max_value_ns: 可记录的最大值(ns)，超出部分计入最后一个桶
+        """
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.bucket_count = self._index(max_value_ns) + 1
+        self.counts = array('Q', bytes(8 * self.bucket_count))
+        self.reset()
+
+    def _index(self, value: int) -> int:
+        """数值 -> 桶下标"""
+        if value < (self.sub_count << 1):
+            return value if value > 0 else 0
+        shift = value.bit_length() - self.sub_bits - 1
+        return shift * self.sub_count + (value >> shift)
+
+    def _lower_bound(self, index: int) -> int:
+        """桶下标 -> 桶下界"""
+        if index < (self.sub_count << 1):
+            return index
+        shift = index // self.sub_count - 1
+        return (index - shift * self.sub_count) << shift
+
+    def record(self, value_ns: int):
+        """记录一个数值(ns)"""
+        index = self._index(value_ns)
+        if index >= self.bucket_count:
+            index = self.bucket_count - 1
+        self.counts[index] += 1
+        self.total_count += 1
+        self.total_ns += value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+        if value_ns < self.min_ns:
+            self.min_ns = value_ns
+
+    def merge(self, other: "LatencyHistogram"):
+        """把另一个相同分桶参数的直方图累加到本直方图"""
+        if other.sub_bits != self.sub_bits or other.bucket_count != self.bucket_count:
+            raise ValueError("直方图分桶参数不一致，无法合并")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.total_count += other.total_count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        self.min_ns = min(self.min_ns, other.min_ns)
+
+    def reset(self):
+        """清空直方图"""
+        for i in range(self.bucket_count):
+            self.counts[i] = 0
+        self.total_count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.min_ns = 1 << 62
+
+    def percentile(self, q: float) -> int:
+        """
+        分位数
+        :param q: 0~1
+        :return: 对应桶的下界(ns)
+        """
+        if not self.total_count:
+            return 0
+        target = max(1, int(q * self.total_count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(max(self._lower_bound(index), self.min_ns), self.max_ns)
+        return self.max_ns
+
+    def snapshot(self) -> dict:
+        """统计摘要（单位：毫秒）"""
+        n = self.total_count
+        return {
+            'count': n,
+            'mean_ms': self.total_ns / n / 1e6 if n else 0.0,
+            'min_ms': self.min_ns / 1e6 if n else 0.0,
+            'p50_ms': self.percentile(0.50) / 1e6,
+            'p90_ms': self.percentile(0.90) / 1e6,
+            'p99_ms': self.percentile(0.99) / 1e6,
+            'max_ms': self.max_ns / 1e6,
+        }
+
+
+class DeviceMetrics:
+    """
+    每种设备调用的延迟直方图与错误计数
+    record() 只在设备线程上调用；reset() 整体替换直方图，不与记录线程争用。
+    """
+
+    def __init__(self, enabled: bool = True, sub_bits: int = 4):
+        """
+        :param enabled: 是否启用记录；关闭时设备线程完全跳过计时
+        :param sub_bits: 直方图子桶位数
+        """
+        self.enabled = enabled
+        self.sub_bits = sub_bits
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._errors: Dict[str, int] = {}
+        self.reset()
+
+    def reset(self):
+        """清空所有直方图和错误计数"""
+        self._histograms = {op: LatencyHistogram(self.sub_bits) for op in DEVICE_OPS}
+        self._errors = dict.fromkeys(DEVICE_OPS, 0)
+        self._since = time.time()
+
+    def record(self, op: str, duration_ns: int, ok: bool):
+        """
+        记录一次设备调用
+        :param op: 设备方法名
+        :param duration_ns: 调用耗时(ns)
+        :param ok: 调用是否成功
+        """
+        histogram = self._histograms.get(op)
+        if histogram is None:
+            histogram = self._histograms[op] = LatencyHistogram(self.sub_bits)
+            self._errors[op] = 0
+        histogram.record(duration_ns)
+        if not ok:
+            self._errors[op] += 1
+
+    def merge(self, other: "DeviceMetrics"):
+        """把另一组指标累加到本组（用于汇总多台设备），统计起始时间取较早者"""
+        for op, histogram in other._histograms.items():
+            mine = self._histograms.get(op)
+            if mine is None:
+                mine = self._histograms[op] = LatencyHistogram(self.sub_bits)
+                self._errors[op] = 0
+            mine.merge(histogram)
+            self._errors[op] += other._errors.get(op, 0)
+        self._since = min(self._since, other._since)
+
+    def totals(self, ops) -> Tuple[int, int, int]:
+        """
+        若干种调用的累计 (次数, 总耗时ns, 错误数)，不计算分位数，可在点击循环中频繁读取
+        :param ops: 设备方法名序列
+        """
+        count = total_ns = errors = 0
+        histograms = self._histograms
+        for op in ops:
+            histogram = histograms.get(op)
+            if histogram is not None:
+                count += histogram.total_count
+                total_ns += histogram.total_ns
+                errors += self._errors.get(op, 0)
+        return count, total_ns, errors
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """
+        获取指标快照
+        :param reset: 读取后是否清空
+        :return: {'since': 统计起始时间戳, 'ops': {方法名: {count, mean_ms, p50_ms, ..., errors}}}
+        """
+        histograms, errors, since = self._histograms, self._errors, self._since
+        if reset:
+            self.reset()
+        ops = {}
+        for op, histogram in histograms.items():
+            if histogram.total_count or errors.get(op):
+                summary = histogram.snapshot()
+                summary['errors'] = errors.get(op, 0)
+                ops[op] = summary
+        return {'enabled': self.enabled, 'since': since, 'ops': ops}
+
+
+def measure_overhead(calls: int = 100000) -> dict:
+    """
+    测量指标记录的开销：分别在开启/关闭指标时通过设备线程执行相同数量的模拟设备调用
+    :param calls: 每轮调用次数
+    :return: 每次调用的平均耗时(ns)及开销
+    """
+    from device_worker import DeviceWorker
+    from ghost_backends import SimulatedDevice
+
+    def run(metrics: Optional[DeviceMetrics]) -> float:
+        worker = DeviceWorker(SimulatedDevice, metrics=metrics)
+        worker.start()
+        worker.submit_batch([("LeftDown", ())] * 1000)
+        worker.wait_idle()
+        start = time.perf_counter_ns()
+        worker.submit_batch([("LeftDown", ())] * calls)
+        worker.wait_idle()
+        elapsed = time.perf_counter_ns() - start
+        worker.stop()
+        return elapsed / calls
+
+    off = run(DeviceMetrics(enabled=False))
+    on = run(DeviceMetrics(enabled=True))
+    return {'per_call_off_ns': off, 'per_call_on_ns': on, 'overhead_ns': on - off}
+
+
+# 测试代码
+if __name__ == "__main__":
+    print("=== 设备调用指标测试 - subLD ===")
+    result = measure_overhead()
+    print(f"关闭指标: {result['per_call_off_ns']:.0f} ns/次, "
+          f"开启指标: {result['per_call_on_ns']:.0f} ns/次, "
+          f"开销: {result['overhead_ns']:.0f} ns/次")
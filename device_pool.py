@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+设备池模块 - subLD项目
+同时驱动多台幽灵键鼠：每台设备一个 GhostMouse（各自的设备线程），点击按策略分摊到健康的设备上，
+总吞吐不再受单台USB设备命令速率的限制。DevicePool 提供与 GhostMouse 相同的连点接口，
+可直接作为 MouseAutoClicker 的 ghost 参数。
+"""
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from device_metrics import DeviceMetrics
+from ghost_backends import ComBackend, DeviceBackend, SimulatedBackend
+from ghost_mouse import DEFAULT_HOLD, GhostMouse
+from synthetic_filter import SyntheticEventFilter
+from clicker_log import get_logger
+
+logger = get_logger("device_pool")
+
+# 分摊策略
+STRATEGY_ROUND_ROBIN = "round_robin"    # 依次轮流
+STRATEGY_LEAST_LOADED = "least_loaded"  # 选择设备线程待执行命令最少的设备
+STRATEGIES = (STRATEGY_ROUND_ROBIN, STRATEGY_LEAST_LOADED)
+
+
+class PoolMember:
+    """设备池中的一台设备及其健康状态和计数"""
+
+    def __init__(self, index: int, ghost: GhostMouse):
+        self.index = index
+        self.ghost = ghost
+        self.commands = 0            # 成功分派的点击/按键次数
+        self.failures = 0            # 分派失败次数
+        self.consecutive_failures = 0
+        self.seen_errors = 0         # 上次分派时设备线程的错误计数
+        self.seen_executed = 0       # 上次分派时设备线程成功执行的命令数
+        self.retry_at_ns = 0         # 冷却结束时间，之前不再分派
+        self.connected_at = 0.0
+
+    def is_available(self, now_ns: int) -> bool:
+        return self.ghost.check_connection() and now_ns >= self.retry_at_ns
+
+    def get_stats(self) -> dict:
+        elapsed = time.time() - self.connected_at if self.connected_at else 0.0
+        stats = self.ghost.get_device_stats()[0]
+        stats.update({
+            'index': self.index,
+            'healthy': self.ghost.check_connection() and time.perf_counter_ns() >= self.retry_at_ns,
+            'commands': self.commands,
+            'failures': self.failures,
+            'throughput': self.commands / elapsed if elapsed > 0 else 0.0,
+        })
+        return stats
+
+
+class DevicePool:
+    """
+    幽灵键鼠设备池
+    点击类命令（left_click/right_click/middle_click/key_press）每次分派给一台可用设备；
+    同步类命令（left_up/key_up_all 等）广播给所有已连接设备，保证不会有按键残留。
+    某台设备连续失败达到阈值后进入冷却，期间流量转移到其他设备。
+    """
+
+    def __init__(self, backends: Iterable[DeviceBackend], hold: float = DEFAULT_HOLD,
+                 strategy: str = STRATEGY_ROUND_ROBIN, max_failures: int = 3,
+                 cooldown: float = 1.0, metrics_enabled: bool = True, compress_hold: bool = True):
+        """
+        :param backends: 每台设备一个后端
+        :param hold: 点击/按键的默认按住时长(秒)
+        :param strategy: 分摊策略，"round_robin" 或 "least_loaded"
+        :param max_failures: 连续失败多少次后暂停向该设备分派
+        :param cooldown: 暂停分派的时长(秒)
+        :param metrics_enabled: 是否记录设备调用指标
+        :param compress_hold: 使用默认按住时长时，点击过密是否压缩按住时长（见 GhostMouse）
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的分摊策略: {strategy}")
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.cooldown_ns = int(cooldown * 1e9)
+        # 所有设备共用一个合成事件过滤器：监听器无法区分事件来自哪台设备
+        self.synthetic_filter = SyntheticEventFilter()
+        self.members: List[PoolMember] = []
+        for index, backend in enumerate(backends):
+            ghost = GhostMouse(hold=hold, backend=backend, metrics_enabled=metrics_enabled,
+                               compress_hold=compress_hold)
+            ghost.synthetic_filter = self.synthetic_filter
+            self.members.append(PoolMember(index, ghost))
+        if not self.members:
+            raise ValueError("设备池至少需要一个设备后端")
+        self._next = 0
+        self._lock = threading.Lock()
+        # 设备池直接连接每台设备，不使用后端探测器（见 set_prober）
+        self.prober = None
+
+    @classmethod
+    def from_progids(cls, progids: Iterable[str], **kwargs) -> "DevicePool":
+        """
+        按COM ProgID列表创建设备池，每个ProgID对应一台设备
+        注意：幽灵键鼠的COM组件不提供枚举或按序号选择设备的接口，同型号的多台设备共用一个ProgID，
+        对同一ProgID多次 Dispatch 得到的都是同一台设备。因此这里不做自动发现，
+        只支持注册了不同ProgID的设备（如不同型号），重复的ProgID直接拒绝。
+        :raises ValueError: ProgID重复
+        """
+        progids = list(progids)
+        duplicates = sorted({progid for progid in progids if progids.count(progid) > 1})
+        if duplicates:
+            raise ValueError(f"同一ProgID只能对应一台设备（COM组件无法区分同型号的多台设备）: "
+                             f"{', '.join(duplicates)}")
+        return cls([ComBackend(progid) for progid in progids], **kwargs)
+
+    @classmethod
+    def simulated(cls, count: int, **device_kwargs) -> "DevicePool":
+        """
+        创建由模拟设备组成的设备池（无硬件测试用）
+        :param count: 设备数量
+        :param device_kwargs: 传给每个 SimulatedDevice 的参数，seed 会按设备序号偏移
+        """
+        seed = device_kwargs.pop("seed", None)
+        backends = [SimulatedBackend(seed=None if seed is None else seed + i, **device_kwargs)
+                    for i in range(count)]
+        return cls(backends)
+
+    # ==================== 连接管理 ====================
+
+    @property
+    def is_connected(self) -> bool:
+        """至少有一台设备已连接"""
+        return any(member.ghost.check_connection() for member in self.members)
+
+    def connect(self, use_prober: bool = True) -> bool:
+        """
+        并行连接所有设备（每台设备的初始化在各自线程中进行，互不等待）
+        :param use_prober: 见 GhostMouse.connect
+        :return: 至少一台设备连接成功返回True
+        """
+        threads = [threading.Thread(target=member.ghost.connect, args=(use_prober,),
+                                    name=f"subLD-pool-connect-{member.index}")
+                   for member in self.members if not member.ghost.check_connection()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        now = time.time()
+        for member in self.members:
+            if member.ghost.check_connection() and not member.connected_at:
+                member.connected_at = now
+            member.consecutive_failures = 0
+            member.seen_errors = member.seen_executed = 0
+            member.retry_at_ns = 0
+        connected = sum(1 for member in self.members if member.ghost.check_connection())
+        logger.info("🔗 设备池已连接 %d/%d 台设备", connected, len(self.members))
+        return connected > 0
+
+    def disconnect(self, rewarm: bool = True):
+        """断开所有设备"""
+        for member in self.members:
+            member.ghost.disconnect(rewarm)
+            member.connected_at = 0.0
+
+    def check_connection(self) -> bool:
+        return self.is_connected
+
+    def set_prober(self, prober):
+        """
+        设备池不使用后端探测器：探测器只为选中的一个后端预热一条连接，而设备池的每台设备
+        各有固定的后端，connect() 时并行直接连接。保留该方法以便与 GhostMouse 互换。
+        """
+        if prober is not None:
+            logger.info("ℹ️ 设备池直接连接每台设备，不使用后台探测预热")
+
+    def primary(self) -> Optional[GhostMouse]:
+        """第一台已连接的设备，光标移动类命令发给它（多台设备共用同一个系统光标）"""
+        for member in self.members:
+            if member.ghost.check_connection():
+                return member.ghost
+        return None
+
+    # ==================== 分派 ====================
+
+    def _pick(self) -> Optional[PoolMember]:
+        """按策略选出一台可用设备，没有可用设备时返回None"""
+        now_ns = time.perf_counter_ns()
+        members = self.members
+        count = len(members)
+        with self._lock:
+            start = self._next
+            if self.strategy == STRATEGY_LEAST_LOADED:
+                best = None
+                best_pending = 0
+                for offset in range(count):
+                    member = members[(start + offset) % count]
+                    if not member.is_available(now_ns):
+                        continue
+                    # 设备可能在其他线程中刚刚断开，engine 已被置为 None
+                    engine = member.ghost.engine
+                    if engine is None:
+                        continue
+                    pending = engine.pending()
+                    if best is None or pending < best_pending:
+                        best, best_pending = member, pending
+                if best is not None:
+                    self._next = (best.index + 1) % count
+                return best
+            for offset in range(count):
+                member = members[(start + offset) % count]
+                if member.is_available(now_ns):
+                    self._next = (member.index + 1) % count
+                    return member
+        return None
+
+    def _dispatch(self, method: str, *args) -> bool:
+        """
+        把一条点击类命令分派给一台设备，失败时换下一台设备重试
+        :param method: GhostMouse 方法名，如 "left_click"
+        :return: 有设备成功接受命令返回True
+        """
+        for _ in range(len(self.members)):
+            member = self._pick()
+            if member is None:
+                return False
+            accepted = getattr(member.ghost, method)(*args)
+            # 点击是异步执行的，设备线程上的失败要到下一次分派才会体现在返回值上，
+            # 因此以设备线程错误计数是否增长判断设备是否健康
+            engine = member.ghost.engine
+            errors = engine.error_count if engine else 0
+            executed = engine.executed_count if engine else 0
+            failed = not accepted or errors != member.seen_errors
+            succeeded = not failed and executed != member.seen_executed
+            member.seen_errors, member.seen_executed = errors, executed
+            if accepted:
+                member.commands += 1
+            else:
+                member.failures += 1
+            if not failed:
+                if succeeded:
+                    member.consecutive_failures = 0
+                return True
+            member.consecutive_failures += 1
+            if member.consecutive_failures >= self.max_failures:
+                member.retry_at_ns = time.perf_counter_ns() + self.cooldown_ns
+                member.consecutive_failures = 0
+                logger.warning("⚠️ 设备 %d 连续失败，暂停分派 %.1f 秒", member.index, self.cooldown_ns / 1e9)
+            if accepted:
+                return True
+        return False
+
+    def _broadcast(self, method: str, *args) -> bool:
+        """
+        把一条命令发给所有已连接设备
+        :return: 所有已连接设备都成功返回True
+        """
+        ok = True
+        for member in self.members:
+            if member.ghost.check_connection():
+                ok = getattr(member.ghost, method)(*args) and ok
+        return ok
+
+    def left_click(self) -> bool:
+        return self._dispatch("left_click")
+
+    def right_click(self) -> bool:
+        return self._dispatch("right_click")
+
+    def middle_click(self) -> bool:
+        return self._dispatch("middle_click")
+
+    def key_press(self, key: str) -> bool:
+        return self._dispatch("key_press", key)
+
+    def click_at(self, button: str, at_ns: int = 0) -> bool:
+        """预约在指定时间点击（分派给一台设备），见 GhostMouse.click_at"""
+        return self._dispatch("click_at", button, at_ns)
+
+    def left_up(self) -> bool:
+        return self._broadcast("left_up")
+
+    def move_to(self, x: int, y: int) -> bool:
+        ghost = self.primary()
+        return ghost is not None and ghost.move_to(x, y)
+
+    def move_relative(self, dx: int, dy: int) -> bool:
+        ghost = self.primary()
+        return ghost is not None and ghost.move_relative(dx, dy)
+
+    def move_smooth(self, dx: int, dy: int, duration: Optional[float] = None, generator=None):
+        """沿拟人轨迹相对移动（由第一台已连接设备执行），见 GhostMouse.move_smooth"""
+        ghost = self.primary()
+        return ghost.move_smooth(dx, dy, duration, generator) if ghost is not None else None
+
+    def pending(self) -> int:
+        """所有设备线程中尚未执行的命令总数"""
+        return sum(member.ghost.pending() for member in self.members)
+
+    def key_up_all(self) -> bool:
+        return self._broadcast("key_up_all")
+
+    def set_hold(self, button: str, hold: float, compress: bool = False):
+        for member in self.members:
+            member.ghost.set_hold(button, hold, compress)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待所有设备的预约命令执行完毕"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for member in self.members:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not member.ghost.wait_idle(remaining):
+                return False
+        return True
+
+    # ==================== 统计 ====================
+
+    def get_device_stats(self) -> List[dict]:
+        """每台设备的健康状态、分派计数和吞吐量"""
+        return [member.get_stats() for member in self.members]
+
+    def get_metrics(self, reset: bool = False) -> dict:
+        """
+        汇总所有设备的调用指标
+        :param reset: 读取后是否清空
+        :return: 与 GhostMouse.get_metrics 格式相同的快照，另含 'devices' 每台设备的快照
+        """
+        total = DeviceMetrics()
+        devices = []
+        for member in self.members:
+            metrics = member.ghost.metrics
+            total.merge(metrics)
+            devices.append(metrics.snapshot(reset=reset))
+        snapshot = total.snapshot()
+        snapshot['enabled'] = any(member.ghost.metrics.enabled for member in self.members)
+        snapshot['devices'] = devices
+        return snapshot
+
+    def get_call_totals(self, ops) -> tuple:
+        """所有设备指定调用的累计 (次数, 总耗时ns, 错误数)"""
+        count = total_ns = errors = 0
+        for member in self.members:
+            c, t, e = member.ghost.get_call_totals(ops)
+            count += c
+            total_ns += t
+            errors += e
+        return count, total_ns, errors
+
+    def reset_metrics(self):
+        for member in self.members:
+            member.ghost.reset_metrics()
+            member.commands = 0
+            member.failures = 0
+
+    def set_metrics_enabled(self, enabled: bool):
+        for member in self.members:
+            member.ghost.set_metrics_enabled(enabled)
+
+    # ==================== 追踪 ====================
+
+    def start_trace(self, path: str, capacity: int = 32768) -> bool:
+        """
+        每台设备各写一个追踪文件：trace.sldt -> trace.0.sldt、trace.1.sldt ...
+        :param path: 追踪文件路径
+        :param capacity: 每组内存缓冲的记录数
+        """
+        stem, ext = os.path.splitext(path)
+        return all([member.ghost.start_trace(f"{stem}.{member.index}{ext}", capacity)
+                    for member in self.members])
+
+    def stop_trace(self) -> List[Optional[dict]]:
+        """结束所有设备的追踪，返回每台设备的追踪统计"""
+        return [member.ghost.stop_trace() for member in self.members]
+
+    def get_trace_stats(self) -> Optional[List[Optional[dict]]]:
+        stats = [member.ghost.get_trace_stats() for member in self.members]
+        return stats if any(stats) else None
+
+
+# 测试代码
+if __name__ == "__main__":
+    from ghost_backends import constant_latency
+
+    print("=== 设备池测试 - subLD ===")
+    # 每台模拟设备每次调用耗时1ms，单台约500次点击/秒
+    for count in (1, 2, 4):
+        pool = DevicePool.simulated(count, latency=constant_latency(0.001), seed=1)
+        pool.connect()
+        start = time.perf_counter()
+        for _ in range(2000):
+            pool.left_click()
+        pool.wait_idle(timeout=30)
+        elapsed = time.perf_counter() - start
+        print(f"{count} 台设备: 2000 次点击耗时 {elapsed:.2f} 秒 ({2000 / elapsed:.0f} CPS)")
+        for stats in pool.get_device_stats():
+            print(f"  设备 {stats['index']}: 分派 {stats['commands']} 次, 执行 {stats['executed']} 条命令")
+        pool.disconnect()
+
+    # 故障转移：一台设备拔出后流量转移到其他设备
+    pool = DevicePool.simulated(3)
+    pool.connect()
+    pool.members[0].ghost.backend.device.unplug()
+    for _ in range(300):
+        pool.left_click()
+        time.sleep(0.001)
+    pool.wait_idle(timeout=5)
+    print([(s['index'], s['healthy'], s['commands'], s['failures']) for s in pool.get_device_stats()])
+    pool.disconnect()
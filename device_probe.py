@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+设备探测与预热模块 - subLD项目
+启动时在后台并行尝试所有已知的ProgID/后端，每个候选在自己的设备线程中创建设备对象；
+选出的后端记录到本地配置文件，下次启动优先使用，创建好的设备线程作为预热连接保留，
+启用连点时 GhostMouse.connect() 直接接管，无需再等待 Dispatch。
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from device_worker import DeviceWorker
+from ghost_backends import BINDING_DISPID, KNOWN_PROGIDS, ComBackend, DeviceBackend
+from clicker_log import get_logger
+
+logger = get_logger("device_probe")
+
+# 探测结果配置文件，可用环境变量 SUBLD_CONFIG 指定
+CONFIG_PATH = os.environ.get("SUBLD_CONFIG") or os.path.join(os.path.expanduser("~"), ".subld", "device.json")
+
+# 探测状态
+PROBE_IDLE = "idle"
+PROBE_RUNNING = "probing"
+PROBE_DONE = "done"
+
+
+def load_config(path: Optional[str] = None) -> dict:
+    """
+    读取探测配置
+    :return: 配置字典，文件不存在或损坏时返回空字典
+    """
+    try:
+        with open(path or CONFIG_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_config(data: dict, path: Optional[str] = None):
+    """写入探测配置（先写临时文件再替换，避免写到一半的文件）"""
+    path = path or CONFIG_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def default_candidates(binding: str = BINDING_DISPID) -> List[DeviceBackend]:
+    """
+    默认候选：所有已知ProgID的COM后端
+    :param binding: COM方法绑定方式，见 ghost_backends.BINDINGS
+    """
+    return [ComBackend(progid, binding=binding) for progid in KNOWN_PROGIDS]
+
+
+class DeviceProber:
+    """
+    后端探测器
+    上次选中的后端探测成功时立即选用；否则选用最先成功的候选。
+    未选中的候选设备线程随即关闭，选中的保留为预热连接，由 take_worker() 取走；
+    取走后的连接断开时可调用 rewarm() 在后台再准备一个。
+    """
+
+    def __init__(self, candidates: Optional[List[DeviceBackend]] = None, config_path: Optional[str] = None,
+                 timeout: float = 5.0, on_done: Optional[Callable[[dict], None]] = None):
+        """
+        :param candidates: 候选后端列表，默认为所有已知ProgID
+        :param config_path: 配置文件路径，默认为 CONFIG_PATH
+        :param timeout: 单个候选创建设备的超时时间(秒)
+        :param on_done: 探测结束时在探测线程中调用的回调 (get_stats() 的结果)
+        """
+        self.candidates = list(candidates) if candidates is not None else default_candidates()
+        self.config_path = config_path
+        self.timeout = timeout
+        self.on_done = on_done
+        self.state = PROBE_IDLE
+        self.winner: Optional[DeviceBackend] = None
+        self.results: List[dict] = []
+        self.elapsed_ms = 0.0
+        self.cached = load_config(config_path).get("backend")
+        self.warm_error = ""
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._pending = set()
+        self._successes: List[Tuple[DeviceBackend, DeviceWorker]] = []
+        self._warm: Optional[DeviceWorker] = None
+        self._warm_thread: Optional[threading.Thread] = None
+        self._start_ns = 0
+        self._closed = False
+        self._finished = False
+
+    def start(self) -> "DeviceProber":
+        """在后台开始探测（不阻塞），返回自身便于链式调用"""
+        if self.state != PROBE_IDLE:
+            return self
+        self.state = PROBE_RUNNING
+        self._start_ns = time.perf_counter_ns()
+        # 上次选中的后端排在最前面
+        self.candidates.sort(key=lambda backend: backend.describe() != self.cached)
+        self._pending = {backend.describe() for backend in self.candidates}
+        if not self.candidates:
+            self._finish()
+            return self
+        for backend in self.candidates:
+            threading.Thread(target=self._probe_one, args=(backend,), daemon=True,
+                             name=f"subLD-probe-{backend.describe()}").start()
+        return self
+
+    def _probe_one(self, backend: DeviceBackend):
+        """在独立线程中创建一个候选的设备线程"""
+        name = backend.describe()
+        start = time.perf_counter_ns()
+        worker = DeviceWorker(backend.open, backend.close, name=f"subLD-device-{name}")
+        error = ""
+        try:
+            worker.start(timeout=self.timeout)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        result = {'backend': name, 'ok': not error, 'elapsed_ms': (time.perf_counter_ns() - start) / 1e6,
+                  'error': error}
+
+        losers = []
+        with self._lock:
+            self.results.append(result)
+            self._pending.discard(name)
+            if not error:
+                if self.winner is None and not self._closed:
+                    self._successes.append((backend, worker))
+                else:
+                    losers.append(worker)
+            if self.winner is None and not self._closed:
+                chosen = self._choose()
+                if chosen is not None:
+                    self.winner = chosen[0]
+                    self._warm = chosen[1]
+                    losers.extend(w for b, w in self._successes if w is not chosen[1])
+                    self._successes = []
+            finished = not self._finished and (self.winner is not None or not self._pending)
+            if finished:
+                self._finished = True
+        for loser in losers:
+            loser.stop(drain=False)
+        if finished:
+            self._finish()
+
+    def _choose(self) -> Optional[Tuple[DeviceBackend, DeviceWorker]]:
+        """按规则选出胜者：上次的后端成功则选它，上次的后端已失败或没有记录时选最先成功的"""
+        for backend, worker in self._successes:
+            if backend.describe() == self.cached:
+                return backend, worker
+        if self.cached in self._pending:
+            return None
+        return self._successes[0] if self._successes else None
+
+    def _finish(self):
+        """探测结束：记录耗时，保存选中的后端，通知等待者"""
+        self.elapsed_ms = (time.perf_counter_ns() - self._start_ns) / 1e6
+        self.state = PROBE_DONE
+        if self.winner is not None:
+            logger.info("✅ 设备探测完成: %s (%.0f ms)", self.winner.describe(), self.elapsed_ms)
+            try:
+                save_config({
+                    'backend': self.winner.describe(),
+                    'progid': getattr(self.winner, "progid", None),
+                    'probed_at': time.time(),
+                    'results': list(self.results),
+                }, self.config_path)
+            except OSError as e:
+                logger.warning("⚠️ 保存设备配置失败: %s", e)
+        else:
+            logger.warning("⚠️ 设备探测未找到可用的幽灵键鼠 (%.0f ms)", self.elapsed_ms)
+        self._ready.set()
+        # 已关闭（如界面已销毁）时不再回调
+        if self.on_done is not None and not self._closed:
+            self.on_done(self.get_stats())
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待探测（或重新预热）结束，结束返回True"""
+        return self._ready.wait(timeout)
+
+    def take_worker(self, timeout: Optional[float] = None) -> Optional[Tuple[DeviceBackend, DeviceWorker]]:
+        """
+        取走预热好的设备线程（探测或预热尚未结束时等待）
+        :param timeout: 最长等待时间(秒)
+        :return: (后端, 运行中的设备线程)；没有可用的预热连接时返回None
+        """
+        if self.state == PROBE_IDLE or not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            worker, self._warm = self._warm, None
+        if worker is None or not worker.is_running:
+            return None
+        return self.winner, worker
+
+    def rewarm(self):
+        """在后台为选中的后端准备新的预热连接（已有或正在准备时忽略）"""
+        with self._lock:
+            if (self._closed or self.winner is None or self._warm is not None
+                    or not self._ready.is_set()):
+                return
+            self._ready.clear()
+            self._warm_thread = threading.Thread(target=self._warm_main, daemon=True, name="subLD-prewarm")
+            self._warm_thread.start()
+
+    def _warm_main(self):
+        backend = self.winner
+        worker = DeviceWorker(backend.open, backend.close, name=f"subLD-device-{backend.describe()}")
+        try:
+            worker.start(timeout=self.timeout)
+            self.warm_error = ""
+        except Exception as e:
+            worker = None
+            self.warm_error = str(e) or type(e).__name__
+        with self._lock:
+            if self._closed and worker is not None:
+                stale, worker = worker, None
+            else:
+                stale = None
+            self._warm = worker
+        if stale is not None:
+            stale.stop(drain=False)
+        self._ready.set()
+
+    def close(self):
+        """关闭探测器：释放未被取走的预热连接，不再重新预热"""
+        with self._lock:
+            self._closed = True
+            worker, self._warm = self._warm, None
+            losers = [w for _, w in self._successes]
+            self._successes = []
+            thread = self._warm_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.timeout)
+        for w in losers + ([worker] if worker is not None else []):
+            w.stop(drain=False)
+
+    def get_stats(self) -> dict:
+        """
+        探测状态，供状态面板显示
+        :return: {'state', 'winner', 'cached', 'elapsed_ms', 'warm', 'results': [{backend, ok, elapsed_ms, error}]}
+        """
+        return {
+            'state': self.state,
+            'winner': self.winner.describe() if self.winner is not None else None,
+            'cached': self.cached,
+            'elapsed_ms': self.elapsed_ms,
+            'warm': self._warm is not None,
+            'warm_error': self.warm_error,
+            'results': list(self.results),
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import tempfile
+    from ghost_backends import SimulatedBackend, SimulatedDevice
+    from ghost_mouse import GhostMouse
+
+    class SlowBackend(SimulatedBackend):
+        """模拟 Dispatch 较慢的设备"""
+        def __init__(self, name: str, delay: float):
+            super().__init__()
+            self.label = name
+            self.delay = delay
+
+        def open(self) -> SimulatedDevice:
+            time.sleep(self.delay)
+            return super().open()
+
+        def describe(self) -> str:
+            return self.label
+
+    print("=== 设备探测与预热测试 - subLD ===")
+    config_path = os.path.join(tempfile.mkdtemp(), "device.json")
+    candidates = default_candidates() + [SlowBackend("sim:slow", 0.3), SlowBackend("sim:fast", 0.1)]
+
+    prober = DeviceProber(candidates, config_path=config_path).start()
+    prober.wait()
+    time.sleep(0.3)  # 等较慢的候选也结束，便于展示完整结果
+    for result in prober.get_stats()['results']:
+        print(f"  {result['backend']:<20} {'✓' if result['ok'] else '✗'} {result['elapsed_ms']:7.1f} ms "
+              f"{result['error']}")
+    print(f"选中: {prober.winner.describe()}，配置: {load_config(config_path)['backend']}")
+
+    ghost = GhostMouse(backend=candidates[-1])
+    ghost.set_prober(prober)
+    start = time.perf_counter()
+    ghost.connect()
+    print(f"启用耗时(预热): {(time.perf_counter() - start) * 1000:.2f} ms")
+    ghost.disconnect()
+    prober.wait()
+    start = time.perf_counter()
+    ghost.connect()
+    print(f"再次启用耗时(重新预热): {(time.perf_counter() - start) * 1000:.2f} ms")
+    ghost.disconnect()
+    prober.close()
+
+    # 第二次启动：上次选中的 sim:fast 成功后立即选用，不等较慢的候选
+    second = DeviceProber([SlowBackend("sim:slow", 0.05), SlowBackend("sim:fast", 0.1)],
+                          config_path=config_path).start()
+    second.wait()
+    print(f"第二次启动: 缓存 {second.cached} -> 选中 {second.winner.describe()} ({second.elapsed_ms:.0f} ms)")
+    second.close()
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+设备命令追踪模块 - subLD项目
+开启后设备线程每执行一条设备命令，就把 (开始时间ns, 命令, 参数, 结果, 耗时ns) 写入预分配的列式数组；
+数组写满时交给后台线程写入文件，设备线程换用另一组空数组继续记录，不做任何文件操作和格式化。
+文件格式（小端）：
+    文件头  b"SLDTRACE" | 版本 u16 | 元数据长度 u32 | 元数据 JSON（命令表、后端、起始时间等）
+    数据块  b"BLK1" | 记录数 u32 | 新增字符串长度 u32 | 新增字符串 JSON 列表 |
+            t_ns i64[n] | dur_ns i64[n] | a0 i32[n] | a1 i32[n] | op u8[n] | result i8[n]
+按键名等字符串参数记为字符串表下标，字符串表随数据块增量写出。
+分析见 trace_analyzer.py。
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from clicker_log import get_logger
+from ghost_backends import DEVICE_METHODS
+
+logger = get_logger("device_trace")
+
+MAGIC = b"SLDTRACE"
+BLOCK_MAGIC = b"BLK1"
+VERSION = 1
+# 命令码：设备方法按 DEVICE_METHODS 的顺序编号，其他命令记为 OP_OTHER
+OP_OTHER = 255
+# a0/a1 列为 int32，超出范围的整数参数（如多屏坐标异常值）截断到边界
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+# 结果码
+RESULT_OK = 1
+RESULT_ZERO = 0       # 设备方法返回0
+RESULT_ERROR = -1     # 设备方法抛出异常
+
+FILE_HEADER = struct.Struct("<8sHI")
+BLOCK_HEADER = struct.Struct("<4sII")
+# 列定义：(名称, array 类型码)，写入顺序与文件格式一致
+COLUMNS = (("t_ns", "q"), ("dur_ns", "q"), ("a0", "i"), ("a1", "i"), ("op", "B"), ("result", "b"))
+
+
+class _Buffer:
+    """一组预分配的列式数组"""
+
+    def __init__(self, capacity: int):
+        self.columns = {name: array(code, bytes(array(code).itemsize * capacity)) for name, code in COLUMNS}
+        self.count = 0
+        self.strings: List[str] = []
+
+
+class CommandTracer:
+    """
+    设备命令追踪器
+    record() 只在设备线程中调用（单写者）；写满的缓冲交给后台线程写盘，
+    后台线程跟不上、空闲缓冲用完时丢弃记录并计数，绝不阻塞设备线程。
+    写文件失败后追踪标记为损坏：文件截断到最后一个完整数据块，之后的数据块不再写出
+    （后续块引用的字符串下标依赖失败块中的新增字符串，继续写会得到错误的按键名）。
+    """
+
+    def __init__(self, path: str, capacity: int = 32768, buffers: int = 4, metadata: Optional[dict] = None):
+        """
+        :param path: 追踪文件路径
+        :param capacity: 每组缓冲的记录数
+        :param buffers: 预分配的缓冲组数
+        :param metadata: 写入文件头的附加信息（如版本、后端）
+        """
+        self.path = path
+        self.capacity = capacity
+        self.op_codes: Dict[str, int] = {name: index for index, name in enumerate(DEVICE_METHODS)}
+        self.recorded = 0
+        self.dropped = 0
+        self.blocks = 0
+        self.bytes_written = 0
+        # 写文件失败后为True，之后的记录只计数不写出
+        self.broken = False
+        self.lost = 0
+        self._strings: Dict[str, int] = {}
+        self._free = queue.SimpleQueue()
+        for _ in range(max(2, buffers) - 1):
+            self._free.put(_Buffer(capacity))
+        self._full = queue.SimpleQueue()
+        self._buffer = _Buffer(capacity)
+        self._bind(self._buffer)
+        self._closed = False
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        meta = {
+            'ops': list(DEVICE_METHODS),
+            'created': time.time(),
+            'perf_counter_ns': time.perf_counter_ns(),
+            'capacity': capacity,
+        }
+        meta.update(metadata or {})
+        payload = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(payload)) + payload)
+        self.bytes_written = self._file.tell()
+        self._thread = threading.Thread(target=self._flush_main, name="subLD-trace", daemon=True)
+        self._thread.start()
+
+    def _bind(self, buffer: _Buffer):
+        """把当前缓冲的列缓存为属性，record() 中少一次字典查找"""
+        columns = buffer.columns
+        self._t = columns['t_ns']
+        self._dur = columns['dur_ns']
+        self._a0 = columns['a0']
+        self._a1 = columns['a1']
+        self._op = columns['op']
+        self._result = columns['result']
+        self._n = buffer.count
+
+    def _arg(self, value) -> int:
+        """参数转为整数：整数截断到 int32 范围后保存，字符串记为字符串表下标"""
+        if isinstance(value, int):
+            return min(max(value, INT32_MIN), INT32_MAX)
+        text = str(value)
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._strings)
+            self._buffer.strings.append(text)
+        return index
+
+    def record(self, op, args: tuple, start_ns: int, dur_ns: int, result: int):
+        """
+        记录一条设备命令（设备线程）
+        :param op: 设备方法名
+        :param args: 参数
+        :param start_ns: 开始时间（perf_counter_ns）
+        :param dur_ns: 耗时(ns)
+        :param result: 结果码 RESULT_OK / RESULT_ZERO / RESULT_ERROR
+        """
+        i = self._n
+        if i >= self.capacity:
+            if not self._swap():
+                self.dropped += 1
+                return
+            i = 0
+        self._t[i] = start_ns
+        self._dur[i] = dur_ns
+        self._op[i] = self.op_codes.get(op, OP_OTHER)
+        self._result[i] = result
+        if args:
+            self._a0[i] = self._arg(args[0])
+            self._a1[i] = self._arg(args[1]) if len(args) > 1 else 0
+        else:
+            self._a0[i] = 0
+            self._a1[i] = 0
+        self._n = i + 1
+
+    def _swap(self) -> bool:
+        """当前缓冲写满：交给后台线程，换一组空缓冲；没有空缓冲时返回False"""
+        try:
+            fresh = self._free.get_nowait()
+        except queue.Empty:
+            return False
+        full = self._buffer
+        full.count = self._n
+        self._full.put(full)
+        self._buffer = fresh
+        fresh.count = 0
+        fresh.strings = []
+        self._bind(fresh)
+        return True
+
+    def _flush_main(self):
+        """后台线程：把写满的缓冲写入文件，缓冲放回空闲队列"""
+        while True:
+            buffer = self._full.get()
+            if buffer is None:
+                break
+            self._write_block(buffer)
+            self._free.put(buffer)
+
+    def _write_block(self, buffer: _Buffer):
+        count = buffer.count
+        if not count and not buffer.strings:
+            return
+        if self.broken:
+            self.lost += count
+            return
+        strings = json.dumps(buffer.strings, ensure_ascii=False).encode("utf-8") if buffer.strings else b""
+        try:
+            self._file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, count, len(strings)) + strings)
+            for name, _ in COLUMNS:
+                self._file.write(memoryview(buffer.columns[name])[:count].tobytes())
+        except (OSError, ValueError) as e:
+            self.broken = True
+            self.lost += count
+            logger.error("❌ 写入追踪文件失败，停止追踪: %s", e)
+            try:
+                # 去掉写了一半的数据块，保留之前完整的数据块
+                self._file.truncate(self.bytes_written)
+            except (OSError, ValueError):
+                pass
+            return
+        self.recorded += count
+        self.blocks += 1
+        self.bytes_written = self._file.tell()
+
+    def close(self):
+        """
+        写出剩余记录并关闭文件
+        调用前需确保设备线程不再调用 record()（见 GhostMouse.stop_trace）
+        """
+        if self._closed:
+            return
+        self._closed = True
+        buffer = self._buffer
+        buffer.count = self._n
+        self._full.put(buffer)
+        self._full.put(None)
+        self._thread.join()
+        self._n = 0
+        self._file.close()
+        if self.broken:
+            logger.warning("⚠️ 追踪文件不完整: %s（已写出 %d 条命令，未写出 %d 条，丢弃 %d 条）",
+                           self.path, self.recorded, self.lost, self.dropped)
+        else:
+            logger.info("📼 追踪已保存: %s（%d 条命令，丢弃 %d 条）", self.path, self.recorded, self.dropped)
+
+    def get_stats(self) -> dict:
+        """
+        :return: {'path', 'recorded', 'buffered', 'dropped', 'blocks', 'bytes', 'broken', 'lost'}
+        """
+        return {
+            'path': self.path,
+            'recorded': self.recorded,
+            'buffered': self._n,
+            'dropped': self.dropped,
+            'blocks': self.blocks,
+            'bytes': self.bytes_written,
+            'broken': self.broken,
+            'lost': self.lost,
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import tempfile
+    from ghost_backends import SimulatedBackend
+    from ghost_mouse import GhostMouse
+
+    print("=== 设备命令追踪开销测试 - subLD ===")
+    N = 100000
+    path = os.path.join(tempfile.mkdtemp(), "bench.sldt")
+
+    def run(trace: bool) -> float:
+        """提交 N 条命令（无延迟的模拟设备），返回设备线程每条命令的平均耗时(ns)"""
+        ghost = GhostMouse(backend=SimulatedBackend(), metrics_enabled=False)
+        ghost.connect()
+        if trace:
+            ghost.start_trace(path)
+        engine = ghost.engine
+        start = time.perf_counter_ns()
+        engine.schedule_batch((0, "LeftDown" if i % 2 == 0 else "LeftUp", ()) for i in range(N))
+        engine.wait_idle()
+        elapsed = (time.perf_counter_ns() - start) / N
+        if trace:
+            ghost.stop_trace()
+        ghost.disconnect()
+        return elapsed
+
+    # 单独测量 record() 本身
+    tracer = CommandTracer(path)
+    start = time.perf_counter_ns()
+    for i in range(N):
+        tracer.record("LeftDown", (), start, 1000, RESULT_OK)
+    record_ns = (time.perf_counter_ns() - start) / N
+    tracer.close()
+    print(f"record(): {record_ns:.0f} ns/条")
+
+    # 写文件失败：追踪标记为损坏，文件保留到最后一个完整数据块
+    broken_path = os.path.join(os.path.dirname(path), "broken.sldt")
+    tracer = CommandTracer(broken_path, capacity=4)
+    for i in range(4):
+        tracer.record("KeyDown", (f"K{i}",), i, 1000, RESULT_OK)
+    real_write = tracer._file.write
+
+    def failing_write(data):
+        """写出一部分后磁盘已满"""
+        real_write(data[:3])
+        raise OSError(28, "No space left on device")
+
+    tracer.record("KeyDown", ("K0",), 4, 1000, RESULT_OK)  # 第一块交给后台线程
+    while tracer.blocks == 0:
+        time.sleep(0.001)
+    good_size = tracer.bytes_written
+    tracer._file.write = failing_write
+    for i in range(4, 12):
+        tracer.record("KeyDown", (f"K{i}",), i, 1000, RESULT_OK)
+    tracer.close()
+    stats = tracer.get_stats()
+    print(f"写入失败: {stats}")
+    assert stats['broken'] and stats['recorded'] == 4 and stats['lost'] == 9
+    assert os.path.getsize(broken_path) == good_size
+
+    # 交替运行，减少机器负载波动的影响
+    base = traced = float("inf")
+    for _ in range(3):
+        base = min(base, run(False))
+        traced = min(traced, run(True))
+    size = os.path.getsize(path)
+    print(f"未追踪: {base:.0f} ns/条，追踪: {traced:.0f} ns/条，开销 {traced - base:.0f} ns/条")
+    print(f"追踪文件: {size / N:.1f} 字节/条（{size / 1024:.0f} KB）")
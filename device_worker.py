@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+设备线程模块 - subLD项目
+由唯一的设备线程创建并持有设备对象（COM对象），其他线程通过命令队列调用
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from timing_engine import TimedCommandEngine, FAILED
+from device_metrics import DeviceMetrics
+from device_trace import RESULT_OK, RESULT_ZERO, RESULT_ERROR
+from clicker_log import get_logger
+
+try:
+    import pythoncom
+except ImportError:  # 非Windows环境（如使用模拟设备测试）
+    pythoncom = None
+
+logger = get_logger("device_worker")
+
+
+class DeviceWorker(TimedCommandEngine):
+    """
+    设备线程
+    COM对象在哪个线程创建就只在哪个线程调用：设备线程启动时先 CoInitialize，
+    再通过工厂函数创建设备对象，之后所有命令（立即执行或定时执行）都在该线程上执行，
+    调用方拿到 Future 或无需结果的定时命令，不存在跨套间调用。
+    命令可以是可调用对象，也可以是设备方法名（如 "LeftDown"），方法名在设备线程中解析并缓存。
+    """
+
+    def __init__(self, device_factory: Callable[[], Any],
+                 device_closer: Optional[Callable[[Any], None]] = None,
+                 metrics: Optional[DeviceMetrics] = None,
+                 command_hook: Optional[Callable[[str, tuple, int], None]] = None,
+                 tracer=None, spin_threshold: float = 0.001, name: str = "subLD-device"):
+        """
+        :param device_factory: 创建设备对象的函数，在设备线程中调用
+        :param device_closer: 释放设备对象的函数，在设备线程退出前调用
+        :param metrics: 设备调用指标，为None或未启用时不计时
+        :param command_hook: 设备方法执行前在设备线程上调用的钩子 (方法名, 参数, 时间戳ns)
+        :param tracer: 设备命令追踪器（device_trace.CommandTracer），为None时不追踪
+        :param spin_threshold: 定时命令到期前改为自旋等待的时间(秒)
+        :param name: 设备线程名称
+        """
+        super().__init__(spin_threshold=spin_threshold, name=name)
+        self.device_factory = device_factory
+        self.device_closer = device_closer
+        self.metrics = metrics
+        self.command_hook = command_hook
+        self.tracer = tracer
+        self.device = None
+        self._ops: Dict[str, Callable] = {}
+        self._ready: Optional[Future] = None
+
+    def start(self, timeout: float = 5.0):
+        """
+        启动设备线程并等待设备对象创建完成
+        :param timeout: 等待设备创建的超时时间(秒)
+        :raises Exception: 设备创建失败时抛出工厂函数的异常
+        """
+        if self.is_running:
+            return
+        self._ready = Future()
+        super().start()
+        try:
+            self._ready.result(timeout)
+        except Exception:
+            self.stop(drain=False)
+            self._running = False
+            self._thread = None
+            raise
+
+    def call(self, op: str, *args) -> Future:
+        """
+        在设备线程上立即调用设备方法
+        :param op: 设备方法名，如 "LeftDown"、"MoveTo"
+        :return: 方法返回值的 Future
+        """
+        return self.submit(op, *args)
+
+    def call_at(self, due_ns: int, op: str, *args) -> Future:
+        """
+        预约在指定时间调用设备方法
+        :param due_ns: 执行时间（time.perf_counter_ns 时间基准）
+        :param op: 设备方法名
+        :return: 方法返回值的 Future
+        """
+        future = Future()
+        self.schedule(due_ns, op, *args, future=future)
+        return future
+
+    def is_device_thread(self) -> bool:
+        """当前线程是否为设备线程"""
+        return self._thread is threading.current_thread()
+
+    def _thread_main(self):
+        """设备线程入口：初始化COM套间，创建设备，运行命令循环"""
+        com_initialized = False
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+            com_initialized = True
+        try:
+            try:
+                self.device = self.device_factory()
+            except Exception as e:
+                self._running = False
+                self._ready.set_exception(e)
+                return
+            self._ready.set_result(True)
+            self._run()
+        finally:
+            self._ops.clear()
+            if self.device is not None and self.device_closer is not None:
+                try:
+                    self.device_closer(self.device)
+                except Exception as e:
+                    logger.error("❌ 释放设备失败: %s", e)
+            self.device = None
+            if com_initialized:
+                pythoncom.CoUninitialize()
+
+    def _execute(self, fn: Any, args: tuple, future: Optional[Future]) -> Any:
+        """
+        执行命令；设备方法执行前调用命令钩子，
+        启用指标时记录设备方法的耗时和成败（返回0视为失败），启用追踪时写入追踪记录
+        """
+        if not isinstance(fn, str):
+            return super()._execute(fn, args, future)
+        metrics = self.metrics
+        timed = metrics is not None and metrics.enabled
+        hook = self.command_hook
+        tracer = self.tracer
+        if not timed and hook is None and tracer is None:
+            return super()._execute(fn, args, future)
+        start = time.perf_counter_ns()
+        if hook is not None:
+            try:
+                hook(fn, args, start)
+            except Exception as e:
+                logger.error("❌ 命令钩子出错 (%s): %s", fn, e)
+        result = super()._execute(fn, args, future)
+        if timed or tracer is not None:
+            duration = time.perf_counter_ns() - start
+            # 指标和追踪出错只记录日志，不能影响命令本身和设备线程
+            try:
+                if timed:
+                    metrics.record(fn, duration, result is not FAILED and result != 0)
+                if tracer is not None:
+                    code = RESULT_ERROR if result is FAILED else (RESULT_ZERO if result == 0 else RESULT_OK)
+                    tracer.record(fn, args, start, duration, code)
+            except Exception as e:
+                logger.error("❌ 记录设备命令指标/追踪失败 (%s): %s", fn, e)
+        return result
+
+    def _resolve(self, fn: Any) -> Callable:
+        """设备方法名解析为绑定方法并缓存"""
+        if isinstance(fn, str):
+            op = self._ops.get(fn)
+            if op is None:
+                op = self._ops[fn] = getattr(self.device, fn)
+            return op
+        return fn
+
+
+# 测试代码
+if __name__ == "__main__":
+    from ghost_backends import SimulatedDevice
+    print("=== 设备线程测试 - subLD ===")
+    worker = DeviceWorker(SimulatedDevice)
+    worker.start()
+    futures = worker.submit_batch([("MoveTo", (100, 200)), ("LeftDown", ()), ("LeftUp", ())])
+    print("批量结果:", [f.result(timeout=1) for f in futures])
+    print("单条结果:", worker.call("KeyDown", "A").result(timeout=1))
+    worker.wait_idle(timeout=1)
+    print("设备调用记录:", [entry[1:] for entry in worker.device.log])
+    worker.stop()
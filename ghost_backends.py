@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+幽灵键鼠设备后端模块 - subLD项目
+GhostMouse 通过后端创建设备对象：COM后端对接真实硬件，模拟后端用于无硬件环境下的测试和性能测量
+"""
+import functools
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from clicker_log import get_logger
+
+logger = get_logger("ghost_backends")
+
+# 幽灵键鼠COM组件的ProgID，根据实际的幽灵键鼠型号可能不同
+# 常见的有: "kmclass.kmsoft" 或 "sr.srsoft"
+DEFAULT_PROGID = "kmclass.kmsoft"
+# 启动时并行探测的全部已知ProgID（见 device_probe.DeviceProber）
+KNOWN_PROGIDS = ("kmclass.kmsoft", "sr.srsoft")
+
+# 设备对象的方法，DISPID 绑定时在连接时一次性解析
+DEVICE_METHODS = ("LeftDown", "LeftUp", "RightDown", "RightUp", "MiddleDown", "MiddleUp",
+                  "MoveTo", "MoveR", "KeyDown", "KeyUp", "KeyUpAll")
+
+# COM 方法绑定方式
+BINDING_DISPID = "dispid"  # 连接时解析 DISPID，每次调用直接 Invoke（默认）
+BINDING_EARLY = "early"    # makepy 生成的类型库包装（gencache.EnsureDispatch），失败时改用 DISPID 绑定
+BINDING_LATE = "late"      # win32com 动态 Dispatch（旧行为）
+BINDINGS = (BINDING_DISPID, BINDING_EARLY, BINDING_LATE)
+
+# IDispatch::Invoke 参数（与 pythoncom.DISPATCH_METHOD / LOCALE_USER_DEFAULT 相同，非Windows环境无需导入 pythoncom）
+DISPATCH_METHOD = 1
+LOCALE_USER_DEFAULT = 0x400
+
+
+class DeviceBackend:
+    """
+    设备后端基类
+    open() 在设备线程中调用，返回的设备对象需提供与幽灵键鼠COM对象相同的方法
+    （LeftDown/LeftUp/RightDown/RightUp/MiddleDown/MiddleUp/MoveTo/MoveR/KeyDown/KeyUp/KeyUpAll），
+    成功时返回1。
+    """
+
+    name = "base"
+
+    def open(self) -> Any:
+        """创建设备对象（在设备线程中调用）"""
+        raise NotImplementedError
+
+    def close(self, device: Any):
+        """释放设备对象（在设备线程中调用）"""
+
+    def describe(self) -> str:
+        """后端描述，用于日志和状态显示"""
+        return self.name
+
+
+class BoundDispatch:
+    """
+    DISPID 预绑定的设备对象
+    创建时对每个设备方法调用一次 GetIDsOfNames，方法属性直接是 IDispatch.Invoke 的偏函数：
+    调用时不再经过 win32com 动态包装层的属性查找和名称解析。
+    """
+
+    def __init__(self, oleobj: Any, methods=DEVICE_METHODS):
+        """
+        :param oleobj: PyIDispatch 对象（如 Dispatch(...)._oleobj_）
+        :param methods: 预先绑定的方法名
+        """
+        self._oleobj_ = oleobj
+        self.dispids: Dict[str, int] = {}
+        for name in methods:
+            try:
+                self._bind(name)
+            except Exception:
+                # 部分型号没有某些方法，用到时再由 __getattr__ 报错
+                pass
+
+    def _bind(self, name: str) -> Callable:
+        dispid = self._oleobj_.GetIDsOfNames(name)
+        method = functools.partial(self._oleobj_.Invoke, dispid, LOCALE_USER_DEFAULT, DISPATCH_METHOD, True)
+        self.dispids[name] = dispid
+        setattr(self, name, method)
+        return method
+
+    def __getattr__(self, name: str) -> Callable:
+        # 只有未预先绑定的名称才会走到这里
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self._bind(name)
+
+
+class ComBackend(DeviceBackend):
+    """COM后端：通过 win32com 调用幽灵键鼠硬件"""
+
+    name = "com"
+
+    def __init__(self, progid: str = DEFAULT_PROGID, binding: str = BINDING_DISPID):
+        """
+        :param progid: COM组件ProgID
+        :param binding: 方法绑定方式，见 BINDINGS
+        """
+        if binding not in BINDINGS:
+            raise ValueError(f"未知的COM绑定方式: {binding}")
+        self.progid = progid
+        self.binding = binding
+
+    def open(self) -> Any:
+        import win32com.client
+        if self.binding == BINDING_EARLY:
+            try:
+                return win32com.client.gencache.EnsureDispatch(self.progid)
+            except Exception as e:
+                logger.warning("⚠️ 生成类型库包装失败，改用DISPID绑定: %s", e)
+        dispatch = win32com.client.Dispatch(self.progid)
+        if self.binding == BINDING_LATE:
+            return dispatch
+        return BoundDispatch(dispatch._oleobj_)
+
+    def describe(self) -> str:
+        return f"com:{self.progid}"
+
+
+# ==================== 延迟模型 ====================
+
+def constant_latency(seconds: float) -> Callable[[random.Random], float]:
+    """固定延迟"""
+    return lambda rng: seconds
+
+
+def uniform_latency(low: float, high: float) -> Callable[[random.Random], float]:
+    """均匀分布延迟"""
+    return lambda rng: rng.uniform(low, high)
+
+
+def normal_latency(mean: float, std: float) -> Callable[[random.Random], float]:
+    """正态分布延迟（截断为非负）"""
+    return lambda rng: max(0.0, rng.gauss(mean, std))
+
+
+def lognormal_latency(median: float, sigma: float) -> Callable[[random.Random], float]:
+    """对数正态分布延迟，长尾更接近USB设备的实际表现"""
+    import math
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+class SimulatedDeviceError(Exception):
+    """模拟设备注入的故障"""
+
+
+class SimulatedDevice:
+    """
+    模拟幽灵键鼠设备
+    每次调用按延迟模型阻塞调用线程（与真实USB调用一样占用设备线程），
+    可按概率或按次数注入故障，并把每次调用记录到有界命令日志。
+    只允许在创建它的线程（设备线程）上调用。
+    """
+
+    def __init__(self, latency: Optional[Callable[[random.Random], float]] = None,
+                 op_latency: Optional[Dict[str, Callable[[random.Random], float]]] = None,
+                 failure_rate: float = 0.0, failure_mode: str = "raise",
+                 seed: Optional[int] = None, log_size: int = 100000):
+        """
+        :param latency: 默认延迟模型，返回每次调用的延迟(秒)
+        :param op_latency: 按方法名覆盖的延迟模型，如 {"MoveTo": constant_latency(0.002)}
+        :param failure_rate: 每次调用随机失败的概率
+        :param failure_mode: 失败方式，"raise" 抛出异常，"zero" 返回0
+        :param seed: 随机数种子
+        :param log_size: 命令日志最大条数
+        """
+        self.owner = threading.current_thread()
+        self.latency = latency
+        self.op_latency = op_latency or {}
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.rng = random.Random(seed)
+        # 命令日志: (调用开始时间ns, 方法名, 参数, 返回值)
+        self.log = deque(maxlen=log_size)
+        self.call_count = 0
+        self.failure_count = 0
+        self._fail_next = 0
+        self._unplugged = False
+
+    # ==================== 故障注入 ====================
+
+    def fail_next(self, count: int = 1):
+        """让接下来的 count 次调用失败"""
+        self._fail_next += count
+
+    def unplug(self):
+        """模拟设备被拔出：之后所有调用都失败，直到 replug()"""
+        self._unplugged = True
+
+    def replug(self):
+        """模拟设备重新插入"""
+        self._unplugged = False
+
+    # ==================== 调用模拟 ====================
+
+    def _call(self, op: str, args: tuple) -> int:
+        if threading.current_thread() is not self.owner:
+            raise RuntimeError(f"{op} 在非设备线程上调用")
+        start = time.perf_counter_ns()
+        self.call_count += 1
+
+        model = self.op_latency.get(op, self.latency)
+        if model is not None:
+            delay = model(self.rng)
+            if delay > 0:
+                _busy_sleep(delay)
+
+        failed = self._unplugged
+        if not failed and self._fail_next:
+            self._fail_next -= 1
+            failed = True
+        if not failed and self.failure_rate and self.rng.random() < self.failure_rate:
+            failed = True
+
+        if failed:
+            self.failure_count += 1
+            self.log.append((start, op, args, 0))
+            if self.failure_mode == "raise":
+                raise SimulatedDeviceError(f"模拟设备调用失败: {op}")
+            return 0
+        self.log.append((start, op, args, 1))
+        return 1
+
+    def LeftDown(self): return self._call("LeftDown", ())
+    def LeftUp(self): return self._call("LeftUp", ())
+    def RightDown(self): return self._call("RightDown", ())
+    def RightUp(self): return self._call("RightUp", ())
+    def MiddleDown(self): return self._call("MiddleDown", ())
+    def MiddleUp(self): return self._call("MiddleUp", ())
+    def MoveTo(self, x, y): return self._call("MoveTo", (x, y))
+    def MoveR(self, dx, dy): return self._call("MoveR", (dx, dy))
+    def KeyDown(self, key): return self._call("KeyDown", (key,))
+    def KeyUp(self, key): return self._call("KeyUp", (key,))
+    def KeyUpAll(self): return self._call("KeyUpAll", ())
+
+
+def _busy_sleep(seconds: float):
+    """模拟阻塞调用：较长时睡眠，较短时自旋，以获得亚毫秒级精度"""
+    end = time.perf_counter_ns() + int(seconds * 1e9)
+    if seconds > 0.002:
+        time.sleep(seconds - 0.001)
+    while time.perf_counter_ns() < end:
+        time.sleep(0)  # 自旋时让出GIL，避免饿死其他线程
+
+
+class SimulatedBackend(DeviceBackend):
+    """模拟后端：创建 SimulatedDevice，参数原样传递"""
+
+    name = "sim"
+
+    def __init__(self, **device_kwargs):
+        """
+        :param device_kwargs: 传给 SimulatedDevice 的参数（latency、failure_rate、seed 等）
+        """
+        self.device_kwargs = device_kwargs
+        self.device: Optional[SimulatedDevice] = None
+        self.unplugged = False
+
+    def unplug(self):
+        """模拟设备被拔出：当前设备的调用全部失败，重新连接也失败，直到 replug()"""
+        self.unplugged = True
+        if self.device is not None:
+            self.device.unplug()
+
+    def replug(self):
+        """模拟设备重新插入（需要重新连接才会恢复，与真实USB设备一致）"""
+        self.unplugged = False
+
+    def open(self) -> SimulatedDevice:
+        if self.unplugged:
+            raise SimulatedDeviceError("模拟设备未插入")
+        self.device = SimulatedDevice(**self.device_kwargs)
+        return self.device
+
+
+# 后端注册表，名称 -> 后端类
+BACKENDS = {
+    ComBackend.name: ComBackend,
+    SimulatedBackend.name: SimulatedBackend,
+}
+
+
+def create_backend(name: str = "com", **kwargs) -> DeviceBackend:
+    """
+    按名称创建后端
+    :param name: "com" 或 "sim"
+    :param kwargs: 后端构造参数
+    :return: 后端实例
+    """
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的设备后端: {name}") from None
+    return backend_cls(**kwargs)
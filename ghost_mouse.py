@@ -3,70 +3,342 @@
 幽灵键鼠封装模块 - subLD项目
 支持通过COM接口调用幽灵键鼠硬件
 """
-import win32com.client
 import time
-from typing import Optional
+from typing import Dict, Optional
+from timing_engine import ButtonChannel
+from device_worker import DeviceWorker
+from device_metrics import DeviceMetrics
+from device_trace import CommandTracer
+from synthetic_filter import SyntheticEventFilter
+from macro import MacroPlayer, MacroProgram
+from ghost_backends import DeviceBackend, ComBackend
+from clicker_log import get_logger
+
+logger = get_logger("ghost_mouse")
+
+# 默认按住时长(秒)
+DEFAULT_HOLD = 0.01
+# 同步调用等待设备线程返回的超时时间(秒)
+CALL_TIMEOUT = 2.0
 
 
 class GhostMouse:
     """幽灵键鼠封装类"""
     
-    def __init__(self):
-        """初始化幽灵键鼠"""
-        self.km = None
+    def __init__(self, hold: float = DEFAULT_HOLD, backend: Optional[DeviceBackend] = None,
+                 metrics_enabled: bool = True, compress_hold: bool = True):
+        """
+        初始化幽灵键鼠
+        :param hold: 点击/按键的默认按住时长(秒)
+        :param backend: 设备后端，默认为COM后端；无硬件时可使用 ghost_backends.SimulatedBackend
+        :param metrics_enabled: 是否记录每种设备调用的延迟直方图
+        :param compress_hold: 使用默认按住时长时，点击过密是否压缩按住时长（见 ButtonChannel）；
+                              set_hold() 显式设置的按住时长默认不压缩
+        """
         self.is_connected = False
+        self.default_hold = hold
+        self.compress_hold = compress_hold
+        self.backend = backend or ComBackend()
+        self.call_timeout = CALL_TIMEOUT
+        # 设备调用指标跨重连保留
+        self.metrics = DeviceMetrics(enabled=metrics_enabled)
+        # 记录本设备发出的按下/松开，供鼠标监听器识别并忽略这些合成事件
+        self.synthetic_filter = SyntheticEventFilter()
         
-    def connect(self) -> bool:
+        # 设备对象由设备线程创建和持有，所有调用都经过该线程；
+        # 点击的按下/松开作为定时命令预约，调用方不阻塞
+        self.engine: Optional[DeviceWorker] = None
+        self._channels: Dict[str, ButtonChannel] = {}
+        # 平滑移动使用的轨迹生成器（首次使用时创建，依赖 numpy）
+        self._trajectory = None
+        # 后端探测器（device_probe.DeviceProber），设置后 connect() 优先接管预热好的连接
+        self.prober = None
+        # 设备命令追踪器（device_trace.CommandTracer），跨重连保留
+        self.tracer = None
+        
+    def connect(self, use_prober: bool = True) -> bool:
         """
         连接幽灵键鼠设备
+        :param use_prober: 是否等待并接管探测器的预热连接；重连监督器自行重试时传 False，
+                           避免在探测器上阻塞并重复打开设备
         :return: 连接成功返回True，失败返回False
         """
+        if self.check_connection():
+            return True
+        
+        prober = self.prober
+        if prober is not None and use_prober:
+            warm = prober.take_worker(timeout=prober.timeout)
+            if warm is not None:
+                self._adopt(*warm)
+                logger.info("✅ 幽灵键鼠连接成功 (%s，预热连接)", self.backend.describe())
+                return True
+            if prober.winner is not None:
+                self.backend = prober.winner
+        
         try:
-            # 创建COM对象，这里的ProgID根据实际的幽灵键鼠型号可能不同
-            # 常见的有: "kmclass.kmsoft" 或 "sr.srsoft"
-            self.km = win32com.client.Dispatch("kmclass.kmsoft")
+            # 在设备线程中创建COM对象，之后只在该线程上调用
+            engine = DeviceWorker(self.backend.open, self.backend.close, metrics=self.metrics,
+                                  command_hook=self.synthetic_filter.on_device_command,
+                                  tracer=self.tracer)
+            engine.start()
+            self.engine = engine
+            self._channels.clear()
             self.is_connected = True
-            print("✅ 幽灵键鼠连接成功")
+            logger.info("✅ 幽灵键鼠连接成功 (%s)", self.backend.describe())
             return True
         except Exception as e:
-            print(f"❌ 幽灵键鼠连接失败: {e}")
-            print("请确保:")
-            print("1. 幽灵键鼠硬件已插入USB端口")
-            print("2. 已安装幽灵键鼠驱动程序")
-            print("3. COM组件已正确注册")
+            logger.error("❌ 幽灵键鼠连接失败: %s\n请确保:\n1. 幽灵键鼠硬件已插入USB端口\n"
+                         "2. 已安装幽灵键鼠驱动程序\n3. COM组件已正确注册", e)
             self.is_connected = False
             return False
     
-    def disconnect(self):
-        """断开连接"""
-        if self.km:
-            self.km = None
+    def _adopt(self, backend: DeviceBackend, engine: DeviceWorker):
+        """接管已启动的设备线程（尚未执行任何命令），挂上本实例的指标、合成事件钩子和追踪器"""
+        engine.metrics = self.metrics
+        engine.command_hook = self.synthetic_filter.on_device_command
+        engine.tracer = self.tracer
+        self.backend = backend
+        self.engine = engine
+        self._channels.clear()
+        self.is_connected = True
+    
+    def set_prober(self, prober):
+        """
+        设置后端探测器：connect() 时接管其预热连接，断开后由其在后台重新预热
+        :param prober: device_probe.DeviceProber，None 表示不使用
+        """
+        self.prober = prober
+    
+    def disconnect(self, rewarm: bool = True):
+        """
+        断开连接
+        :param rewarm: 断开后是否让探测器在后台重新预热（重连监督器自行重连时传 False）
+        """
+        if self.engine:
+            # 先执行完已预约的松开命令，避免按键残留在按下状态
+            self.engine.stop(drain=True)
+            self.engine = None
             self.is_connected = False
-            print("🔌 幽灵键鼠已断开连接")
+            logger.info("🔌 幽灵键鼠已断开连接")
+            if self.prober is not None and rewarm:
+                self.prober.rewarm()
+    
+    def start_trace(self, path: str, capacity: int = 32768) -> bool:
+        """
+        开始把每条设备命令记录到追踪文件（已在追踪时先结束旧的追踪）
+        :param path: 追踪文件路径，用 trace_analyzer.py 分析
+        :param capacity: 每组内存缓冲的记录数
+        :return: 成功返回True
+        """
+        self.stop_trace()
+        try:
+            tracer = CommandTracer(path, capacity=capacity, metadata={'backend': self.backend.describe()})
+        except OSError as e:
+            logger.error("❌ 无法创建追踪文件: %s", e)
+            return False
+        self.tracer = tracer
+        if self.engine is not None:
+            self.engine.tracer = tracer
+        logger.info("📼 开始追踪设备命令: %s", path)
+        return True
+    
+    def stop_trace(self) -> Optional[dict]:
+        """
+        结束追踪并写完文件
+        :return: 追踪统计（见 CommandTracer.get_stats），未在追踪时返回None
+        """
+        tracer = self.tracer
+        if tracer is None:
+            return None
+        self.tracer = None
+        engine = self.engine
+        if engine is not None:
+            engine.tracer = None
+            if engine.is_running and not engine.is_device_thread():
+                # 设备线程执行完这条空命令时，已不会再写入追踪器
+                try:
+                    engine.submit(lambda: None).result(timeout=self.call_timeout)
+                except Exception:
+                    pass
+        tracer.close()
+        return tracer.get_stats()
+    
+    def get_trace_stats(self) -> Optional[dict]:
+        """获取当前追踪的统计，未在追踪时返回None"""
+        return self.tracer.get_stats() if self.tracer is not None else None
     
     def check_connection(self) -> bool:
         """检查连接状态"""
-        return self.is_connected and self.km is not None
+        return self.is_connected and self.engine is not None and self.engine.is_running
+    
+    def _call(self, op: str, *args):
+        """
+        在设备线程上同步调用设备方法
+        :param op: 设备方法名，如 "LeftDown"
+        :return: 设备方法的返回值
+        """
+        return self.engine.call(op, *args).result(timeout=self.call_timeout)
+    
+    def submit_batch(self, commands):
+        """
+        批量提交设备命令，在设备线程上按顺序执行
+        :param commands: (方法名, 参数元组) 的序列，如 [("MoveTo", (100, 200)), ("LeftDown", ())]
+        :return: 与命令一一对应的 Future 列表；设备未连接时返回空列表
+        """
+        if not self.check_connection():
+            return []
+        return self.engine.submit_batch(commands)
+    
+    # ==================== 调用指标 ====================
+    
+    def get_metrics(self, reset: bool = False) -> dict:
+        """
+        获取每种设备调用的延迟分位数和错误计数
+        :param reset: 读取后是否清空
+        :return: 指标快照字典
+        """
+        return self.metrics.snapshot(reset=reset)
+    
+    def get_call_totals(self, ops) -> tuple:
+        """
+        指定设备调用的累计 (次数, 总耗时ns, 错误数)，见 DeviceMetrics.totals
+        :param ops: 设备方法名序列，如 ("LeftDown", "LeftUp")
+        """
+        return self.metrics.totals(ops)
+    
+    def pending(self) -> int:
+        """设备线程中尚未执行的命令数量（未连接时为0）"""
+        engine = self.engine
+        return engine.pending() if engine is not None else 0
+    
+    def get_device_stats(self) -> list:
+        """
+        设备状态列表（单设备时只有一项，与 device_pool.DevicePool 的格式一致）
+        :return: [{'backend', 'connected', 'pending', 'executed', 'errors', 'channels'}]，
+                 channels 为 {通道名: ButtonChannel.get_stats()}（含实际按住时长和压缩/顺延次数）
+        """
+        engine = self.engine
+        return [{
+            'backend': self.backend.describe(),
+            'connected': self.check_connection(),
+            'pending': engine.pending() if engine else 0,
+            'executed': engine.executed_count if engine else 0,
+            'errors': engine.error_count if engine else 0,
+            'channels': {name: channel.get_stats() for name, channel in list(self._channels.items())},
+        }]
+    
+    def reset_metrics(self):
+        """清空设备调用指标"""
+        self.metrics.reset()
+    
+    def set_metrics_enabled(self, enabled: bool):
+        """开启/关闭设备调用指标记录"""
+        self.metrics.enabled = enabled
+    
+    # ==================== 定时点击 ====================
+    
+    def _channel(self, name: str) -> ButtonChannel:
+        """获取（必要时创建）按钮/按键对应的时序通道"""
+        channel = self._channels.get(name)
+        if channel is None:
+            if name == "left":
+                down, up = "LeftDown", "LeftUp"
+            elif name == "right":
+                down, up = "RightDown", "RightUp"
+            elif name == "middle":
+                down, up = "MiddleDown", "MiddleUp"
+            else:
+                down, up = "KeyDown", "KeyUp"
+            channel = ButtonChannel(self.engine, down, up, hold=self.default_hold,
+                                    compress_hold=self.compress_hold)
+            self._channels[name] = channel
+        return channel
+    
+    def _schedule_click(self, name: str, args: tuple = (), at_ns: int = 0) -> bool:
+        """
+        预约一次点击，立即返回
+        :param name: 通道名称，"left"/"right"/"middle" 或 "key:<按键名>"
+        :param args: 传给按下/松开函数的参数
+        :param at_ns: 期望的按下时间(ns)，0 表示立即
+        :return: 成功预约返回True；设备未连接或之前预约的命令执行失败时返回False
+        """
+        if not self.check_connection():
+            return False
+        if self.engine.consume_errors():
+            return False
+        self._channel(name).click(args, at_ns)
+        return True
+    
+    def click_at(self, button: str, at_ns: int = 0) -> bool:
+        """
+        预约在指定时间点击某个按钮/按键（不阻塞），与其他已预约的命令按时间顺序执行
+        :param button: "left"/"right"/"middle" 或按键名（如 "A"）
+        :param at_ns: 期望的按下时间（time.perf_counter_ns 时间基准），0 表示立即
+        :return: 成功预约返回True
+        """
+        if button in ("left", "right", "middle"):
+            return self._schedule_click(button, (), at_ns)
+        return self._schedule_click(f"key:{button}", (button,), at_ns)
+    
+    def set_hold(self, button: str, hold: float, compress: bool = False):
+        """
+        设置某个按钮/按键的按住时长
+        :param button: "left"/"right"/"middle" 或按键名（如 "A"）
+        :param hold: 按住时长(秒)
+        :param compress: 点击过密时是否允许压缩；默认不压缩，按住时长保持不变、速率受其限制
+        """
+        if self.check_connection():
+            self.button_channel(button).set_hold(hold, compress)
+    
+    def button_channel(self, button: str) -> ButtonChannel:
+        """
+        获取按钮/按键的时序通道（需已连接），可用 plan()/click(at_ns=...) 预约指定时间的点击
+        :param button: "left"/"right"/"middle" 或按键名（如 "A"）
+        """
+        name = button if button in ("left", "right", "middle") else f"key:{button}"
+        return self._channel(name)
+    
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有已预约的按下/松开命令执行完毕
+        :param timeout: 超时时间(秒)
+        :return: 全部执行完毕返回True
+        """
+        if self.engine is None:
+            return True
+        return self.engine.wait_idle(timeout)
     
     # ==================== 鼠标操作 ====================
     
     def left_click(self) -> bool:
         """
-        鼠标左键点击（按下并松开）
+        鼠标左键点击（预约按下并在按住时长后松开，不阻塞）
         :return: 成功返回True
         """
-        if not self.check_connection():
-            print("⚠️ 幽灵键鼠未连接")
-            return False
-        
-        try:
-            self.km.LeftDown()  # 左键按下
-            time.sleep(0.01)  # 短暂延迟
-            self.km.LeftUp()    # 左键松开
+        # 连接检查由 _schedule_click 完成，热路径上只检查一次；失败时再区分原因
+        if self._schedule_click("left"):
             return True
-        except Exception as e:
-            print(f"❌ 左键点击失败: {e}")
-            return False
+        return self._report_click_failure("左键点击")
+    
+    def _report_click_failure(self, label: str) -> bool:
+        """
+        预约点击失败后记录原因：设备未连接，或之前预约的命令在设备线程上执行失败
+        :param label: 操作名称，用于日志
+        :return: 总是返回False，便于调用方直接返回
+        """
+        engine = self.engine
+        if not self.check_connection() or engine is None:
+            logger.warning("⚠️ 幽灵键鼠未连接")
+        else:
+            logger.error("❌ %s失败: %s", label, engine.last_error)
+        return False
+    
+    def _click(self, name: str, args: tuple, label: str) -> bool:
+        """预约一次点击，失败时记录原因并返回False"""
+        if self._schedule_click(name, args):
+            return True
+        return self._report_click_failure(label)
     
     def left_down(self) -> bool:
         """
@@ -77,10 +349,10 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.LeftDown()
+            result = self._call("LeftDown")
             return result == 1
         except Exception as e:
-            print(f"❌ 左键按下失败: {e}")
+            logger.error("❌ 左键按下失败: %s", e)
             return False
     
     def left_up(self) -> bool:
@@ -92,39 +364,25 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.LeftUp()
+            result = self._call("LeftUp")
             return result == 1
         except Exception as e:
-            print(f"❌ 左键松开失败: {e}")
+            logger.error("❌ 左键松开失败: %s", e)
             return False
     
     def right_click(self) -> bool:
-        """鼠标右键点击"""
-        if not self.check_connection():
-            return False
-        
-        try:
-            self.km.RightDown()
-            time.sleep(0.01)
-            self.km.RightUp()
-            return True
-        except Exception as e:
-            print(f"❌ 右键点击失败: {e}")
-            return False
+        """
+        鼠标右键点击（不阻塞）
+        :return: 成功预约返回True；设备未连接或之前预约的命令执行失败时返回False
+        """
+        return self._click("right", (), "右键点击")
     
     def middle_click(self) -> bool:
-        """鼠标中键点击"""
-        if not self.check_connection():
-            return False
-        
-        try:
-            self.km.MiddleDown()
-            time.sleep(0.01)
-            self.km.MiddleUp()
-            return True
-        except Exception as e:
-            print(f"❌ 中键点击失败: {e}")
-            return False
+        """
+        鼠标中键点击（不阻塞）
+        :return: 成功预约返回True；设备未连接或之前预约的命令执行失败时返回False
+        """
+        return self._click("middle", (), "中键点击")
     
     def move_to(self, x: int, y: int) -> bool:
         """
@@ -137,10 +395,10 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.MoveTo(x, y)
+            result = self._call("MoveTo", x, y)
             return result == 1
         except Exception as e:
-            print(f"❌ 移动鼠标失败: {e}")
+            logger.error("❌ 移动鼠标失败: %s", e)
             return False
     
     def move_relative(self, dx: int, dy: int) -> bool:
@@ -154,31 +412,41 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.MoveR(dx, dy)
+            result = self._call("MoveR", dx, dy)
             return result == 1
         except Exception as e:
-            print(f"❌ 相对移动失败: {e}")
+            logger.error("❌ 相对移动失败: %s", e)
             return False
     
+    def move_smooth(self, dx: int, dy: int, duration: Optional[float] = None,
+                    generator=None) -> Optional[MacroPlayer]:
+        """
+        沿拟人轨迹相对移动鼠标（不阻塞），以固定设备更新频率发送 MoveR
+        :param dx: X轴偏移量
+        :param dy: Y轴偏移量
+        :param duration: 移动时长(秒)，None 按距离估算
+        :param generator: trajectory.TrajectoryGenerator，None 使用默认生成器
+        :return: 回放器（可 wait()/abort()），设备未连接时返回None
+        """
+        if generator is None:
+            if self._trajectory is None:
+                from trajectory import TrajectoryGenerator
+                self._trajectory = TrajectoryGenerator()
+            generator = self._trajectory
+        program = generator.route(dx, dy, duration)
+        if not len(program):
+            return None
+        return self.play_macro(program)
+    
     # ==================== 键盘操作 ====================
     
     def key_press(self, key: str) -> bool:
         """
-        按键（按下并松开）
+        按键（预约按下并在按住时长后松开，不阻塞）
         :param key: 按键名称，如 "A", "1", "F1", "Enter" 等
-        :return: 成功返回True
+        :return: 成功预约返回True；设备未连接或之前预约的命令执行失败时返回False
         """
-        if not self.check_connection():
-            return False
-        
-        try:
-            self.km.KeyDown(key)
-            time.sleep(0.01)
-            self.km.KeyUp(key)
-            return True
-        except Exception as e:
-            print(f"❌ 按键失败: {e}")
-            return False
+        return self._click(f"key:{key}", (key,), "按键")
     
     def key_down(self, key: str) -> bool:
         """按键按下"""
@@ -186,10 +454,10 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.KeyDown(key)
+            result = self._call("KeyDown", key)
             return result == 1
         except Exception as e:
-            print(f"❌ 按键按下失败: {e}")
+            logger.error("❌ 按键按下失败: %s", e)
             return False
     
     def key_up(self, key: str) -> bool:
@@ -198,10 +466,10 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.KeyUp(key)
+            result = self._call("KeyUp", key)
             return result == 1
         except Exception as e:
-            print(f"❌ 按键松开失败: {e}")
+            logger.error("❌ 按键松开失败: %s", e)
             return False
     
     def key_up_all(self) -> bool:
@@ -210,11 +478,26 @@ class GhostMouse:
             return False
         
         try:
-            result = self.km.KeyUpAll()
+            result = self._call("KeyUpAll")
             return result == 1
         except Exception as e:
-            print(f"❌ 释放所有按键失败: {e}")
+            logger.error("❌ 释放所有按键失败: %s", e)
             return False
+    
+    # ==================== 宏回放 ====================
+    
+    def play_macro(self, program: MacroProgram, speed: float = 1.0, loops: int = 1) -> Optional[MacroPlayer]:
+        """
+        回放宏程序（不阻塞）
+        :param program: 编译后的宏程序
+        :param speed: 速度倍率
+        :param loops: 循环次数，0 表示无限循环
+        :return: 回放器（可 wait()/abort()），设备未连接时返回None
+        """
+        player = MacroPlayer(self, program)
+        if not player.play(speed=speed, loops=loops):
+            return None
+        return player
 
 
 # 全局幽灵键鼠实例（单例模式）
@@ -234,15 +517,21 @@ def get_ghost_mouse() -> GhostMouse:
 
 # 测试代码
 if __name__ == "__main__":
+    import sys
     print("=== 幽灵键鼠测试 - subLD ===")
     
-    # 创建实例
-    ghost = GhostMouse()
+    # 创建实例（非Windows环境下使用模拟设备）
+    if sys.platform == "win32":
+        ghost = GhostMouse()
+    else:
+        from ghost_backends import SimulatedBackend
+        ghost = GhostMouse(backend=SimulatedBackend())
     
     # 连接设备
     if ghost.connect():
         print("\n测试鼠标点击...")
         ghost.left_click()
+        ghost.wait_idle(timeout=1)
         time.sleep(0.5)
         
         print("测试完成！")
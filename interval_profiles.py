@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+点击间隔分布模块 - subLD项目
+可插拔的间隔生成器：固定、均匀、正态、对数正态、连发/停顿、渐进加速。
+每个生成器用 NumPy 成块生成后续间隔，点击循环每次只读取下一个槽位，不做随机数和分布计算；
+指定种子时每次会话的间隔序列完全相同，便于复现。
+"""
+import math
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+
+# 允许的最短间隔(秒)，与 ClickEngine.set_interval 的下限一致
+MIN_INTERVAL = 0.01
+
+PROFILE_FIXED = "fixed"
+PROFILE_UNIFORM = "uniform"
+PROFILE_GAUSSIAN = "gaussian"
+PROFILE_LOGNORMAL = "lognormal"
+PROFILE_BURST = "burst"
+PROFILE_RAMP = "ramp"
+
+
+class IntervalProfile:
+    """
+    间隔生成器基类
+    子类实现 _fill(n)，返回 n 个以秒为单位的间隔（以 self.interval 为基准）。
+    缓冲区在用完时整块重新生成并转为纳秒整数列表，next_ns() 只做一次下标访问。
+    """
+
+    name = "base"
+    label = ""
+
+    def __init__(self, interval: float, seed: Optional[int] = None, block_size: int = 1024):
+        """
+        :param interval: 基准间隔(秒)，各分布的均值/中位数以此为准
+        :param seed: 随机数种子，None 表示每次会话不同
+        :param block_size: 每次生成的间隔数
+        """
+        self.interval = max(MIN_INTERVAL, interval)
+        self.seed = seed
+        self.block_size = block_size
+        self.rng = np.random.default_rng(seed)
+        self.generated = 0
+        self._buffer: List[int] = []
+        self._index = 0
+
+    def reset(self):
+        """回到序列起点（有种子时重新产生相同的序列）"""
+        self.rng = np.random.default_rng(self.seed)
+        self.generated = 0
+        self._buffer = []
+        self._index = 0
+
+    def set_interval(self, interval: float):
+        """修改基准间隔，已生成的缓冲区作废"""
+        self.interval = max(MIN_INTERVAL, interval)
+        self._buffer = []
+        self._index = 0
+
+    def next_ns(self) -> int:
+        """下一个间隔(ns)"""
+        index = self._index
+        buffer = self._buffer
+        if index >= len(buffer):
+            buffer = self._refill()
+            index = 0
+        self._index = index + 1
+        return buffer[index]
+
+    def _refill(self) -> List[int]:
+        values = np.maximum(self._fill(self.block_size), MIN_INTERVAL)
+        self.generated += self.block_size
+        self._buffer = np.rint(values * 1e9).astype(np.int64).tolist()
+        self._index = 0
+        return self._buffer
+
+    def _fill(self, n: int) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def mean_interval(self) -> float:
+        """期望间隔(秒)，用于估算目标速率"""
+        return self.interval
+
+    def describe(self) -> dict:
+        return {'profile': self.name, 'interval': self.interval, 'mean_interval': self.mean_interval,
+                'seed': self.seed}
+
+
+class FixedProfile(IntervalProfile):
+    """固定间隔"""
+
+    name = PROFILE_FIXED
+    label = "固定"
+
+    def _fill(self, n: int) -> np.ndarray:
+        return np.full(n, self.interval)
+
+
+class UniformProfile(IntervalProfile):
+    """均匀分布：interval × [1 - spread, 1 + spread]"""
+
+    name = PROFILE_UNIFORM
+    label = "均匀随机"
+
+    def __init__(self, interval: float, spread: float = 0.3, **kwargs):
+        """
+        :param spread: 相对浮动范围，0.3 表示 ±30%
+        """
+        self.spread = spread
+        super().__init__(interval, **kwargs)
+
+    def _fill(self, n: int) -> np.ndarray:
+        return self.interval * self.rng.uniform(1.0 - self.spread, 1.0 + self.spread, n)
+
+
+class GaussianProfile(IntervalProfile):
+    """正态分布：均值 interval，标准差 interval × std，截断到 [1 - 3std, 1 + 3std]"""
+
+    name = PROFILE_GAUSSIAN
+    label = "正态分布"
+
+    def __init__(self, interval: float, std: float = 0.15, **kwargs):
+        """
+        :param std: 相对标准差
+        """
+        self.std = std
+        super().__init__(interval, **kwargs)
+
+    def _fill(self, n: int) -> np.ndarray:
+        factors = np.clip(self.rng.normal(1.0, self.std, n), 1.0 - 3 * self.std, 1.0 + 3 * self.std)
+        return self.interval * factors
+
+
+class LogNormalProfile(IntervalProfile):
+    """对数正态分布：均值为 interval，右侧长尾（偶尔的较长停顿），更接近人手的节奏"""
+
+    name = PROFILE_LOGNORMAL
+    label = "对数正态"
+
+    def __init__(self, interval: float, sigma: float = 0.25, **kwargs):
+        """
+        :param sigma: 对数标准差
+        """
+        self.sigma = sigma
+        super().__init__(interval, **kwargs)
+
+    def _fill(self, n: int) -> np.ndarray:
+        # 取 mu 使分布均值等于 interval
+        mu = math.log(self.interval) - self.sigma ** 2 / 2
+        return self.rng.lognormal(mu, self.sigma, n)
+
+
+class BurstPauseProfile(IntervalProfile):
+    """
+    连发/停顿：每轮连发若干次（间隔为 interval × burst_factor），随后停顿 interval × pause_factor
+    连发次数在 [burst_min, burst_max] 内随机
+    """
+
+    name = PROFILE_BURST
+    label = "连发/停顿"
+
+    def __init__(self, interval: float, burst_min: int = 3, burst_max: int = 8,
+                 burst_factor: float = 0.6, pause_factor: float = 5.0, **kwargs):
+        """
+        :param burst_min: 每轮最少连发次数
+        :param burst_max: 每轮最多连发次数
+        :param burst_factor: 连发间隔相对基准间隔的倍数
+        :param pause_factor: 停顿相对基准间隔的倍数
+        """
+        self.burst_min = max(1, burst_min)
+        self.burst_max = max(self.burst_min, burst_max)
+        self.burst_factor = burst_factor
+        self.pause_factor = pause_factor
+        super().__init__(interval, **kwargs)
+
+    def _fill(self, n: int) -> np.ndarray:
+        # 生成足够多的轮次长度，在每轮最后一次点击之后放一个停顿
+        rounds = n // self.burst_min + 1
+        lengths = self.rng.integers(self.burst_min, self.burst_max + 1, rounds)
+        pause_at = np.cumsum(lengths) - 1
+        pause_at = pause_at[pause_at < n]
+        values = np.full(n, self.interval * self.burst_factor)
+        values[pause_at] = self.interval * self.pause_factor
+        return values
+
+    @property
+    def mean_interval(self) -> float:
+        mean_len = (self.burst_min + self.burst_max) / 2
+        return self.interval * ((mean_len - 1) * self.burst_factor + self.pause_factor) / mean_len
+
+
+class RampProfile(IntervalProfile):
+    """渐进加速：从 interval × start_factor 开始，经 ramp_clicks 次点击平滑过渡到 interval"""
+
+    name = PROFILE_RAMP
+    label = "渐进加速"
+
+    def __init__(self, interval: float, start_factor: float = 4.0, ramp_clicks: int = 20, **kwargs):
+        """
+        :param start_factor: 起始间隔相对基准间隔的倍数
+        :param ramp_clicks: 过渡所用的点击次数
+        """
+        self.start_factor = start_factor
+        self.ramp_clicks = max(1, ramp_clicks)
+        super().__init__(interval, **kwargs)
+
+    def _fill(self, n: int) -> np.ndarray:
+        # 序号跨块连续，set_interval 后也不会重新加速
+        position = np.arange(self.generated, self.generated + n)
+        progress = np.minimum(position / self.ramp_clicks, 1.0)
+        eased = progress * progress * (3.0 - 2.0 * progress)
+        return self.interval * (self.start_factor + (1.0 - self.start_factor) * eased)
+
+
+# 名称 -> 生成器类（有序，供界面下拉框使用）
+PROFILES: Dict[str, Type[IntervalProfile]] = {
+    cls.name: cls for cls in (FixedProfile, UniformProfile, GaussianProfile, LogNormalProfile,
+                              BurstPauseProfile, RampProfile)
+}
+
+
+def create_profile(name: str, interval: float, seed: Optional[int] = None, **params) -> IntervalProfile:
+    """
+    按名称创建间隔生成器
+    :param name: 见 PROFILES
+    :param interval: 基准间隔(秒)
+    :param seed: 随机数种子
+    :param params: 分布参数（如 spread、std、sigma）
+    """
+    try:
+        cls = PROFILES[name]
+    except KeyError:
+        raise ValueError(f"未知的间隔分布: {name}") from None
+    return cls(interval, seed=seed, **params)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    print("=== 点击间隔分布测试 - subLD ===")
+    for name in PROFILES:
+        profile = create_profile(name, 0.1, seed=42)
+        values = np.array([profile.next_ns() for _ in range(10000)]) / 1e6
+        again = create_profile(name, 0.1, seed=42)
+        assert [again.next_ns() for _ in range(100)] == (values[:100] * 1e6).round().astype(np.int64).tolist()
+        print(f"{profile.label:<6} 均值 {values.mean():7.2f} ms (期望 {profile.mean_interval * 1000:6.2f}), "
+              f"标准差 {values.std():6.2f} ms, 最小 {values.min():6.2f}, 最大 {values.max():7.2f}")
+
+    profile = create_profile(PROFILE_LOGNORMAL, 0.1)
+    start = time.perf_counter_ns()
+    for _ in range(1_000_000):
+        profile.next_ns()
+    print(f"next_ns(): {(time.perf_counter_ns() - start) / 1_000_000:.0f} ns/次")
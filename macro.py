@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+宏录制与回放模块 - subLD项目
+录制用户输入为时间线，编译为数组存储的紧凑事件程序，通过幽灵键鼠精确回放
+"""
+import threading
+import time
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+from device_metrics import LatencyHistogram
+
+# ==================== 操作码 ====================
+OP_MOVE_TO = 1       # a=x, b=y
+OP_MOVE_R = 2        # a=dx, b=dy
+OP_LEFT_DOWN = 3
+OP_LEFT_UP = 4
+OP_RIGHT_DOWN = 5
+OP_RIGHT_UP = 6
+OP_MIDDLE_DOWN = 7
+OP_MIDDLE_UP = 8
+OP_KEY_DOWN = 9      # a=按键表下标
+OP_KEY_UP = 10       # a=按键表下标
+OP_KEY_UP_ALL = 11
+
+# 操作码 -> 设备方法名
+OP_DEVICE_METHODS = {
+    OP_MOVE_TO: "MoveTo",
+    OP_MOVE_R: "MoveR",
+    OP_LEFT_DOWN: "LeftDown",
+    OP_LEFT_UP: "LeftUp",
+    OP_RIGHT_DOWN: "RightDown",
+    OP_RIGHT_UP: "RightUp",
+    OP_MIDDLE_DOWN: "MiddleDown",
+    OP_MIDDLE_UP: "MiddleUp",
+    OP_KEY_DOWN: "KeyDown",
+    OP_KEY_UP: "KeyUp",
+    OP_KEY_UP_ALL: "KeyUpAll",
+}
+DEVICE_METHOD_OPS = {name: op for op, name in OP_DEVICE_METHODS.items()}
+
+# 鼠标按钮按下操作码 -> (按钮位, 对应的松开方法名)，用于中止时松开仍按住的按钮
+_BUTTON_DOWN_BITS = {OP_LEFT_DOWN: 1, OP_RIGHT_DOWN: 2, OP_MIDDLE_DOWN: 4}
+_BUTTON_UP_BITS = {OP_LEFT_UP: 1, OP_RIGHT_UP: 2, OP_MIDDLE_UP: 4}
+_BUTTON_RELEASE = ((1, "LeftUp"), (2, "RightUp"), (4, "MiddleUp"))
+
+# 时间线事件: (相对时间ns, 设备方法名, 参数元组)，如 (1200000, "MoveTo", (100, 200))
+TimelineEvent = Tuple[int, str, tuple]
+
+
+class MacroProgram:
+    """
+    编译后的宏程序
+    每个事件占四个并行数组中的一个槽位：操作码(uint8)、参数a/b(int32)、相对时间(int64 ns)。
+    按键名存放在按键表中，事件只保存下标。
+    回放器只依赖 ops/arg_a/arg_b/times/keys/time_unit_ns/duration_ns，
+    macro_file.MappedMacroProgram 以同样的接口提供内存映射文件上的零拷贝视图。
+    """
+
+    # times 的单位（纳秒）
+    time_unit_ns = 1
+
+    def __init__(self):
+        self.ops = array('B')
+        self.arg_a = array('i')
+        self.arg_b = array('i')
+        self.times = array('q')
+        self.keys: List[str] = []
+        self._key_index = {}
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    @property
+    def duration_ns(self) -> int:
+        """程序时长(ns)，即最后一个事件的相对时间"""
+        return self.times[-1] if self.times else 0
+
+    def key_id(self, key: str) -> int:
+        """按键名 -> 按键表下标（不存在时追加）"""
+        index = self._key_index.get(key)
+        if index is None:
+            index = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        return index
+
+    def append(self, time_ns: int, op: int, a: int = 0, b: int = 0):
+        """
+        追加一个事件，时间需单调不减
+        :param time_ns: 相对时间(ns)
+        :param op: 操作码
+        :param a: 参数a
+        :param b: 参数b
+        """
+        if self.times and time_ns < self.times[-1]:
+            raise ValueError("宏事件时间必须单调不减")
+        self.ops.append(op)
+        self.arg_a.append(a)
+        self.arg_b.append(b)
+        self.times.append(time_ns)
+
+    @classmethod
+    def compile(cls, events: Iterable[TimelineEvent]) -> "MacroProgram":
+        """
+        把时间线编译为宏程序，时间以第一个事件为0点
+        :param events: (时间ns, 设备方法名, 参数元组) 序列，需按时间排序
+        :return: MacroProgram
+        """
+        program = cls()
+        origin = None
+        for time_ns, method, args in events:
+            if origin is None:
+                origin = time_ns
+            op = DEVICE_METHOD_OPS.get(method)
+            if op is None:
+                raise ValueError(f"未知的设备方法: {method}")
+            if op in (OP_KEY_DOWN, OP_KEY_UP):
+                program.append(time_ns - origin, op, program.key_id(args[0]))
+            elif op in (OP_MOVE_TO, OP_MOVE_R):
+                program.append(time_ns - origin, op, int(args[0]), int(args[1]))
+            else:
+                program.append(time_ns - origin, op)
+        return program
+
+    def to_events(self) -> List[TimelineEvent]:
+        """反编译为时间线（用于查看和编辑）"""
+        events = []
+        for i in range(len(self.ops)):
+            op = self.ops[i]
+            if op in (OP_KEY_DOWN, OP_KEY_UP):
+                args = (self.keys[self.arg_a[i]],)
+            elif op in (OP_MOVE_TO, OP_MOVE_R):
+                args = (self.arg_a[i], self.arg_b[i])
+            else:
+                args = ()
+            events.append((self.times[i], OP_DEVICE_METHODS[op], args))
+        return events
+
+
+class MacroRecorder:
+    """
+    宏录制器
+    通过 pynput 监听鼠标和键盘，把用户输入记录为时间线。
+    鼠标移动按最小间隔合并，只保留每个间隔内的最后位置，按钮/按键事件前先写入待定的移动。
+    """
+
+    def __init__(self, min_move_interval: float = 0.005, record_moves: bool = True, sink=None):
+        """
+        :param min_move_interval: 相邻两次移动记录的最小间隔(秒)
+        :param record_moves: 是否记录鼠标移动
+        :param sink: 可选的事件接收器（如 macro_file.MacroFileWriter），提供 write_event(event)；
+                     指定后事件直接增量写入，不在内存中保留，适合长时间录制
+        """
+        self.min_move_interval_ns = int(min_move_interval * 1e9)
+        self.record_moves = record_moves
+        self.sink = sink
+        self.events: List[TimelineEvent] = []
+        self._pending_move: Optional[TimelineEvent] = None
+        self._last_move_ns = 0
+        self._lock = threading.Lock()
+        self._mouse_listener = None
+        self._keyboard_listener = None
+
+    def start(self):
+        """开始录制"""
+        from pynput import keyboard, mouse
+
+        self.events = []
+        self._pending_move = None
+        self._last_move_ns = 0
+        self._mouse_listener = mouse.Listener(on_move=self._on_move, on_click=self._on_click)
+        self._keyboard_listener = keyboard.Listener(on_press=self._on_press,
+                                                    on_release=self._on_release)
+        self._mouse_listener.start()
+        self._keyboard_listener.start()
+
+    def stop(self) -> Optional[MacroProgram]:
+        """
+        停止录制并编译
+        :return: 宏程序；指定了 sink 时事件已写入 sink，返回None
+        """
+        for listener in (self._mouse_listener, self._keyboard_listener):
+            if listener:
+                listener.stop()
+        self._mouse_listener = None
+        self._keyboard_listener = None
+        with self._lock:
+            self._flush_move()
+            events = list(self.events)
+        if self.sink is not None:
+            return None
+        return MacroProgram.compile(events)
+
+    def _add(self, method: str, args: tuple = ()):
+        """记录一个事件（先写入待定的移动）"""
+        now = time.perf_counter_ns()
+        with self._lock:
+            self._flush_move()
+            self._emit((now, method, args))
+
+    def _emit(self, event: TimelineEvent):
+        if self.sink is not None:
+            self.sink.write_event(event)
+        else:
+            self.events.append(event)
+
+    def _flush_move(self):
+        if self._pending_move is not None:
+            self._emit(self._pending_move)
+            self._pending_move = None
+
+    def _on_move(self, x, y):
+        if not self.record_moves:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            self._pending_move = (now, "MoveTo", (int(x), int(y)))
+            if now - self._last_move_ns >= self.min_move_interval_ns:
+                self._flush_move()
+                self._last_move_ns = now
+
+    def _on_click(self, x, y, button, pressed):
+        name = getattr(button, "name", "")
+        if name == "left":
+            self._add("LeftDown" if pressed else "LeftUp")
+        elif name == "right":
+            self._add("RightDown" if pressed else "RightUp")
+        elif name == "middle":
+            self._add("MiddleDown" if pressed else "MiddleUp")
+
+    def _on_press(self, key):
+        self._add("KeyDown", (key_name(key),))
+
+    def _on_release(self, key):
+        self._add("KeyUp", (key_name(key),))
+
+
+def key_name(key) -> str:
+    """
+    pynput 按键 -> 幽灵键鼠按键名
+    字符键取大写字符，特殊键取首字母大写的名称，如 "A"、"1"、"Enter"、"F1"
+    """
+    char = getattr(key, "char", None)
+    if char:
+        return char.upper()
+    name = getattr(key, "name", None) or str(key)
+    return name[:1].upper() + name[1:]
+
+
+class MacroPlayer:
+    """
+    宏回放器
+    回放在设备线程上以分段方式执行：每段执行所有在 window 内到期的事件（自旋对齐到事件时间），
+    然后把下一段预约到下一个事件的到期时间，期间设备线程可以处理其他命令。
+    事件直接从数组读取并通过预先解析的设备方法表调用，回放循环中不构建任何按事件的对象。
+    """
+
+    def __init__(self, ghost, program: MacroProgram, window: float = 0.002):
+        """
+        :param ghost: 已连接的 GhostMouse 实例
+        :param program: 宏程序
+        :param window: 单段内连续执行的时间窗口(秒)
+        """
+        self.ghost = ghost
+        self.program = program
+        self.window_ns = int(window * 1e9)
+        self.played_count = 0
+        self.max_lateness_ns = 0
+        # 每个事件实际执行时间相对计划时间的延迟
+        self.lateness = LatencyHistogram()
+        self.aborted = False
+        self.error = None
+        self._done = threading.Event()
+        self._done.set()
+        self._abort = False
+
+    # ==================== 控制 ====================
+
+    def play(self, speed: float = 1.0, loops: int = 1, loop_gap: float = 0.0,
+             delay: float = 0.0) -> bool:
+        """
+        开始回放（不阻塞，用 wait() 等待结束）
+        :param speed: 速度倍率，2.0 表示两倍速
+        :param loops: 循环次数，0 表示无限循环直到 abort()
+        :param loop_gap: 两次循环之间的间隔(秒)，按原速计算
+        :param delay: 开始前的延迟(秒)
+        :return: 成功开始返回True
+        """
+        if not self.ghost.check_connection() or not len(self.program) or speed <= 0:
+            return False
+        if not self._done.is_set():
+            return False
+        self._engine = self.ghost.engine
+        self._inv_speed = 1.0 / speed
+        self._loops = loops
+        self._loop_span_ns = self.program.duration_ns + int(loop_gap * 1e9)
+        self._loop = 0
+        self._index = 0
+        self._buttons = 0
+        self._abort = False
+        self.aborted = False
+        self.error = None
+        self.played_count = 0
+        self.max_lateness_ns = 0
+        self.lateness.reset()
+        self._dispatch = None
+        self._done.clear()
+        self._base_ns = time.perf_counter_ns() + int(delay * 1e9)
+        self._engine.schedule(self._base_ns, self._step)
+        return True
+
+    def abort(self):
+        """中止回放，松开所有按住的按钮和按键"""
+        self._abort = True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待回放结束
+        :return: 已结束返回True
+        """
+        return self._done.wait(timeout)
+
+    @property
+    def is_playing(self) -> bool:
+        return not self._done.is_set()
+
+    # ==================== 设备线程 ====================
+
+    def _resolve_dispatch(self):
+        """在设备线程上把操作码解析为绑定的设备方法，并为按键预先构造参数"""
+        engine = self._engine
+        table = [None] * (max(OP_DEVICE_METHODS) + 1)
+        for op, method in OP_DEVICE_METHODS.items():
+            table[op] = engine._resolve(method)
+        self._dispatch = table
+        self._key_args = [(key,) for key in self.program.keys]
+
+    def _step(self):
+        """执行一段到期事件，并预约下一段"""
+        if self._dispatch is None:
+            self._resolve_dispatch()
+        if self._abort:
+            self._finish(aborted=True)
+            return
+
+        program = self.program
+        ops, arg_a, arg_b, times = program.ops, program.arg_a, program.arg_b, program.times
+        count = len(ops)
+        dispatch = self._dispatch
+        hook = self._engine.command_hook
+        metrics = self._engine.metrics
+        if metrics is not None and not metrics.enabled:
+            metrics = None
+        inv_speed = self._inv_speed
+        time_scale = program.time_unit_ns * inv_speed
+        window_ns = self.window_ns
+        record_lateness = self.lateness.record
+        perf_counter_ns = time.perf_counter_ns
+        base = self._base_ns + int(self._loop * self._loop_span_ns * inv_speed)
+        i = self._index
+
+        try:
+            while True:
+                if i >= count:
+                    self._loop += 1
+                    if self._loops and self._loop >= self._loops:
+                        self._index = i
+                        self._finish(aborted=False)
+                        return
+                    i = 0
+                    base = self._base_ns + int(self._loop * self._loop_span_ns * inv_speed)
+
+                due = base + int(times[i] * time_scale)
+                now = perf_counter_ns()
+                if due - now > window_ns:
+                    break
+                while now < due:
+                    time.sleep(0)
+                    now = perf_counter_ns()
+                lateness = now - due
+                record_lateness(lateness)
+                if lateness > self.max_lateness_ns:
+                    self.max_lateness_ns = lateness
+
+                op = ops[i]
+                fn = dispatch[op]
+                if hook is not None:
+                    hook(OP_DEVICE_METHODS[op], (), now)
+                if op == OP_MOVE_TO or op == OP_MOVE_R:
+                    fn(arg_a[i], arg_b[i])
+                elif op == OP_KEY_DOWN or op == OP_KEY_UP:
+                    fn(*self._key_args[arg_a[i]])
+                else:
+                    fn()
+                    if op in _BUTTON_DOWN_BITS:
+                        self._buttons |= _BUTTON_DOWN_BITS[op]
+                    elif op in _BUTTON_UP_BITS:
+                        self._buttons &= ~_BUTTON_UP_BITS[op]
+                if metrics is not None:
+                    metrics.record(OP_DEVICE_METHODS[op], perf_counter_ns() - now, True)
+                self.played_count += 1
+                i += 1
+                if self._abort:
+                    self._index = i
+                    self._finish(aborted=True)
+                    return
+        except Exception as e:
+            self.error = e
+            self._index = i
+            self._finish(aborted=True)
+            return
+
+        self._index = i
+        self._engine.schedule(due - window_ns // 2, self._step)
+
+    def _finish(self, aborted: bool):
+        """结束回放；中止时松开所有按住的鼠标按钮和按键"""
+        if aborted:
+            self.aborted = True
+            dispatch = self._dispatch
+            for bit, method in _BUTTON_RELEASE:
+                if self._buttons & bit:
+                    try:
+                        self._engine._resolve(method)()
+                    except Exception:
+                        pass
+            try:
+                dispatch[OP_KEY_UP_ALL]()
+            except Exception:
+                pass
+            self._buttons = 0
+        self._done.set()
+
+
+# 测试代码
+if __name__ == "__main__":
+    from ghost_backends import SimulatedBackend
+    from ghost_mouse import GhostMouse
+
+    print("=== 宏回放测试 - subLD ===")
+    ghost = GhostMouse(backend=SimulatedBackend(log_size=300000))
+    ghost.connect()
+
+    # 构造一个10万事件的宏：每0.1ms一个事件，左键点击与相对移动交替
+    macro = MacroProgram()
+    for n in range(100000):
+        t = n * 100_000
+        kind = n % 4
+        if kind == 0:
+            macro.append(t, OP_LEFT_DOWN)
+        elif kind == 2:
+            macro.append(t, OP_LEFT_UP)
+        else:
+            macro.append(t, OP_MOVE_R, 1, -1)
+
+    player = MacroPlayer(ghost, macro)
+    start = time.perf_counter()
+    player.play(speed=1.0)
+    player.wait()
+    elapsed = time.perf_counter() - start
+    lateness = player.lateness.snapshot()
+    print(f"回放 {player.played_count} 个事件，用时 {elapsed:.3f}s "
+          f"(宏时长 {macro.duration_ns / 1e9:.3f}s)，延迟 p50 {lateness['p50_ms']:.3f} ms, "
+          f"p99 {lateness['p99_ms']:.3f} ms, 最大 {lateness['max_ms']:.3f} ms")
+    ghost.disconnect()
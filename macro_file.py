@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+宏文件格式模块 - subLD项目
+定长记录的二进制宏文件：可在录制时增量写入，回放时通过 mmap 零拷贝流式读取
+
+文件布局（小端）:
+    文件头(64字节): 魔数"SLDMACRO", 版本, 文件头大小, 记录大小, 保留, 记录数, 按键表偏移, 数据偏移
+    操作码表: 数量(uint16) + [操作码(uint8), 名称长度(uint8), 名称(ASCII)]...，补齐到8字节
+    记录区: 每条24字节 = 操作码(int32) 参数a(int32) 参数b(int32) 保留(int32) 相对时间秒(float64)
+    按键表: 数量(uint32) + [长度(uint16), 名称(UTF-8)]...，关闭文件时写入
+
+未正常关闭的文件（记录数为0且无按键表）按文件长度推算记录数，仍可回放不含按键的部分。
+
+用法:
+    python macro_file.py info  宏文件.sldm
+    python macro_file.py to-text  宏文件.sldm  宏文件.txt
+    python macro_file.py from-text  宏文件.txt  宏文件.sldm
+"""
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional
+
+from macro import (MacroProgram, OP_DEVICE_METHODS, DEVICE_METHOD_OPS, OP_KEY_DOWN, OP_KEY_UP,
+                   OP_MOVE_TO, OP_MOVE_R, TimelineEvent)
+
+MAGIC = b"SLDMACRO"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHHQQQ")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<iiiid")
+RECORD_SIZE = RECORD.size          # 24，8字节对齐，便于按 int32/float64 零拷贝映射
+INTS_PER_RECORD = RECORD_SIZE // 4
+DOUBLES_PER_RECORD = RECORD_SIZE // 8
+TEXT_HEADER = "# subLD macro v1"
+
+
+class MacroFileError(Exception):
+    """宏文件格式错误"""
+
+
+def _op_table_bytes() -> bytes:
+    """编码操作码表，并补齐到8字节"""
+    parts = [struct.pack("<H", len(OP_DEVICE_METHODS))]
+    for op, name in sorted(OP_DEVICE_METHODS.items()):
+        encoded = name.encode("ascii")
+        parts.append(struct.pack("<BB", op, len(encoded)) + encoded)
+    data = b"".join(parts)
+    return data + b"\0" * (-(HEADER_SIZE + len(data)) % 8)
+
+
+class MacroFileWriter:
+    """
+    宏文件增量写入器
+    记录先写入固定大小的缓冲区，满后一次写入文件，录制期间内存占用恒定。
+    可直接作为 macro.MacroRecorder 的 sink。
+    """
+
+    def __init__(self, path: str, buffer_records: int = 4096):
+        """
+        :param path: 文件路径
+        :param buffer_records: 写缓冲区可容纳的记录数
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        self._buffer = bytearray(RECORD_SIZE * buffer_records)
+        self._buffered = 0
+        self._capacity = buffer_records
+        self.record_count = 0
+        self.keys: List[str] = []
+        self._key_index = {}
+        self._origin_ns: Optional[int] = None
+        self._last_time = 0.0
+
+        self._file.write(b"\0" * HEADER_SIZE)
+        self._file.write(_op_table_bytes())
+        self._data_offset = self._file.tell()
+        self._write_header(record_count=0, key_table_offset=0)
+
+    def _write_header(self, record_count: int, key_table_offset: int):
+        header = HEADER.pack(MAGIC, VERSION, HEADER_SIZE, RECORD_SIZE, 0,
+                             record_count, key_table_offset, self._data_offset)
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+        self._file.seek(position)
+
+    def key_id(self, key: str) -> int:
+        """按键名 -> 按键表下标（不存在时追加）"""
+        index = self._key_index.get(key)
+        if index is None:
+            index = self._key_index[key] = len(self.keys)
+            self.keys.append(key)
+        return index
+
+    def write(self, time_s: float, op: int, a: int = 0, b: int = 0):
+        """
+        写入一条记录
+        :param time_s: 相对时间(秒)，需单调不减
+        :param op: 操作码
+        """
+        if time_s < self._last_time:
+            raise ValueError("宏事件时间必须单调不减")
+        self._last_time = time_s
+        RECORD.pack_into(self._buffer, self._buffered * RECORD_SIZE, op, a, b, 0, time_s)
+        self._buffered += 1
+        self.record_count += 1
+        if self._buffered == self._capacity:
+            self.flush()
+
+    def write_event(self, event: TimelineEvent):
+        """
+        写入一个时间线事件 (绝对时间ns, 设备方法名, 参数)，时间以第一个事件为0点
+        """
+        time_ns, method, args = event
+        if self._origin_ns is None:
+            self._origin_ns = time_ns
+        op = DEVICE_METHOD_OPS.get(method)
+        if op is None:
+            raise ValueError(f"未知的设备方法: {method}")
+        time_s = (time_ns - self._origin_ns) / 1e9
+        if op in (OP_KEY_DOWN, OP_KEY_UP):
+            self.write(time_s, op, self.key_id(args[0]))
+        elif op in (OP_MOVE_TO, OP_MOVE_R):
+            self.write(time_s, op, int(args[0]), int(args[1]))
+        else:
+            self.write(time_s, op)
+
+    def write_program(self, program: MacroProgram):
+        """写入整个内存中的宏程序"""
+        scale = program.time_unit_ns / 1e9
+        for i in range(len(program)):
+            op = program.ops[i]
+            a = program.arg_a[i]
+            if op in (OP_KEY_DOWN, OP_KEY_UP):
+                a = self.key_id(program.keys[a])
+            self.write(program.times[i] * scale, op, a, program.arg_b[i])
+
+    def flush(self):
+        """把缓冲区写入文件"""
+        if self._buffered:
+            self._file.write(memoryview(self._buffer)[:self._buffered * RECORD_SIZE])
+            self._buffered = 0
+        self._file.flush()
+
+    def close(self):
+        """写入按键表和最终文件头，关闭文件"""
+        if self._file.closed:
+            return
+        self.flush()
+        key_table_offset = self._file.tell()
+        self._file.write(struct.pack("<I", len(self.keys)))
+        for key in self.keys:
+            encoded = key.encode("utf-8")
+            self._file.write(struct.pack("<H", len(encoded)) + encoded)
+        self._write_header(self.record_count, key_table_offset)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MappedMacroProgram:
+    """
+    内存映射的宏文件
+    ops/arg_a/arg_b/times 是直接建立在 mmap 上的带步长 memoryview，不复制数据，
+    接口与 macro.MacroProgram 一致（times 单位为秒），可直接交给 MacroPlayer 回放。
+    无论文件多大，进程只保留被访问到的页，且这些页可由系统随时回收。
+    """
+
+    time_unit_ns = 1_000_000_000
+
+    def __init__(self, path: str):
+        """
+        :param path: 宏文件路径
+        :raises MacroFileError: 文件格式不正确
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER_SIZE:
+            self._file.close()
+            raise MacroFileError("文件太小，不是宏文件")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mmap, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+        try:
+            (magic, version, header_size, record_size, _, count,
+             key_table_offset, data_offset) = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise MacroFileError("魔数不匹配，不是宏文件")
+            if version != VERSION or record_size != RECORD_SIZE:
+                raise MacroFileError(f"不支持的宏文件版本: {version}")
+            self._check_op_table(header_size, data_offset)
+            if key_table_offset == 0:
+                # 未正常关闭：按文件长度推算记录数
+                count = (size - data_offset) // RECORD_SIZE
+                self.keys: List[str] = []
+                self.complete = False
+            else:
+                self.keys = self._read_keys(key_table_offset)
+                self.complete = True
+        except (MacroFileError, struct.error) as e:
+            self.close()
+            raise MacroFileError(str(e)) from None
+
+        self.record_count = count
+        data = memoryview(self._mmap)[data_offset:data_offset + count * RECORD_SIZE]
+        self._ints = data.cast("i")
+        self._doubles = data.cast("d")
+        self.ops = self._ints[0::INTS_PER_RECORD]
+        self.arg_a = self._ints[1::INTS_PER_RECORD]
+        self.arg_b = self._ints[2::INTS_PER_RECORD]
+        self.times = self._doubles[2::DOUBLES_PER_RECORD]
+        self._views = [data, self._ints, self._doubles, self.ops, self.arg_a, self.arg_b, self.times]
+
+    def _check_op_table(self, offset: int, data_offset: int):
+        """校验文件中的操作码表与当前版本一致"""
+        (count,) = struct.unpack_from("<H", self._mmap, offset)
+        position = offset + 2
+        table = {}
+        for _ in range(count):
+            op, length = struct.unpack_from("<BB", self._mmap, position)
+            table[op] = bytes(self._mmap[position + 2:position + 2 + length]).decode("ascii")
+            position += 2 + length
+        if table != OP_DEVICE_METHODS or position > data_offset:
+            raise MacroFileError("操作码表与当前版本不一致")
+
+    def _read_keys(self, offset: int) -> List[str]:
+        (count,) = struct.unpack_from("<I", self._mmap, offset)
+        position = offset + 4
+        keys = []
+        for _ in range(count):
+            (length,) = struct.unpack_from("<H", self._mmap, position)
+            keys.append(bytes(self._mmap[position + 2:position + 2 + length]).decode("utf-8"))
+            position += 2 + length
+        return keys
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    @property
+    def duration_ns(self) -> int:
+        return int(self.times[-1] * 1e9) if self.record_count else 0
+
+    def iter_events(self) -> Iterator[TimelineEvent]:
+        """逐条产生 (相对时间ns, 设备方法名, 参数)，用于转换和查看"""
+        ops, arg_a, arg_b, times, keys = self.ops, self.arg_a, self.arg_b, self.times, self.keys
+        for i in range(self.record_count):
+            op = ops[i]
+            if op in (OP_KEY_DOWN, OP_KEY_UP):
+                args = (keys[arg_a[i]],)
+            elif op in (OP_MOVE_TO, OP_MOVE_R):
+                args = (arg_a[i], arg_b[i])
+            else:
+                args = ()
+            yield int(round(times[i] * 1e9)), OP_DEVICE_METHODS[op], args
+
+    def close(self):
+        """释放视图并关闭映射"""
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ==================== 文本格式转换 ====================
+
+def _format_text_line(time_ns: int, method: str, args: tuple) -> str:
+    parts = [f"{time_ns / 1e9:.9f}", method]
+    parts.extend(str(arg) for arg in args)
+    return " ".join(parts)
+
+
+def binary_to_text(src: str, dst: str):
+    """
+    二进制宏文件 -> 文本（每行: 相对时间秒 方法名 [参数...]），便于 diff
+    """
+    with MappedMacroProgram(src) as program, open(dst, "w", encoding="utf-8") as out:
+        out.write(TEXT_HEADER + "\n")
+        for time_ns, method, args in program.iter_events():
+            out.write(_format_text_line(time_ns, method, args) + "\n")
+
+
+def text_to_binary(src: str, dst: str):
+    """文本宏文件 -> 二进制宏文件"""
+    with open(src, encoding="utf-8") as text, MacroFileWriter(dst) as writer:
+        for line_no, line in enumerate(text, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            try:
+                time_s = float(fields[0])
+                method = fields[1]
+                op = DEVICE_METHOD_OPS[method]
+                if op in (OP_KEY_DOWN, OP_KEY_UP):
+                    writer.write(time_s, op, writer.key_id(fields[2]))
+                elif op in (OP_MOVE_TO, OP_MOVE_R):
+                    writer.write(time_s, op, int(fields[2]), int(fields[3]))
+                else:
+                    writer.write(time_s, op)
+            except (IndexError, KeyError, ValueError) as e:
+                raise MacroFileError(f"第{line_no}行格式错误: {line} ({e})") from None
+
+
+def save_program(program: MacroProgram, path: str):
+    """把内存中的宏程序保存为二进制宏文件"""
+    with MacroFileWriter(path) as writer:
+        writer.write_program(program)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="subLD 宏文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="显示宏文件信息")
+    info.add_argument("path")
+    to_text = sub.add_parser("to-text", help="二进制宏文件转文本")
+    to_text.add_argument("src")
+    to_text.add_argument("dst")
+    from_text = sub.add_parser("from-text", help="文本转二进制宏文件")
+    from_text.add_argument("src")
+    from_text.add_argument("dst")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        with MappedMacroProgram(args.path) as program:
+            print(f"记录数: {len(program)}")
+            print(f"时长: {program.duration_ns / 1e9:.3f} 秒")
+            print(f"按键表: {program.keys}")
+            print(f"完整关闭: {'是' if program.complete else '否'}")
+    elif args.command == "to-text":
+        binary_to_text(args.src, args.dst)
+    else:
+        text_to_binary(args.src, args.dst)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,165 +2,48 @@
 """
 鼠标自动连点器模块 - subLD项目
 使用幽灵键鼠硬件实现鼠标连点
+连点逻辑位于不依赖Qt的 click_engine.ClickEngine，本模块只把引擎事件转为Qt信号供界面使用
 """
 import time
-import threading
 from PySide6.QtCore import QObject, Signal
-from ghost_mouse import get_ghost_mouse
+from click_engine import (ClickEngine, SCHEDULE_DEADLINE, SCHEDULE_SLEEP, EVENT_STATUS_CHANGED,
+                          EVENT_CLICK_COUNT_CHANGED, EVENT_PROGRESS_CHANGED, EVENT_ERROR_OCCURRED,
+                          EVENT_DEVICE_STATE_CHANGED)
+from click_timing import MISS_POLICY_SKIP
 
 
-class MouseAutoClicker(QObject):
+class MouseAutoClicker(QObject, ClickEngine):
     """鼠标自动连点器（使用幽灵键鼠）"""
     
     # 定义信号
     status_changed = Signal(bool)  # 连点状态改变信号
-    click_count_changed = Signal(int)  # 点击次数改变信号
-    error_occurred = Signal(str)  # 错误信号
+    click_count_changed = Signal(int)  # 点击次数改变信号（合并发布，非每次点击）
+    progress_changed = Signal(object)  # 进度快照信号（ProgressSnapshot）
+    error_occurred = Signal(str)  # 错误信号（连点期间经过限流合并）
+    device_state_changed = Signal(str)  # 设备连接状态信号（connected / reconnecting / lost）
     
-    def __init__(self, interval=0.1):
+    def __init__(self, interval=0.1, schedule_mode=SCHEDULE_DEADLINE,
+                 miss_policy=MISS_POLICY_SKIP, progress_rate_hz=30.0, ghost=None, auto_reconnect=True):
         """
         初始化连点器
         :param interval: 点击间隔时间(秒)，默认0.1秒
+        :param schedule_mode: 调度模式，"deadline"(默认) 或 "sleep"
+        :param miss_policy: 截止时间调度下错过时间槽的策略，"skip" 或 "catch_up"
+        :param progress_rate_hz: 进度信号的最大发布频率(Hz)
+        :param ghost: 使用的 GhostMouse 实例（或 device_pool.DevicePool 多设备池），默认为全局单例
+        :param auto_reconnect: 点击失败时是否自动重连设备并继续连点
         """
-        super().__init__()
-        self.interval = interval
-        self.is_clicking = False
-        self.is_enabled = False  # 是否启用连点功能
-        self.click_thread = None
-        self.click_count = 0
-        self._should_stop = False
-        
-        # 获取幽灵键鼠实例
-        self.ghost = get_ghost_mouse()
-        
-        # 监听状态
-        self._left_button_pressed = False
-    
-    def enable(self) -> bool:
-        """
-        启用连点器（连接幽灵键鼠）
-        :return: 成功返回True
-        """
-        if self.is_enabled:
-            return True
-        
-        # 连接幽灵键鼠
-        if self.ghost.connect():
-            self.is_enabled = True
-            print("✅ 连点器已启用")
-            return True
-        else:
-            error_msg = "无法连接幽灵键鼠设备，请检查:\n1. 硬件是否已插入\n2. 驱动是否已安装\n3. 是否以管理员权限运行"
-            self.error_occurred.emit(error_msg)
-            return False
-    
-    def disable(self):
-        """禁用连点器"""
-        if not self.is_enabled:
-            return
-        
-        # 停止当前连点
-        self.stop_clicking()
-        
-        # 断开幽灵键鼠
-        self.ghost.disconnect()
-        self.is_enabled = False
-        print("🔌 连点器已禁用")
-    
-    def start_clicking(self):
-        """开始连点"""
-        if not self.is_enabled:
-            self.error_occurred.emit("连点器未启用，请先点击【启用连点】")
-            return
-        
-        if self.is_clicking:
-            return
-        
-        self.is_clicking = True
-        self.click_count = 0
-        self._should_stop = False
-        self._left_button_pressed = True
-        
-        # 启动连点线程
-        self.click_thread = threading.Thread(target=self._click_loop, daemon=True)
-        self.click_thread.start()
-        
-        self.status_changed.emit(True)
-        print("🖱️ 开始连点...")
-    
-    def stop_clicking(self):
-        """停止连点"""
-        if not self.is_clicking:
-            return
-        
-        self.is_clicking = False
-        self._should_stop = True
-        self._left_button_pressed = False
-        
-        # 等待线程结束
-        if self.click_thread and self.click_thread.is_alive():
-            self.click_thread.join(timeout=1)
-        
-        # 确保左键松开
-        self.ghost.left_up()
-        
-        self.status_changed.emit(False)
-        print(f"⏹️ 停止连点，共点击 {self.click_count} 次")
-    
-    def _click_loop(self):
-        """连点循环（线程函数）"""
-        while self.is_clicking and not self._should_stop:
-            try:
-                # 使用幽灵键鼠执行点击
-                if self.ghost.left_click():
-                    self.click_count += 1
-                    self.click_count_changed.emit(self.click_count)
-                else:
-                    # 点击失败，可能设备断开
-                    error_msg = "点击失败，幽灵键鼠可能断开连接"
-                    self.error_occurred.emit(error_msg)
-                    break
-                
-                # 等待间隔时间
-                time.sleep(self.interval)
-                
-            except Exception as e:
-                print(f"❌ 连点出错: {e}")
-                self.error_occurred.emit(f"连点出错: {str(e)}")
-                break
-        
-        # 循环结束，确保状态正确
-        if self.is_clicking:
-            self.is_clicking = False
-            self.status_changed.emit(False)
-    
-    def set_interval(self, interval: float):
-        """
-        设置点击间隔
-        :param interval: 间隔时间(秒)，最小值为0.01
-        """
-        self.interval = max(0.01, interval)
-        print(f"⏱️ 点击间隔已设置为: {self.interval}秒")
-    
-    def get_status(self) -> dict:
-        """获取当前状态"""
-        return {
-            'is_enabled': self.is_enabled,
-            'is_clicking': self.is_clicking,
-            'click_count': self.click_count,
-            'interval': self.interval,
-            'ghost_connected': self.ghost.is_connected
-        }
-    
-    def simulate_left_button_press(self):
-        """模拟左键按下事件（用于外部触发）"""
-        if self.is_enabled and not self.is_clicking:
-            self.start_clicking()
-    
-    def simulate_left_button_release(self):
-        """模拟左键松开事件（用于外部触发）"""
-        if self.is_enabled and self.is_clicking:
-            self.stop_clicking()
+        QObject.__init__(self)
+        ClickEngine.__init__(self, interval=interval, schedule_mode=schedule_mode,
+                             miss_policy=miss_policy, progress_rate_hz=progress_rate_hz, ghost=ghost,
+                             auto_reconnect=auto_reconnect)
+        
+        # 引擎事件 -> Qt信号（跨线程时由Qt排队投递到界面线程）
+        self.subscribe(EVENT_STATUS_CHANGED, self.status_changed.emit)
+        self.subscribe(EVENT_CLICK_COUNT_CHANGED, self.click_count_changed.emit)
+        self.subscribe(EVENT_PROGRESS_CHANGED, self.progress_changed.emit)
+        self.subscribe(EVENT_ERROR_OCCURRED, self.error_occurred.emit)
+        self.subscribe(EVENT_DEVICE_STATE_CHANGED, self.device_state_changed.emit)
 
 
 # 测试代码
@@ -172,21 +55,20 @@ if __name__ == "__main__":
     
     print("=== subLD 鼠标连点器测试 ===")
     
-    clicker = MouseAutoClicker(interval=0.1)
+    clicker = MouseAutoClicker(interval=0.1, progress_rate_hz=2)
     
     def on_status_changed(is_clicking):
         status = "连点中" if is_clicking else "已停止"
         print(f"状态改变: {status}")
     
-    def on_click_count_changed(count):
-        if count % 10 == 0:  # 每10次打印一次
-            print(f"已点击: {count} 次")
+    def on_progress_changed(snapshot):
+        print(f"已点击: {snapshot.click_count} 次, 速率: {snapshot.cps:.1f} CPS")
     
     def on_error(error_msg):
         print(f"错误: {error_msg}")
     
     clicker.status_changed.connect(on_status_changed)
-    clicker.click_count_changed.connect(on_click_count_changed)
+    clicker.progress_changed.connect(on_progress_changed)
     clicker.error_occurred.connect(on_error)
     
     # 启用连点器
@@ -202,6 +84,9 @@ if __name__ == "__main__":
         
         # 停止连点
         clicker.stop_clicking()
+        timing = clicker.get_status()['timing']
+        print(f"目标 {timing['target_cps']:.1f} CPS, 实际 {timing['achieved_cps']:.1f} CPS, "
+              f"抖动 {timing['jitter_ms']:.3f} ms")
         
         # 禁用连点器
         clicker.disable()
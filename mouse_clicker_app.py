@@ -62,6 +62,7 @@ class SubLDMouseClickerWindow(QMainWindow):
         """窗口关闭事件"""
         # 确保连点器已停止
         self.clicker_widget.clicker.disable()
+        self.clicker_widget.prober.close()
         event.accept()
 
 
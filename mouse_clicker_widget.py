@@ -2,22 +2,65 @@
 """
 鼠标连点器GUI组件 - subLD项目
 """
+import time
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QLabel, QDoubleSpinBox, QGroupBox, QLCDNumber,
-    QFrame, QMessageBox
+    QFrame, QMessageBox, QComboBox, QPlainTextEdit
 )
-from PySide6.QtCore import Qt, Slot
+from PySide6.QtCore import Qt, QTimer, Signal, Slot
 from PySide6.QtGui import QFont, QKeySequence, QShortcut
 from mouse_auto_clicker import MouseAutoClicker
+from interval_profiles import PROFILES
+from device_probe import DeviceProber
+from dashboard_widget import DashboardPanel
+from clicker_log import get_recent_events
+
+# 界面刷新帧率上限
+FRAME_RATE = 30
+
+# 状态标签样式：启动时设置一次，状态变化时只切换 state 动态属性
+STATE_STYLES = """
+    QLabel#statusLabel { color: #95a5a6; }
+    QLabel#statusLabel[state="ready"] { color: #f39c12; }
+    QLabel#statusLabel[state="clicking"] { color: #27ae60; }
+    QLabel#deviceStatusLabel { color: #7f8c8d; font-size: 10px; }
+    QLabel#deviceStatusLabel[state="connected"] { color: #27ae60; }
+    QLabel#deviceStatusLabel[state="reconnecting"] { color: #f39c12; }
+    QLabel#deviceStatusLabel[state="lost"] { color: #e74c3c; }
+    QLabel#probeLabel { color: #7f8c8d; font-size: 9px; }
+    QLabel#probeLabel[state="ok"] { color: #27ae60; }
+    QLabel#probeLabel[state="failed"] { color: #e74c3c; }
+"""
 
 
 class MouseClickerWidget(QWidget):
     """鼠标连点器界面组件 - subLD"""
     
-    def __init__(self, parent=None):
+    # 设备探测结束信号（探测线程发出，排队到界面线程）
+    probe_finished = Signal(object)
+    
+    def __init__(self, parent=None, clicker=None):
+        """
+        :param clicker: 使用的 MouseAutoClicker 实例，默认新建（间隔0.1秒）；
+                        传入时沿用其设备，不安装默认的COM探测器
+        """
         super().__init__(parent)
-        self.clicker = MouseAutoClicker(interval=0.1)
+        self.clicker = clicker if clicker is not None else MouseAutoClicker(interval=0.1)
+        # 自己创建连点器且设备还没有探测器时，启动时在后台探测设备并预热连接，启用连点时直接接管
+        self.prober = None
+        if clicker is None and getattr(self.clicker.ghost, "prober", None) is None:
+            self.prober = DeviceProber(on_done=self.probe_finished.emit)
+            self.clicker.ghost.set_prober(self.prober)
+        # 错误提示框（非模态，重复错误时复用）
+        self._error_box = None
+        # 最近一次进度快照，由帧定时器统一刷新到界面
+        self._pending_progress = None
+        # 已显示的最后一条日志序号
+        self._log_seq = 0
+        self.frames = 0
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(1000 // FRAME_RATE)
         self.init_ui()
         self.connect_signals()
         self.setup_shortcuts()
@@ -67,15 +110,22 @@ class MouseClickerWidget(QWidget):
         status_font.setBold(True)
         status_font.setPointSize(12)
         self.status_label.setFont(status_font)
-        self.status_label.setStyleSheet("color: #95a5a6;")
+        self.status_label.setObjectName("statusLabel")
         status_layout.addWidget(self.status_label)
         
         # 设备状态标签
         self.device_status_label = QLabel("🔌 幽灵键鼠: 未连接")
         self.device_status_label.setAlignment(Qt.AlignCenter)
-        self.device_status_label.setStyleSheet("color: #7f8c8d; font-size: 10px;")
+        self.device_status_label.setObjectName("deviceStatusLabel")
         status_layout.addWidget(self.device_status_label)
         
+        # 设备探测结果
+        self.probe_label = QLabel("🔍 设备探测中...")
+        self.probe_label.setAlignment(Qt.AlignCenter)
+        self.probe_label.setWordWrap(True)
+        self.probe_label.setObjectName("probeLabel")
+        status_layout.addWidget(self.probe_label)
+        
         # 点击计数器
         counter_layout = QHBoxLayout()
         counter_label = QLabel("点击次数:")
@@ -98,9 +148,35 @@ class MouseClickerWidget(QWidget):
         counter_layout.addWidget(self.click_counter)
         
         status_layout.addLayout(counter_layout)
+        
+        # 实时速率
+        self.rate_label = QLabel("速率: 0.0 CPS | 失败: 0")
+        self.rate_label.setAlignment(Qt.AlignCenter)
+        self.rate_label.setStyleSheet("color: #34495e; font-size: 10px;")
+        status_layout.addWidget(self.rate_label)
         status_frame.setLayout(status_layout)
         group_layout.addWidget(status_frame)
         
+        # === 实时性能曲线 ===
+        self.dashboard_panel = DashboardPanel(self.clicker.dashboard)
+        group_layout.addWidget(self.dashboard_panel)
+        
+        # === 最近日志（来自日志模块的内存环形缓冲） ===
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(200)
+        self.log_view.setFixedHeight(70)
+        self.log_view.setStyleSheet("""
+            QPlainTextEdit {
+                background-color: #fdfefe;
+                border: 1px solid #bdc3c7;
+                border-radius: 5px;
+                color: #566573;
+                font-size: 10px;
+            }
+        """)
+        group_layout.addWidget(self.log_view)
+        
         # === 间隔设置 ===
         interval_layout = QHBoxLayout()
         interval_label = QLabel("点击间隔:")
@@ -126,6 +202,25 @@ class MouseClickerWidget(QWidget):
             }
         """)
         interval_layout.addWidget(self.interval_spin)
+        
+        # 间隔分布选择
+        self.profile_combo = QComboBox()
+        for name, cls in PROFILES.items():
+            self.profile_combo.addItem(cls.label, name)
+        self.profile_combo.setToolTip("点击间隔的随机分布，以上方间隔为基准")
+        self.profile_combo.setStyleSheet("""
+            QComboBox {
+                padding: 5px;
+                border: 2px solid #bdc3c7;
+                border-radius: 5px;
+                background-color: white;
+                font-size: 12px;
+            }
+            QComboBox:focus {
+                border: 2px solid #3498db;
+            }
+        """)
+        interval_layout.addWidget(self.profile_combo)
         interval_layout.addStretch()
         group_layout.addLayout(interval_layout)
         
@@ -222,6 +317,7 @@ class MouseClickerWidget(QWidget):
         main_layout.addStretch()
         
         self.setLayout(main_layout)
+        self.setStyleSheet(STATE_STYLES)
     
     def setup_shortcuts(self):
         """设置快捷键"""
@@ -238,9 +334,18 @@ class MouseClickerWidget(QWidget):
         self.enable_btn.clicked.connect(self.on_enable_clicked)
         self.disable_btn.clicked.connect(self.on_disable_clicked)
         self.interval_spin.valueChanged.connect(self.on_interval_changed)
+        self.profile_combo.currentIndexChanged.connect(self.on_profile_changed)
         self.clicker.status_changed.connect(self.on_status_changed)
-        self.clicker.click_count_changed.connect(self.on_click_count_changed)
+        self.clicker.progress_changed.connect(self.on_progress_changed)
         self.clicker.error_occurred.connect(self.on_error_occurred)
+        self.clicker.device_state_changed.connect(self.on_device_state_changed)
+        self.probe_finished.connect(self.on_probe_finished)
+        self.frame_timer.timeout.connect(self.on_frame)
+        self.frame_timer.start()
+        if self.prober is not None:
+            self.prober.start()
+        else:
+            self.probe_label.hide()
     
     @Slot()
     def on_enable_clicked(self):
@@ -249,9 +354,9 @@ class MouseClickerWidget(QWidget):
             self.enable_btn.setEnabled(False)
             self.disable_btn.setEnabled(True)
             self.status_label.setText("● 状态: 就绪 (按住左键连点)")
-            self.status_label.setStyleSheet("color: #f39c12; font-weight: bold;")
+            self._set_state(self.status_label, "ready")
             self.device_status_label.setText("🔌 幽灵键鼠: 已连接")
-            self.device_status_label.setStyleSheet("color: #27ae60; font-size: 10px;")
+            self._set_state(self.device_status_label, "connected")
             
             # 启动监听（这里需要实现鼠标按下/松开的监听）
             self._start_mouse_listener()
@@ -263,10 +368,12 @@ class MouseClickerWidget(QWidget):
         self.enable_btn.setEnabled(True)
         self.disable_btn.setEnabled(False)
         self.status_label.setText("● 状态: 已停止")
-        self.status_label.setStyleSheet("color: #95a5a6; font-weight: bold;")
+        self._set_state(self.status_label, "")
         self.device_status_label.setText("🔌 幽灵键鼠: 未连接")
-        self.device_status_label.setStyleSheet("color: #7f8c8d; font-size: 10px;")
+        self._set_state(self.device_status_label, "")
+        self._pending_progress = None
         self.click_counter.display(0)
+        self.rate_label.setText("速率: 0.0 CPS | 失败: 0")
         
         # 停止监听
         self._stop_mouse_listener()
@@ -276,26 +383,94 @@ class MouseClickerWidget(QWidget):
         """间隔改变"""
         self.clicker.set_interval(value)
     
+    @Slot(int)
+    def on_profile_changed(self, index):
+        """间隔分布改变"""
+        self.clicker.set_interval_profile(self.profile_combo.itemData(index))
+    
     @Slot(bool)
     def on_status_changed(self, is_clicking):
         """连点状态改变"""
         if is_clicking:
             self.status_label.setText("● 状态: 连点中...")
-            self.status_label.setStyleSheet("color: #27ae60; font-weight: bold;")
+            self._set_state(self.status_label, "clicking")
         else:
             if self.disable_btn.isEnabled():
                 self.status_label.setText("● 状态: 就绪 (按住左键连点)")
-                self.status_label.setStyleSheet("color: #f39c12; font-weight: bold;")
+                self._set_state(self.status_label, "ready")
     
-    @Slot(int)
-    def on_click_count_changed(self, count):
-        """点击次数改变"""
-        self.click_counter.display(count)
+    @Slot(object)
+    def on_progress_changed(self, snapshot):
+        """进度快照（已由连点器限频合并）：只记录最新一份，由帧定时器刷新"""
+        self._pending_progress = snapshot
+    
+    @Slot()
+    def on_frame(self):
+        """帧定时器：把最新进度、性能曲线和新日志刷新到界面，没有新数据时不做任何绘制"""
+        snapshot, self._pending_progress = self._pending_progress, None
+        updated = self.dashboard_panel.refresh()
+        if snapshot is not None:
+            if snapshot.click_count != self.click_counter.intValue():
+                self.click_counter.display(snapshot.click_count)
+            text = f"速率: {snapshot.cps:.1f} CPS | 失败: {snapshot.error_count}"
+            if text != self.rate_label.text():
+                self.rate_label.setText(text)
+            updated = True
+        events = get_recent_events(self._log_seq)
+        if events:
+            self._log_seq = events[-1]['seq']
+            for event in events:
+                self.log_view.appendPlainText(
+                    time.strftime("%H:%M:%S ", time.localtime(event['time'])) + event['message'])
+            updated = True
+        if updated:
+            self.frames += 1
+    
+    def _set_state(self, label, state):
+        """切换标签的 state 动态属性，只重新应用该标签的样式（不重新解析样式表）"""
+        if label.property("state") == state:
+            return
+        label.setProperty("state", state)
+        style = label.style()
+        style.unpolish(label)
+        style.polish(label)
     
     @Slot(str)
     def on_error_occurred(self, error_msg):
-        """错误处理"""
-        QMessageBox.warning(self, "subLD - 错误", error_msg)
+        """错误处理：复用同一个非模态提示框，已显示时只更新内容"""
+        box = self._error_box
+        if box is None:
+            box = self._error_box = QMessageBox(QMessageBox.Warning, "subLD - 错误", "", parent=self)
+            box.setModal(False)
+        box.setText(error_msg)
+        if not box.isVisible():
+            box.show()
+    
+    @Slot(object)
+    def on_probe_finished(self, stats):
+        """设备探测结束：显示各候选的结果和耗时"""
+        parts = [f"{'✓' if r['ok'] else '✗'} {r['backend']} {r['elapsed_ms']:.0f}ms" for r in stats['results']]
+        if stats['winner']:
+            self.probe_label.setText(f"🔍 已选用 {stats['winner']}（{stats['elapsed_ms']:.0f} ms）| " + " | ".join(parts))
+            self._set_state(self.probe_label, "ok")
+            if not self.disable_btn.isEnabled():
+                self.device_status_label.setText("🔌 幽灵键鼠: 已就绪（预热）")
+        else:
+            self.probe_label.setText("🔍 未探测到幽灵键鼠 | " + " | ".join(parts))
+            self._set_state(self.probe_label, "failed")
+    
+    @Slot(str)
+    def on_device_state_changed(self, state):
+        """设备连接状态改变（自动重连）"""
+        if state == "reconnecting":
+            self.device_status_label.setText("🔌 幽灵键鼠: 重连中...")
+            self._set_state(self.device_status_label, "reconnecting")
+        elif state == "lost":
+            self.device_status_label.setText("🔌 幽灵键鼠: 连接中断")
+            self._set_state(self.device_status_label, "lost")
+        elif self.disable_btn.isEnabled():
+            self.device_status_label.setText("🔌 幽灵键鼠: 已连接")
+            self._set_state(self.device_status_label, "connected")
     
     def _start_mouse_listener(self):
         """启动鼠标监听（使用Windows Hook或轮询方式）"""
@@ -303,17 +478,19 @@ class MouseClickerWidget(QWidget):
         # 为了简单起见，可以让用户通过UI按钮来控制
         from pynput import mouse
         
+        left = mouse.Button.left
+        on_listener_event = self.clicker.on_listener_event
+        
         def on_click(x, y, button, pressed):
-            if button == mouse.Button.left:
-                if pressed:
-                    self.clicker.start_clicking()
-                else:
-                    self.clicker.stop_clicking()
+            # 钩子回调只投递带时间戳的事件，立即返回，避免系统因钩子超时丢弃它；
+            # 连点器自己发出的点击在 on_listener_event 中被识别并忽略
+            if button == left:
+                on_listener_event(pressed, time.perf_counter_ns())
         
         self.listener = mouse.Listener(on_click=on_click)
         self.listener.start()
     
-        def _stop_mouse_listener(self):
+    def _stop_mouse_listener(self):
         """停止鼠标监听"""
         if hasattr(self, 'listener') and self.listener:
             self.listener.stop()
@@ -322,7 +499,10 @@ class MouseClickerWidget(QWidget):
     def closeEvent(self, event):
         """窗口关闭事件"""
         self._stop_mouse_listener()
+        self.frame_timer.stop()
         self.clicker.disable()
+        if self.prober is not None:
+            self.prober.close()
         event.accept()
 
 
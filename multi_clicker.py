@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+多通道连点调度模块 - subLD项目
+左键、右键、中键和键盘按键可以同时连点，每个通道有自己的间隔（或间隔分布）、优先级和触发方式。
+所有通道由同一个调度线程分配到一条按时间排序的设备命令流上：
+设备每个时间槽只发给一个通道，多个通道同时到期时先比较优先级，同优先级按权重公平轮转（虚拟时间），
+设备队列积压时暂停分配，总吞吐量贴近设备上限，而不是 N 个线程各自睡眠、争抢同一台设备。
+按住/切换触发的通道由 ChannelTriggerListener 监听键盘和鼠标（pynput）并转给调度器。
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from clicker_log import get_logger
+from synthetic_filter import key_button
+
+logger = get_logger("multi_clicker")
+
+_NS_PER_SEC = 1_000_000_000
+
+# 通道触发方式
+TRIGGER_ALWAYS = "always"  # 调度器运行期间一直连点
+TRIGGER_HOLD = "hold"      # 触发键按住期间连点
+TRIGGER_TOGGLE = "toggle"  # 每按一次触发键切换开/关
+TRIGGERS = (TRIGGER_ALWAYS, TRIGGER_HOLD, TRIGGER_TOGGLE)
+
+
+class ClickChannel:
+    """
+    单个连点通道（一个按钮或按键）
+    下一次点击的期望时间由通道自己的间隔（或间隔分布）决定，实际发出时间由调度器分配。
+    """
+
+    def __init__(self, button: str, interval: float, priority: int = 0, weight: float = 1.0,
+                 trigger: str = TRIGGER_ALWAYS, profile: Optional[str] = None, seed: Optional[int] = None,
+                 limit: int = 0, name: Optional[str] = None, trigger_input: Optional[str] = None,
+                 **profile_params):
+        """
+        :param button: "left"/"right"/"middle" 或按键名（如 "A"）
+        :param interval: 点击间隔(秒)
+        :param priority: 优先级，数值越大越优先
+        :param weight: 同优先级通道争用设备时的份额权重
+        :param trigger: 触发方式，见 TRIGGERS
+        :param trigger_input: hold/toggle 的触发输入：按键名（如 "F6"）或 "mouse:按钮"（如 "mouse:x1"）
+        :param profile: 间隔分布名称（见 interval_profiles.PROFILES），None 或 "fixed" 为固定间隔
+        :param seed: 间隔分布的随机数种子
+        :param limit: 点击次数上限，0 表示不限
+        :param name: 通道名称，默认为按钮名
+        :param profile_params: 间隔分布参数
+        """
+        if trigger not in TRIGGERS:
+            raise ValueError(f"未知的触发方式: {trigger}")
+        if interval <= 0:
+            raise ValueError("点击间隔必须大于0")
+        if trigger != TRIGGER_ALWAYS and not trigger_input:
+            raise ValueError(f"触发方式 {trigger} 需要指定触发键")
+        self.name = name or button
+        self.button = button
+        self.trigger_input = trigger_input
+        if self.is_triggered_by(self):
+            # 连点输出会被监听器当成触发输入，形成自激
+            raise ValueError(f"触发键不能与连点的按钮/按键相同: {trigger_input}")
+        self.interval = interval
+        self.period_ns = int(interval * _NS_PER_SEC)
+        self.priority = priority
+        self.weight = max(0.01, weight)
+        self.trigger = trigger
+        self.limit = limit
+        self.profile_name = profile or "fixed"
+        self.profile = None
+        if profile and profile != "fixed":
+            from interval_profiles import create_profile
+            self.profile = create_profile(profile, interval, seed=seed, **profile_params)
+        self.active = False
+        self.next_due_ns = 0
+        # 虚拟时间：每获得一次设备时间槽增加 1/weight，同优先级时虚拟时间小的先发
+        self.vtime = 0.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.count = 0
+        self.failures = 0
+        self.skipped = 0
+        self.contended = 0
+        self._late_sum_ns = 0
+        self._late_max_ns = 0
+
+    def is_triggered_by(self, other: "ClickChannel") -> bool:
+        """本通道的触发键是否会被 other 通道的连点输出触发（按钮名或 "mouse:按钮"，不区分大小写）"""
+        if not self.trigger_input:
+            return False
+        return self.trigger_input.casefold() in (other.button.casefold(), f"mouse:{other.button}".casefold())
+
+    def next_interval_ns(self) -> int:
+        """下一次点击与本次的间隔(ns)"""
+        return self.profile.next_ns() if self.profile is not None else self.period_ns
+
+    def get_stats(self) -> dict:
+        """
+        :return: {'name', 'button', 'active', 'trigger', 'trigger_input', 'profile', 'priority', 'weight',
+                  'interval', 'count', 'failures', 'skipped', 'contended', 'late_avg_ms', 'late_max_ms'}
+        """
+        return {
+            'name': self.name,
+            'button': self.button,
+            'active': self.active,
+            'trigger': self.trigger,
+            'trigger_input': self.trigger_input,
+            'profile': self.profile_name,
+            'priority': self.priority,
+            'weight': self.weight,
+            'interval': self.interval,
+            'count': self.count,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'contended': self.contended,
+            'late_avg_ms': self._late_sum_ns / self.count / 1e6 if self.count else 0.0,
+            'late_max_ms': self._late_max_ns / 1e6,
+        }
+
+
+def parse_channel_spec(spec: str) -> ClickChannel:
+    """
+    解析命令行通道描述 "按钮=间隔[:优先级[:权重]][,选项=值...]"
+    选项：trigger=always|hold|toggle、on=触发键（按键名或 mouse:按钮）、profile=间隔分布、seed=种子、
+    name=通道名，其余选项作为间隔分布参数（数值）
+    例如 "left=0.01"、"right=0.05:1"、"A=0.2:0:2"、"left=0.02,trigger=hold,on=F6"、
+    "right=0.05,trigger=toggle,on=mouse:x1,profile=gaussian,std=0.005"
+    """
+    usage = "按钮=间隔[:优先级[:权重]][,选项=值...]"
+    main, *options = spec.split(",")
+    kwargs = {}
+    profile_params = {}
+    try:
+        button, rest = main.split("=", 1)
+        parts = rest.split(":")
+        interval = float(parts[0])
+        priority = int(parts[1]) if len(parts) > 1 and parts[1] else 0
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        for option in options:
+            key, value = option.split("=", 1)
+            key = key.strip()
+            if key == "trigger":
+                kwargs['trigger'] = value
+            elif key == "on":
+                kwargs['trigger_input'] = value
+            elif key in ("profile", "name"):
+                kwargs[key] = value
+            elif key == "seed":
+                kwargs['seed'] = int(value)
+            else:
+                profile_params[key] = float(value)
+    except ValueError:
+        raise ValueError(f"通道格式错误: {spec}（应为 {usage}）") from None
+    if not button:
+        raise ValueError(f"通道格式错误: {spec}（缺少按钮名）")
+    return ClickChannel(button, interval, priority=priority, weight=weight, **kwargs, **profile_params)
+
+
+class ChannelTriggerListener:
+    """
+    通道触发监听器
+    用 pynput 监听键盘和鼠标，把各通道 trigger_input 对应的按下/松开转给 MultiChannelScheduler.on_trigger。
+    按住按键时系统的自动重复只算一次按下；连点器自己发出的鼠标按钮和按键事件由合成事件过滤器识别并忽略。
+    """
+
+    def __init__(self, scheduler: "MultiChannelScheduler", synthetic_filter=None):
+        """
+        :param scheduler: 多通道调度器
+        :param synthetic_filter: 合成事件过滤器（GhostMouse.synthetic_filter），None 表示不过滤
+        """
+        self.scheduler = scheduler
+        self.synthetic_filter = synthetic_filter
+        self.triggers = 0
+        self._held = set()
+        self._listeners = []
+
+    def start(self) -> "ChannelTriggerListener":
+        """启动监听（只启动有通道用到的键盘/鼠标监听器）"""
+        from pynput import keyboard, mouse
+        inputs = [channel.trigger_input.casefold() for channel in self.scheduler.channels.values()
+                  if channel.trigger_input]
+        if any(not name.startswith("mouse:") for name in inputs):
+            self._listeners.append(keyboard.Listener(on_press=self._on_press, on_release=self._on_release))
+        if any(name.startswith("mouse:") for name in inputs):
+            self._listeners.append(mouse.Listener(on_click=self._on_click))
+        for listener in self._listeners:
+            listener.start()
+        return self
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+        self._held.clear()
+
+    def handle(self, input_name: str, pressed: bool):
+        """
+        处理一次触发输入（监听线程中调用，也可直接调用）
+        :param input_name: 按键名或 "mouse:按钮"
+        :param pressed: True为按下，False为松开
+        """
+        name = input_name.casefold()
+        if pressed:
+            if name in self._held:
+                return  # 按住时的自动重复
+            self._held.add(name)
+        else:
+            self._held.discard(name)
+        for channel in list(self.scheduler.channels.values()):
+            if channel.trigger_input and channel.trigger_input.casefold() == name:
+                self.triggers += 1
+                self.scheduler.on_trigger(channel.name, pressed)
+
+    def _on_press(self, key):
+        self._on_key(key, True)
+
+    def _on_release(self, key):
+        self._on_key(key, False)
+
+    def _on_key(self, key, pressed: bool):
+        from macro import key_name
+        name = key_name(key)
+        event_filter = self.synthetic_filter
+        if event_filter is not None and event_filter.is_synthetic(key_button(name), pressed, time.perf_counter_ns()):
+            # 通道连点的按键（KeyDown/KeyUp）不能当成触发输入
+            return
+        self.handle(name, pressed)
+
+    def _on_click(self, x, y, button, pressed):
+        name = getattr(button, "name", "")
+        event_filter = self.synthetic_filter
+        if event_filter is not None and event_filter.is_synthetic(name, pressed, time.perf_counter_ns()):
+            return
+        self.handle(f"mouse:{name}", pressed)
+
+
+class MultiChannelScheduler:
+    """
+    多通道连点调度器
+    调度线程每次取最早的时间槽（不早于上一个槽加最小间隔），在该时刻之前到期的通道里选出一个，
+    提前 lookahead 把点击预约到设备线程（GhostMouse.click_at），由设备线程的定时堆按时间精确执行。
+    通道的增删、启停和触发可以在任意线程调用。
+    """
+
+    def __init__(self, ghost, max_cps: float = 0.0, lookahead: float = 0.002, max_backlog: int = 64):
+        """
+        :param ghost: 已连接的 GhostMouse 或 DevicePool（需支持 click_at 和 pending）
+        :param max_cps: 所有通道合计的点击速率上限，0 表示只受设备队列积压限制
+        :param lookahead: 提前预约到设备线程的时间(秒)
+        :param max_backlog: 设备队列中未执行命令超过该数量时暂停分配
+        """
+        self.ghost = ghost
+        self.min_gap_ns = int(_NS_PER_SEC / max_cps) if max_cps > 0 else 0
+        self.lookahead_ns = int(lookahead * _NS_PER_SEC)
+        self.max_backlog = max_backlog
+        self.channels: Dict[str, ClickChannel] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._next_slot_ns = 0
+        self._start_ns = 0
+        self._stop_ns = 0
+        self.granted = 0
+        self.contended = 0
+        self.backlog_waits = 0
+
+    # ==================== 通道管理 ====================
+
+    def add_channel(self, channel: ClickChannel) -> ClickChannel:
+        """添加通道；触发方式为 always 时在调度器运行期间立即开始"""
+        with self._lock:
+            if channel.name in self.channels:
+                raise ValueError(f"通道已存在: {channel.name}")
+            for other in self.channels.values():
+                # 一个通道的连点输出会被监听器当成另一个通道的触发输入，形成互相触发
+                if channel.is_triggered_by(other):
+                    raise ValueError(f"通道 {channel.name} 的触发键 {channel.trigger_input} 与通道 {other.name} 的连点输出相同")
+                if other.is_triggered_by(channel):
+                    raise ValueError(f"通道 {other.name} 的触发键 {other.trigger_input} 与通道 {channel.name} 的连点输出相同")
+            self.channels[channel.name] = channel
+            if channel.trigger == TRIGGER_ALWAYS and self._running:
+                self._activate(channel)
+        self._wake.set()
+        return channel
+
+    def remove_channel(self, name: str):
+        """移除通道（已预约的点击仍会执行完）"""
+        with self._lock:
+            self.channels.pop(name, None)
+        self._wake.set()
+
+    def set_active(self, name: str, active: bool):
+        """开始/停止某个通道"""
+        with self._lock:
+            channel = self.channels[name]
+            if active and not channel.active:
+                self._activate(channel)
+            elif not active:
+                channel.active = False
+        self._wake.set()
+
+    def on_trigger(self, name: str, pressed: bool):
+        """
+        通道的触发键按下/松开（可在输入钩子线程中调用）
+        :param name: 通道名称
+        :param pressed: True为按下，False为松开
+        """
+        channel = self.channels.get(name)
+        if channel is None:
+            return
+        if channel.trigger == TRIGGER_HOLD:
+            self.set_active(name, pressed)
+        elif channel.trigger == TRIGGER_TOGGLE and pressed:
+            self.set_active(name, not channel.active)
+
+    def _activate(self, channel: ClickChannel):
+        """启动通道（需持有锁）：立即到期，虚拟时间追上其他活动通道，不能靠停用期间积攒份额"""
+        vtimes = [ch.vtime for ch in self.channels.values() if ch.active and ch is not channel]
+        if vtimes:
+            channel.vtime = max(channel.vtime, min(vtimes))
+        if channel.profile is not None:
+            channel.profile.reset()
+        channel.next_due_ns = time.perf_counter_ns()
+        channel.active = True
+
+    # ==================== 生命周期 ====================
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> bool:
+        """
+        启动调度线程（设备需已连接）
+        :return: 启动成功返回True
+        """
+        if self._running:
+            return True
+        if not self.ghost.check_connection():
+            logger.warning("⚠️ 幽灵键鼠未连接，无法启动多通道连点")
+            return False
+        with self._lock:
+            self._running = True
+            self._start_ns = time.perf_counter_ns()
+            self._stop_ns = 0
+            self._next_slot_ns = 0
+            self.granted = self.contended = self.backlog_waits = 0
+            for channel in self.channels.values():
+                channel.reset_stats()
+                channel.vtime = 0.0
+                if channel.trigger == TRIGGER_ALWAYS:
+                    self._activate(channel)
+        self._thread = threading.Thread(target=self._run, name="subLD-multi-clicker", daemon=True)
+        self._thread.start()
+        logger.info("🖱️ 多通道连点已开始: %s", ", ".join(self.channels))
+        return True
+
+    def stop(self, timeout: float = 1.0):
+        """停止调度线程，已预约的点击（包括松开）由设备线程执行完"""
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self._stop_ns = time.perf_counter_ns()
+        with self._lock:
+            for channel in self.channels.values():
+                channel.active = False
+        logger.info("⏹️ 多通道连点已停止，共点击 %d 次", self.granted)
+
+    # ==================== 调度线程 ====================
+
+    def _pick(self, now_ns: int) -> Tuple[Optional[ClickChannel], int]:
+        """
+        选出下一个时间槽及其通道（需持有锁）
+        :return: (通道, 时间槽ns)；还没有需要预约的通道时返回 (None, 应等待到的时间ns，0 表示无限等待)
+        """
+        earliest = 0
+        for channel in self.channels.values():
+            if channel.active and (not earliest or channel.next_due_ns < earliest):
+                earliest = channel.next_due_ns
+        if not earliest:
+            return None, 0
+        slot = max(earliest, self._next_slot_ns, now_ns)
+        if slot - now_ns > self.lookahead_ns:
+            return None, slot - self.lookahead_ns
+
+        chosen = None
+        eligible = 0
+        for channel in self.channels.values():
+            if not channel.active or channel.next_due_ns > slot:
+                continue
+            eligible += 1
+            if (chosen is None or channel.priority > chosen.priority
+                    or (channel.priority == chosen.priority
+                        and (channel.vtime, channel.next_due_ns) < (chosen.vtime, chosen.next_due_ns))):
+                chosen = channel
+        if eligible > 1:
+            self.contended += 1
+            for channel in self.channels.values():
+                if channel.active and channel is not chosen and channel.next_due_ns <= slot:
+                    channel.contended += 1
+        return chosen, slot
+
+    def _run(self):
+        """调度线程主循环"""
+        ghost = self.ghost
+        wake = self._wake
+        while self._running:
+            wake.clear()
+            now = time.perf_counter_ns()
+            if ghost.pending() > self.max_backlog:
+                # 设备跟不上：等它消化积压，不再继续堆积命令
+                self.backlog_waits += 1
+                wake.wait(0.0005)
+                continue
+            with self._lock:
+                channel, slot = self._pick(now)
+            if channel is None:
+                wake.wait((slot - now) / _NS_PER_SEC if slot else None)
+                continue
+
+            ok = ghost.click_at(channel.button, slot)
+            with self._lock:
+                self._next_slot_ns = slot + self.min_gap_ns
+                channel.vtime += 1.0 / channel.weight
+                if ok:
+                    self.granted += 1
+                    channel.count += 1
+                    late = slot - channel.next_due_ns
+                    channel._late_sum_ns += late
+                    if late > channel._late_max_ns:
+                        channel._late_max_ns = late
+                else:
+                    channel.failures += 1
+                due = channel.next_due_ns + channel.next_interval_ns()
+                if due <= slot:
+                    # 落后超过一个间隔（被更高优先级的通道占用）：跳过错过的时间槽
+                    channel.skipped += (slot - due) // max(1, channel.period_ns) + 1
+                    due = slot + channel.next_interval_ns()
+                channel.next_due_ns = due
+                if channel.limit and channel.count >= channel.limit:
+                    channel.active = False
+            if not ok and not ghost.check_connection():
+                logger.error("❌ 幽灵键鼠连接中断，多通道连点已停止")
+                self._running = False
+                self._stop_ns = time.perf_counter_ns()
+
+    # ==================== 统计 ====================
+
+    def get_stats(self) -> dict:
+        """
+        :return: {'running', 'elapsed_s', 'granted', 'achieved_cps', 'contended', 'backlog_waits',
+                  'channels': [ClickChannel.get_stats()]}
+        """
+        end = self._stop_ns or time.perf_counter_ns()
+        elapsed = (end - self._start_ns) / _NS_PER_SEC if self._start_ns else 0.0
+        with self._lock:
+            channels: List[dict] = [channel.get_stats() for channel in self.channels.values()]
+        return {
+            'running': self._running,
+            'elapsed_s': elapsed,
+            'granted': self.granted,
+            'achieved_cps': self.granted / elapsed if elapsed > 0 else 0.0,
+            'contended': self.contended,
+            'backlog_waits': self.backlog_waits,
+            'channels': channels,
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    from ghost_backends import SimulatedBackend, constant_latency
+    from ghost_mouse import GhostMouse
+
+    print("=== 多通道连点调度测试 - subLD ===")
+    # 每次设备调用 0.4 ms，一次点击（按下+松开）0.8 ms：设备上限约 1250 CPS
+    demands = (("left", 0.001, 0), ("right", 0.002, 0), ("A", 0.01, 1))
+    print(f"需求合计 {sum(1 / interval for _, interval, _ in demands):.0f} CPS，设备上限约 1250 CPS")
+
+    def device_rate(ghost: GhostMouse, start_ns: int, end_ns: int) -> dict:
+        """按设备命令日志统计时间窗口内每个按钮实际执行的点击速率"""
+        counts: Dict[str, int] = {}
+        for at, op, args, _ in ghost.engine.device.log:
+            if op.endswith("Down") and start_ns <= at < end_ns:
+                key = args[0] if args else op[:-4].lower()
+                counts[key] = counts.get(key, 0) + 1
+        return {key: value * _NS_PER_SEC / (end_ns - start_ns) for key, value in counts.items()}
+
+    # 对照：每个通道一个线程，各自点击后睡眠
+    ghost = GhostMouse(backend=SimulatedBackend(latency=constant_latency(0.0004)))
+    ghost.connect()
+    start_ns = time.perf_counter_ns()
+    stop_at = time.monotonic() + 3.0
+
+    def naive(button: str, interval: float):
+        while time.monotonic() < stop_at:
+            ghost.click_at(button)
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=naive, args=(button, interval)) for button, interval, _ in demands]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    end_ns = time.perf_counter_ns()
+    backlog = ghost.engine.pending()
+    ghost.wait_idle(timeout=30)
+    drain_ms = (time.perf_counter_ns() - end_ns) / 1e6
+    naive_rates = device_rate(ghost, start_ns, end_ns)
+    ghost.disconnect()
+    print(f"独立线程: {', '.join(f'{k} {v:.0f}' for k, v in naive_rates.items())} CPS，"
+          f"合计 {sum(naive_rates.values()):.0f} CPS，停止时积压 {backlog} 条命令（{drain_ms:.0f} ms 才执行完）")
+
+    # 多通道调度
+    ghost = GhostMouse(backend=SimulatedBackend(latency=constant_latency(0.0004)))
+    ghost.connect()
+    scheduler = MultiChannelScheduler(ghost)
+    for button, interval, priority in demands:
+        scheduler.add_channel(ClickChannel(button, interval, priority=priority))
+    scheduler.start()
+    time.sleep(3.0)
+    scheduler.stop()
+    ghost.wait_idle(timeout=2)
+    stats = scheduler.get_stats()
+    rates = device_rate(ghost, scheduler._start_ns, scheduler._stop_ns)
+    for channel in stats['channels']:
+        print(f"  {channel['name']:<6} 优先级 {channel['priority']} 目标 {1 / channel['interval']:6.0f} CPS，"
+              f"实际 {channel['count'] / stats['elapsed_s']:6.0f} CPS，跳过 {channel['skipped']}，"
+              f"平均延后 {channel['late_avg_ms']:.2f} ms")
+    print(f"多通道调度: 合计 {stats['achieved_cps']:.0f} CPS（设备执行 {sum(rates.values()):.0f} CPS），"
+          f"争用 {stats['contended']} 次，积压等待 {stats['backlog_waits']} 次")
+
+    # 设备日志按时间排序，且同一按钮的按下/松开严格交替
+    log = list(ghost.engine.device.log)
+    assert all(a[0] <= b[0] for a, b in zip(log, log[1:]))
+    held = set()
+    for _, op, args, _ in log:
+        key = args[0] if args else op[:-4] if op.endswith("Down") else op[:-2]
+        if op.endswith("Down"):
+            assert key not in held, f"{key} 重复按下"
+            held.add(key)
+        elif op.endswith("Up"):
+            assert key in held, f"{key} 未按下就松开"
+            held.discard(key)
+    assert not held
+    ghost.disconnect()
+    print("测试通过！")
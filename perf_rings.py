@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+性能环形缓冲模块 - subLD项目
+仪表盘显示的 CPS、点击间隔抖动和设备调用延迟保存在定长环形缓冲中：
+缓冲区创建时一次性分配，写入只做一次数组下标赋值，读取方（界面线程）按帧复制最近的数据。
+"""
+import math
+from array import array
+from typing import List, Optional, Tuple
+
+
+class RingBuffer:
+    """
+    定长环形缓冲区（单写多读）
+    只有一个线程调用 push()；读取方不加锁，最坏情况下读到正在被覆盖的最旧一项，对显示无影响。
+    """
+
+    def __init__(self, capacity: int = 120):
+        """
+        :param capacity: 保留的数据点数
+        """
+        self.capacity = max(2, capacity)
+        self.values = array('d', bytes(8 * self.capacity))
+        # 累计写入次数，同时用作版本号
+        self.count = 0
+
+    def push(self, value: float):
+        """写入一个数据点，缓冲区满时覆盖最旧的一项"""
+        self.values[self.count % self.capacity] = value
+        self.count += 1
+
+    def latest(self) -> float:
+        """最新的数据点，没有数据时为0"""
+        count = self.count
+        return self.values[(count - 1) % self.capacity] if count else 0.0
+
+    def snapshot(self, out: Optional[List[float]] = None) -> List[float]:
+        """
+        按从旧到新的顺序复制缓冲区内容
+        :param out: 复用的列表（避免每帧分配）
+        :return: 数据列表
+        """
+        count = self.count
+        size = min(count, self.capacity)
+        start = (count - size) % self.capacity
+        values = self.values
+        if out is None:
+            out = []
+        out.clear()
+        if start + size <= self.capacity:
+            out.extend(values[start:start + size])
+        else:
+            out.extend(values[start:])
+            out.extend(values[:size - (self.capacity - start)])
+        return out
+
+    def clear(self):
+        self.count = 0
+
+
+class DashboardMetrics:
+    """
+    连点引擎的仪表盘数据
+    点击线程每次点击调用 on_click() 累加点击间隔；进度发布线程按发布频率调用 sample()，
+    计算本周期的间隔标准差和设备调用平均耗时，连同 CPS 写入三条环形缓冲。
+    """
+
+    def __init__(self, capacity: int = 120):
+        """
+        :param capacity: 每条曲线保留的采样点数
+        """
+        self.cps = RingBuffer(capacity)
+        self.jitter_ms = RingBuffer(capacity)
+        self.latency_ms = RingBuffer(capacity)
+        # 采样次数，界面据此判断是否需要重绘
+        self.version = 0
+        # 点击间隔累加值（只由点击线程写入，整数运算无精度损失）
+        self._last_click_ns = 0
+        self._gap_n = 0
+        self._gap_sum = 0
+        self._gap_sumsq = 0
+        # 上次采样时的读数
+        self._seen_gaps: Tuple[int, int, int] = (0, 0, 0)
+        self._seen_calls: Tuple[int, int] = (0, 0)
+
+    def start_session(self):
+        """新的连点会话开始：第一次点击不计算间隔"""
+        self._last_click_ns = 0
+
+    def on_click(self, now_ns: int):
+        """记录一次点击的时间（点击线程）"""
+        last = self._last_click_ns
+        self._last_click_ns = now_ns
+        if last:
+            gap = now_ns - last
+            self._gap_n += 1
+            self._gap_sum += gap
+            self._gap_sumsq += gap * gap
+
+    def sample(self, cps: float, call_totals: Tuple[int, int, int]):
+        """
+        生成一个采样点（进度发布线程）
+        :param cps: 本周期的点击速率
+        :param call_totals: 设备点击调用的累计 (次数, 总耗时ns, 错误数)
+        """
+        n, total, total_sq = self._gap_n, self._gap_sum, self._gap_sumsq
+        seen_n, seen_sum, seen_sq = self._seen_gaps
+        self._seen_gaps = (n, total, total_sq)
+        dn = n - seen_n
+        jitter = 0.0
+        if dn > 1:
+            mean = (total - seen_sum) / dn
+            jitter = math.sqrt(max(0.0, (total_sq - seen_sq) / dn - mean * mean)) / 1e6
+
+        calls, call_ns = call_totals[0], call_totals[1]
+        seen_calls, seen_call_ns = self._seen_calls
+        self._seen_calls = (calls, call_ns)
+        latency = (call_ns - seen_call_ns) / (calls - seen_calls) / 1e6 if calls > seen_calls else 0.0
+
+        self.cps.push(cps)
+        self.jitter_ms.push(jitter)
+        self.latency_ms.push(latency)
+        self.version += 1
+
+    def clear(self):
+        """清空曲线"""
+        self.cps.clear()
+        self.jitter_ms.clear()
+        self.latency_ms.clear()
+        self.version += 1
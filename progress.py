@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+进度发布模块 - subLD项目
+以固定频率合并发布点击进度，发布开销与点击速率无关
+"""
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+
+class ProgressSnapshot(NamedTuple):
+    """进度快照"""
+    click_count: int    # 累计点击次数
+    cps: float          # 最近一个发布周期内的点击速率
+    error_count: int    # 累计失败次数
+    timestamp: float    # 快照时间（time.perf_counter）
+
+
+class ProgressPublisher:
+    """
+    合并进度发布器
+    点击线程只更新计数，发布线程按固定频率读取计数并生成快照，
+    只有计数变化时才回调，因此每秒最多回调 rate_hz 次。
+    """
+
+    def __init__(self, read_counters: Callable[[], Tuple[int, int]],
+                 callback: Callable[[ProgressSnapshot], None], rate_hz: float = 30.0):
+        """
+        :param read_counters: 返回 (点击次数, 失败次数) 的函数，需无锁且开销很小
+        :param callback: 快照回调，在发布线程中调用
+        :param rate_hz: 最大发布频率(Hz)
+        """
+        self.read_counters = read_counters
+        self.callback = callback
+        self.period = 1.0 / max(1.0, rate_hz)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_count = 0
+        self._last_errors = 0
+        self._last_time = time.perf_counter()
+        # 上一个发布周期的起点，强制发布时用它计算速率
+        self._window_count = 0
+        self._window_time = self._last_time
+        self._cps = 0.0
+        self.last_snapshot: Optional[ProgressSnapshot] = None
+
+    def start(self):
+        """启动发布线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self.reset()
+        self._thread = threading.Thread(target=self._run, name="subLD-progress", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止发布线程，并发布最后一次快照"""
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+        self.publish_now()
+
+    def publish_now(self):
+        """立即发布一次快照（计数变化时）"""
+        self._tick(force=True)
+
+    def reset(self):
+        """以当前计数为速率计算的基准（计数被清零后调用）"""
+        with self._lock:
+            self._last_count, self._last_errors = self.read_counters()
+            self._last_time = time.perf_counter()
+            self._window_count = self._last_count
+            self._window_time = self._last_time
+            self._cps = 0.0
+
+    def _run(self):
+        """发布线程主循环"""
+        while not self._stop_event.wait(self.period):
+            self._tick()
+
+    def _tick(self, force: bool = False):
+        """
+        读取计数，计算速率，计数有变化（或速率刚降为0）时回调
+        :param force: 为True时即使计数未变化也发布；不更新速率基准，
+                      速率按上一个周期起点到现在的实际时长重新计算（含本周期未满的部分）
+        """
+        with self._lock:
+            count, errors = self.read_counters()
+            now = time.perf_counter()
+            changed = count != self._last_count or errors != self._last_errors
+            if force:
+                elapsed = now - self._window_time
+                if elapsed > 0:
+                    self._cps = (count - self._window_count) / elapsed
+            else:
+                elapsed = now - self._last_time
+                self._cps = (count - self._last_count) / elapsed if elapsed > 0 else 0.0
+                self._window_count = self._last_count
+                self._window_time = self._last_time
+                self._last_count = count
+                self._last_errors = errors
+                self._last_time = now
+            last = self.last_snapshot
+            if not changed and not force and (last is None or last.cps == 0.0):
+                return
+            snapshot = ProgressSnapshot(count, self._cps, errors, now)
+            self.last_snapshot = snapshot
+        self.callback(snapshot)
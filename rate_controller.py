@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+自适应速率控制模块 - subLD项目
+间隔设得比设备实际能力还短时，点击命令会在设备线程排队或失败。
+AdaptiveRateController 按固定时间窗口在线测量每次点击的设备耗时、队列积压和失败次数，
+用 AIMD（加性增、乘性减）调整实际点击间隔：无拥塞时逐步提速，直到用户设定的目标速率为止；
+出现失败、积压增长或设备占用率过高时立即按比例降速。
+控制器记录找到的速率上限（ceiling_cps），可用于按机器规划工作量。
+"""
+import time
+from typing import Callable, Optional
+
+# 设备处理一次左键点击所用的调用
+CLICK_OPS = ("LeftDown", "LeftUp")
+
+_NS_PER_SEC = 1_000_000_000
+
+
+class AdaptiveRateController:
+    """
+    AIMD 点击速率控制器
+    on_click()/on_failure() 由连点线程在每次点击后调用，窗口到期时才读取设备统计，
+    平时只有一次计数和一次时间比较。调整后的间隔通过 apply 回调写回调度器。
+    """
+
+    def __init__(self, ghost, target_interval: float, apply: Optional[Callable[[float], None]] = None,
+                 window: float = 0.25, increase_cps: Optional[float] = None, decrease: float = 0.7,
+                 max_utilization: float = 0.8, max_backlog_growth: int = 8,
+                 max_consecutive_failures: int = 5, settle_windows: int = 4, min_cps: float = 1.0):
+        """
+        :param ghost: GhostMouse 或 DevicePool，需提供 get_call_totals() 和 get_device_stats()
+        :param target_interval: 目标间隔(秒)，即速率上限
+        :param apply: 实际间隔变化时调用的回调 (间隔秒)
+        :param window: 控制窗口长度(秒)
+        :param increase_cps: 每个无拥塞窗口提高的速率(CPS)，默认为目标速率的2%（至少1）
+        :param decrease: 拥塞时速率乘以的系数
+        :param max_utilization: 设备占用率（点击耗时 × 速率 / 设备数）上限
+        :param max_backlog_growth: 一个窗口内设备队列允许增长的命令数
+        :param max_consecutive_failures: 连续失败超过该次数时放弃（设备可能已断开）
+        :param settle_windows: 速率连续保持多少个无拥塞窗口才计入 ceiling_cps
+        :param min_cps: 速率下限
+        """
+        self.ghost = ghost
+        self.apply = apply
+        self.window_ns = max(1, int(window * _NS_PER_SEC))
+        self.increase_cps = increase_cps
+        self.decrease = decrease
+        self.max_utilization = max_utilization
+        self.max_backlog_growth = max_backlog_growth
+        self.max_consecutive_failures = max_consecutive_failures
+        self.settle_windows = max(1, settle_windows)
+        self.min_cps = min_cps
+        self.target_cps = 1.0 / target_interval
+        self.rate_cps = self.target_cps
+        self.interval = target_interval
+        self.reset()
+
+    def reset(self):
+        """清空已找到的速率上限和统计"""
+        # 连续保持 settle_windows 个无拥塞窗口的最高速率
+        self.ceiling_cps = 0.0
+        # 发生拥塞时速率的指数平均（拥塞拐点）
+        self.knee_cps = 0.0
+        self.windows = 0
+        self.backoffs = 0
+        self.failures = 0
+        self.last_service_ms = 0.0
+        self.last_utilization = 0.0
+        self.last_backlog = 0
+        self.last_reason = ""
+        self._clean_windows = 0
+        self._consecutive_failures = 0
+        self._window_end_ns = 0
+        self._backoff_ns = 0
+        self._base_calls = 0
+        self._base_call_ns = 0
+        self._base_errors = 0
+
+    def _step(self) -> float:
+        if self.increase_cps is not None:
+            return self.increase_cps
+        return max(1.0, self.target_cps * 0.02)
+
+    def _set_rate(self, rate_cps: float):
+        rate_cps = min(self.target_cps, max(self.min_cps, rate_cps))
+        if rate_cps == self.rate_cps:
+            return
+        self.rate_cps = rate_cps
+        self.interval = 1.0 / rate_cps
+        if self.apply is not None:
+            self.apply(self.interval)
+
+    def _begin_window(self, now_ns: int):
+        calls, call_ns, errors = self.ghost.get_call_totals(CLICK_OPS)
+        self._base_calls = calls
+        self._base_call_ns = call_ns
+        self._base_errors = errors
+        self.last_backlog = self._backlog()
+        self._window_end_ns = now_ns + self.window_ns
+
+    def _backlog(self) -> int:
+        return sum(device['pending'] for device in self.ghost.get_device_stats())
+
+    def start(self):
+        """
+        开始一次连点会话：已找到上限时从上限起步，否则从目标速率起步
+        """
+        start_cps = self.target_cps
+        if self.ceiling_cps:
+            start_cps = min(start_cps, self.ceiling_cps)
+        self.rate_cps = 0.0
+        self._set_rate(start_cps)
+        self._clean_windows = 0
+        self._consecutive_failures = 0
+        self._begin_window(time.perf_counter_ns())
+
+    def set_target(self, interval: float):
+        """修改目标间隔（速率上限），当前速率超过新上限时立即降到上限"""
+        self.target_cps = 1.0 / interval
+        if self.rate_cps > self.target_cps or not self.windows:
+            self.rate_cps = 0.0
+            self._set_rate(self.target_cps)
+
+    def on_click(self):
+        """一次点击已成功预约"""
+        self._consecutive_failures = 0
+        now_ns = time.perf_counter_ns()
+        if now_ns >= self._window_end_ns:
+            self._update(now_ns)
+
+    def on_failure(self) -> bool:
+        """
+        一次点击失败（设备报错或命令执行失败），立即降速
+        :return: 可以继续连点返回True；连续失败次数过多返回False
+        """
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self._consecutive_failures > self.max_consecutive_failures:
+            return False
+        now_ns = time.perf_counter_ns()
+        # 同一个失败可能已在窗口统计中触发过降速，一个窗口内只降一次
+        if now_ns - self._backoff_ns >= self.window_ns:
+            self._backoff("failure")
+            self._begin_window(now_ns)
+        return True
+
+    def _backoff(self, reason: str):
+        rate = self.rate_cps
+        self.knee_cps = rate if not self.knee_cps else 0.7 * self.knee_cps + 0.3 * rate
+        self.backoffs += 1
+        self.last_reason = reason
+        self._backoff_ns = time.perf_counter_ns()
+        self._clean_windows = 0
+        self._set_rate(rate * self.decrease)
+
+    def _update(self, now_ns: int):
+        """窗口到期：根据本窗口的设备统计决定提速或降速"""
+        self.windows += 1
+        calls, call_ns, errors = self.ghost.get_call_totals(CLICK_OPS)
+        backlog = self._backlog()
+        devices = max(1, len(self.ghost.get_device_stats()))
+        new_calls = calls - self._base_calls
+        new_errors = errors - self._base_errors
+        backlog_growth = backlog - self.last_backlog
+        if new_calls > 0:
+            # 每次点击包含按下和松开两次调用
+            service_ns = (call_ns - self._base_call_ns) * len(CLICK_OPS) / new_calls
+            self.last_service_ms = service_ns / 1e6
+            self.last_utilization = service_ns * self.rate_cps / devices / _NS_PER_SEC
+
+        if new_errors > 0:
+            self._backoff("errors")
+        elif backlog_growth > self.max_backlog_growth:
+            self._backoff("backlog")
+        elif new_calls > 0 and self.last_utilization > self.max_utilization:
+            self._backoff("latency")
+        else:
+            self._clean_windows += 1
+            if self._clean_windows >= self.settle_windows and self.rate_cps > self.ceiling_cps:
+                self.ceiling_cps = self.rate_cps
+            self._set_rate(self.rate_cps + self._step())
+
+        self._begin_window(now_ns)
+
+    def get_stats(self) -> dict:
+        """
+        控制器状态
+        :return: 目标速率、当前速率、找到的上限 ceiling_cps、拥塞拐点 knee_cps、
+                 按当前点击耗时估算的设备容量 capacity_cps 等
+        """
+        devices = max(1, len(self.ghost.get_device_stats()))
+        capacity = 0.0
+        if self.last_service_ms > 0:
+            capacity = devices * self.max_utilization * 1000.0 / self.last_service_ms
+        return {
+            'target_cps': self.target_cps,
+            'rate_cps': self.rate_cps,
+            'interval': self.interval,
+            'ceiling_cps': self.ceiling_cps,
+            'knee_cps': self.knee_cps,
+            'capacity_cps': capacity,
+            'service_ms': self.last_service_ms,
+            'utilization': self.last_utilization,
+            'backlog': self.last_backlog,
+            'windows': self.windows,
+            'backoffs': self.backoffs,
+            'failures': self.failures,
+            'last_reason': self.last_reason,
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    from click_engine import ClickEngine
+    from ghost_backends import SimulatedBackend, constant_latency
+    from ghost_mouse import GhostMouse
+
+    print("=== 自适应速率控制测试 - subLD ===")
+    # 每次设备调用4ms，一次点击8ms：占用率80%时约100 CPS
+    backend = SimulatedBackend(latency=constant_latency(0.004))
+    engine = ClickEngine(interval=0.01, ghost=GhostMouse(backend=backend))
+    engine.set_adaptive_rate(True)
+    engine.enable()
+    try:
+        engine.start_clicking()
+        for _ in range(8):
+            time.sleep(1.0)
+            stats = engine.rate_controller.get_stats()
+            print(f"速率 {stats['rate_cps']:6.1f} CPS | 上限 {stats['ceiling_cps']:6.1f} | "
+                  f"拐点 {stats['knee_cps']:6.1f} | 点击耗时 {stats['service_ms']:.2f} ms | "
+                  f"占用率 {stats['utilization']:.2f} | 降速 {stats['backoffs']} ({stats['last_reason']})")
+        engine.stop_clicking()
+        time.sleep(0.2)
+        status = engine.get_status()
+        print(f"共点击 {status['click_count']} 次，失败 {status['error_count']} 次，"
+              f"实际 {status['timing']['achieved_cps']:.1f} CPS")
+
+        # 注入随机失败：控制器降速并继续，而不是停止连点
+        backend.device.failure_rate = 0.002
+        engine.start_clicking()
+        time.sleep(3.0)
+        engine.stop_clicking()
+        time.sleep(0.2)
+        stats = engine.rate_controller.get_stats()
+        print(f"随机失败下: 仍在连点 {engine.get_status()['click_count']} 次，失败 {stats['failures']} 次，"
+              f"上限 {stats['ceiling_cps']:.1f} CPS")
+    finally:
+        engine.disable()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+设备重连模块 - subLD项目
+ReconnectSupervisor 在点击失败时先探测设备是否仍可用，不可用时按有上限的指数退避反复重连，
+连点会话在重连期间暂停，恢复后继续（计数和调度不重置）。
+NotificationThrottle 把短时间内的重复错误合并为一条通知，避免界面连续弹窗。
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+# 设备连接状态
+DEVICE_CONNECTED = "connected"        # 已连接
+DEVICE_RECONNECTING = "reconnecting"  # 连接中断，正在重连
+DEVICE_LOST = "lost"                  # 重连失败，已放弃
+
+
+class NotificationThrottle:
+    """
+    通知限流
+    两次通知至少间隔 min_interval 秒，期间的通知只计数；
+    下一次允许通知时（或调用 flush() 时）附上被合并的条数。
+    """
+
+    def __init__(self, notify: Callable[[str], None], min_interval: float = 5.0):
+        """
+        :param notify: 实际发出通知的函数
+        :param min_interval: 两次通知的最小间隔(秒)
+        """
+        self.notify = notify
+        self.min_interval = min_interval
+        self.sent = 0
+        self.suppressed = 0
+        self._pending = 0
+        self._last_message = ""
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, message: str) -> bool:
+        """
+        提交一条通知
+        :return: 立即发出返回True，被合并返回False
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_time and now - self._last_time < self.min_interval:
+                self._pending += 1
+                self.suppressed += 1
+                self._last_message = message
+                return False
+            pending, self._pending = self._pending, 0
+            self._last_time = now
+            self.sent += 1
+        if pending:
+            message = f"{message}\n（此前另有 {pending} 条错误已合并）"
+        self.notify(message)
+        return True
+
+    def flush(self):
+        """发出被合并的通知摘要（如果有）"""
+        with self._lock:
+            pending, self._pending = self._pending, 0
+            if not pending:
+                return
+            message = self._last_message
+            self._last_time = time.monotonic()
+            self.sent += 1
+        self.notify(message if pending == 1 else f"{message}\n（共 {pending} 条，已合并）")
+
+    def get_stats(self) -> dict:
+        return {'sent': self.sent, 'suppressed': self.suppressed, 'pending': self._pending}
+
+
+class ReconnectSupervisor:
+    """
+    设备重连监督器
+    recover() 在调用线程（连点线程）中执行：断开旧连接后按 base_delay、2×base_delay…
+    （不超过 max_delay，带随机抖动）的间隔重试 connect()，直到成功、被中止或超过最大次数。
+    """
+
+    def __init__(self, ghost, base_delay: float = 0.1, max_delay: float = 5.0, max_attempts: int = 0,
+                 jitter: float = 0.2, on_state: Optional[Callable[[str], None]] = None):
+        """
+        :param ghost: GhostMouse 或 DevicePool
+        :param base_delay: 第一次重试前的等待(秒)
+        :param max_delay: 重试等待的上限(秒)
+        :param max_attempts: 最多重试次数，0 表示不限（直到连点停止）
+        :param jitter: 等待时间的随机浮动比例，避免多台设备同时重试
+        :param on_state: 连接状态变化回调 (DEVICE_CONNECTED / DEVICE_RECONNECTING / DEVICE_LOST)
+        """
+        self.ghost = ghost
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+        self.on_state = on_state
+        self.state = DEVICE_CONNECTED
+        self.recoveries = 0
+        self.attempts = 0
+        self.transient_failures = 0
+        self.last_downtime_ms = 0.0
+        self.total_downtime_ms = 0.0
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            if self.on_state is not None:
+                self.on_state(state)
+
+    def set_connected(self):
+        """设备已由其他途径连接（如重新启用连点器）"""
+        self._set_state(DEVICE_CONNECTED)
+
+    def probe(self) -> bool:
+        """
+        同步调用一次无副作用的设备命令（松开左键），判断设备是否仍可用
+        :return: 设备可用返回True
+        """
+        try:
+            return bool(self.ghost.check_connection() and self.ghost.left_up())
+        except Exception:
+            return False
+
+    def recover(self, should_abort: Callable[[], bool], wake: Optional[threading.Event] = None,
+                on_reconnecting: Optional[Callable[[], None]] = None) -> bool:
+        """
+        处理一次点击失败：设备仍可用时直接返回，否则重连
+        :param should_abort: 返回True时停止重连（如连点已松开或连点器已禁用）
+        :param wake: 等待重试期间用于提前唤醒的事件（如触发事件）
+        :param on_reconnecting: 确认设备不可用、开始重连前调用（如发出通知）
+        :return: 设备可用（或已重连成功）返回True；被中止或放弃返回False
+        """
+        if self.probe():
+            self.transient_failures += 1
+            return True
+        if on_reconnecting is not None:
+            on_reconnecting()
+        return self.reconnect(should_abort, wake)
+
+    def reconnect(self, should_abort: Callable[[], bool], wake: Optional[threading.Event] = None) -> bool:
+        """
+        断开并按指数退避重连，直到成功、被中止或超过最大次数
+        :return: 重连成功返回True
+        """
+        start = time.perf_counter()
+        self._set_state(DEVICE_RECONNECTING)
+        delay = self.base_delay
+        attempt = 0
+        try:
+            while not should_abort():
+                attempt += 1
+                self.attempts += 1
+                # 由监督器自己按退避重试：不让探测器重新预热、也不在 connect() 中等待预热连接，
+                # 每次尝试只打开一次设备，且等待期间可以被 should_abort 及时打断
+                self.ghost.disconnect(rewarm=False)
+                if self.ghost.connect(use_prober=False):
+                    self.recoveries += 1
+                    self._set_state(DEVICE_CONNECTED)
+                    return True
+                if self.max_attempts and attempt >= self.max_attempts:
+                    self._set_state(DEVICE_LOST)
+                    return False
+                wait = delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+                if wake is not None:
+                    wake.wait(wait)
+                else:
+                    time.sleep(wait)
+                delay = min(self.max_delay, delay * 2)
+            self._set_state(DEVICE_LOST)
+            return False
+        finally:
+            self.last_downtime_ms = (time.perf_counter() - start) * 1000
+            self.total_downtime_ms += self.last_downtime_ms
+
+    def get_stats(self) -> dict:
+        return {
+            'state': self.state,
+            'recoveries': self.recoveries,
+            'attempts': self.attempts,
+            'transient_failures': self.transient_failures,
+            'last_downtime_ms': self.last_downtime_ms,
+            'total_downtime_ms': self.total_downtime_ms,
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    from click_engine import ClickEngine, EVENT_DEVICE_STATE_CHANGED, EVENT_ERROR_OCCURRED
+    from ghost_backends import SimulatedBackend
+    from ghost_mouse import GhostMouse
+
+    print("=== 设备自动重连测试 - subLD ===")
+    backend = SimulatedBackend()
+    engine = ClickEngine(interval=0.01, ghost=GhostMouse(backend=backend))
+    engine.subscribe(EVENT_DEVICE_STATE_CHANGED, lambda state: print(f"设备状态: {state}"))
+    engine.subscribe(EVENT_ERROR_OCCURRED, lambda message: print(f"通知: {message}"))
+    engine.enable()
+    try:
+        engine.start_clicking()
+        time.sleep(0.5)
+        print("拔出设备 1 秒...")
+        backend.unplug()
+        time.sleep(1.0)
+        backend.replug()
+        time.sleep(1.0)
+        print(f"仍在连点: {engine.is_clicking}，已点击 {engine.click_count} 次")
+
+        print("注入 20 次偶发失败...")
+        for _ in range(20):
+            backend.device.fail_next(1)
+            time.sleep(0.05)
+        engine.stop_clicking()
+        time.sleep(0.3)
+        status = engine.get_status()
+        print(f"重连: {status['reconnect']}")
+        print(f"通知: {status['notifications']}")
+    finally:
+        engine.disable()
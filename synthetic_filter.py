@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+合成事件过滤模块 - subLD项目
+幽灵键鼠产生的是真实USB输入，鼠标/键盘监听器会把连点器自己发出的按下/松开也当成用户操作。
+本模块记录连点器发出的每个按下/松开（鼠标按钮和按键），把监听器收到的事件与之匹配，只让真实用户输入通过。
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# 设备方法 -> (按钮, 是否按下)
+BUTTON_OPS: Dict[str, Tuple[str, bool]] = {
+    "LeftDown": ("left", True),
+    "LeftUp": ("left", False),
+    "RightDown": ("right", True),
+    "RightUp": ("right", False),
+    "MiddleDown": ("middle", True),
+    "MiddleUp": ("middle", False),
+}
+# 按键设备方法 -> 是否按下（按键名在参数中）
+KEY_OPS: Dict[str, bool] = {"KeyDown": True, "KeyUp": False}
+
+
+def key_button(name: str) -> str:
+    """按键名 -> 过滤器中的按钮名（"key:" + 小写按键名），监听器和设备命令的大小写可能不同"""
+    return f"key:{name.casefold()}"
+
+
+class SyntheticEventFilter:
+    """
+    合成事件过滤器
+    每个 (按钮, 方向) 一个有界环形队列，按发出顺序保存合成事件的时间戳。
+    监听器事件到达时，先淘汰超出容差窗口的旧记录，再与最早的一条记录匹配，
+    匹配成功即视为连点器自己的事件并抑制。匹配代价为 O(1) 均摊。
+    """
+
+    def __init__(self, capacity: int = 256, tolerance: float = 0.05, early_slack: float = 0.001):
+        """
+        :param capacity: 每个 (按钮, 方向) 最多保存的待匹配合成事件数
+        :param tolerance: 合成事件发出后，监听器事件允许的最大到达延迟(秒)
+        :param early_slack: 允许监听器事件时间戳早于发出时间的量(秒)，吸收时钟读取顺序误差
+        """
+        self.capacity = capacity
+        self.tolerance_ns = int(tolerance * 1e9)
+        self.early_slack_ns = int(early_slack * 1e9)
+        self.enabled = True
+        self._pending: Dict[Tuple[str, bool], deque] = {
+            key: deque(maxlen=capacity) for key in BUTTON_OPS.values()
+        }
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """清空计数"""
+        self.expected_count = 0    # 记录的合成事件数
+        self.suppressed_count = 0  # 与合成事件匹配、被抑制的监听器事件数
+        self.unmatched_count = 0   # 未匹配、作为真实用户输入放行的监听器事件数
+        self.expired_count = 0     # 在容差窗口内没有被监听器看到的合成事件数
+
+    def record(self, button: str, pressed: bool, timestamp_ns: int = 0):
+        """
+        记录一个即将发出的合成事件
+        :param button: "left"/"right"/"middle" 或 key_button(按键名)
+        :param pressed: True 为按下，False 为松开
+        :param timestamp_ns: 发出时间（time.perf_counter_ns），默认取当前时间
+        """
+        queue = self._pending.get((button, pressed))
+        if queue is None:
+            if not button.startswith("key:"):
+                return
+            # 按键的队列在第一次发出该按键时创建
+            with self._lock:
+                queue = self._pending.setdefault((button, pressed), deque(maxlen=self.capacity))
+        with self._lock:
+            if len(queue) == self.capacity:
+                self.expired_count += 1
+            queue.append(timestamp_ns or time.perf_counter_ns())
+            self.expected_count += 1
+
+    def on_device_command(self, op: str, args: tuple, timestamp_ns: int):
+        """设备线程命令钩子：在按钮类设备方法执行前记录合成事件"""
+        event = BUTTON_OPS.get(op)
+        if event is not None:
+            self.record(event[0], event[1], timestamp_ns)
+        elif op in KEY_OPS and args:
+            self.record(key_button(str(args[0])), KEY_OPS[op], timestamp_ns)
+
+    def is_synthetic(self, button: str, pressed: bool, timestamp_ns: int = 0) -> bool:
+        """
+        判断监听器收到的事件是否为连点器自己发出的
+        :param button: "left"/"right"/"middle" 或 key_button(按键名)
+        :param pressed: True 为按下，False 为松开
+        :param timestamp_ns: 监听器收到事件的时间（time.perf_counter_ns），默认取当前时间
+        :return: 是合成事件（应忽略）返回True，是真实用户输入返回False
+        """
+        if not self.enabled:
+            return False
+        queue = self._pending.get((button, pressed))
+        if queue is None:
+            return False
+        now = timestamp_ns or time.perf_counter_ns()
+        oldest_allowed = now - self.tolerance_ns
+        with self._lock:
+            while queue and queue[0] < oldest_allowed:
+                queue.popleft()
+                self.expired_count += 1
+            if queue and queue[0] <= now + self.early_slack_ns:
+                queue.popleft()
+                self.suppressed_count += 1
+                return True
+            self.unmatched_count += 1
+            return False
+
+    def clear(self):
+        """丢弃所有待匹配的合成事件（连点会话结束较久后调用）"""
+        with self._lock:
+            for queue in self._pending.values():
+                queue.clear()
+
+    def get_stats(self) -> dict:
+        """获取过滤计数"""
+        return {
+            'enabled': self.enabled,
+            'expected': self.expected_count,
+            'suppressed': self.suppressed_count,
+            'unmatched': self.unmatched_count,
+            'expired': self.expired_count,
+            'pending': sum(len(queue) for queue in self._pending.values()),
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    print("=== 合成事件过滤测试 - subLD ===")
+    event_filter = SyntheticEventFilter(tolerance=0.02)
+    t0 = time.perf_counter_ns()
+    # 连点器发出按下/松开，监听器2ms后看到
+    for i in range(5):
+        event_filter.record("left", True, t0 + i * 10_000_000)
+        event_filter.record("left", False, t0 + i * 10_000_000 + 5_000_000)
+    for i in range(5):
+        assert event_filter.is_synthetic("left", True, t0 + i * 10_000_000 + 2_000_000)
+        assert event_filter.is_synthetic("left", False, t0 + i * 10_000_000 + 7_000_000)
+    # 用户真实松开
+    assert not event_filter.is_synthetic("left", False, t0 + 60_000_000)
+    print(event_filter.get_stats())
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+定时命令引擎 - subLD项目
+按时间顺序执行预约的设备命令，按下/松开不再阻塞调用线程
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from clicker_log import get_logger
+
+logger = get_logger("timing_engine")
+
+_NS_PER_SEC = 1_000_000_000
+
+# _execute() 在命令抛出异常时的返回值
+FAILED = object()
+
+
+class TimedCommandEngine:
+    """
+    基于最小堆的定时命令引擎
+    调用方把 (执行时间, 命令, 参数) 追加到无锁收件箱（deque）后立即返回，
+    引擎线程把收件箱搬进最小堆，并在到期时依次执行。
+    到期时间相同的命令按提交顺序执行。
+    """
+
+    def __init__(self, spin_threshold: float = 0.001, name: str = "subLD-timing"):
+        """
+        初始化引擎
+        :param spin_threshold: 到期前改为自旋等待的时间(秒)
+        :param name: 引擎线程名称
+        """
+        self.spin_threshold_ns = int(spin_threshold * _NS_PER_SEC)
+        self.name = name
+        self._inbox = deque()
+        self._heap = []
+        self._seq = itertools.count()
+        self._wake = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._busy = False
+        self._drain_on_stop = True
+
+        # 统计与错误
+        self.executed_count = 0
+        self.error_count = 0
+        self.last_error = None
+        self._unread_errors = 0
+        self._error_lock = threading.Lock()
+
+    # ==================== 生命周期 ====================
+
+    def start(self):
+        """启动引擎线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._thread_main, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain: bool = True, timeout: float = 1.0):
+        """
+        停止引擎线程
+        :param drain: 为True时立即按顺序执行所有未到期的命令（保证按下的键被松开）
+        :param timeout: 等待线程结束的超时时间(秒)
+        """
+        if not self._running:
+            return
+        self._drain_on_stop = drain
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    # ==================== 提交命令 ====================
+
+    def schedule(self, due_ns: int, fn: Any, *args, future: Optional[Future] = None):
+        """
+        预约在指定时间执行命令
+        :param due_ns: 执行时间（time.perf_counter_ns 时间基准）
+        :param fn: 要执行的命令（函数，或由子类解析的命令名）
+        :param args: 命令参数
+        :param future: 可选，执行结果/异常写入该 Future
+        """
+        self._inbox.append((due_ns, next(self._seq), fn, args, future))
+        self._wake.set()
+
+    def submit(self, fn: Any, *args) -> Future:
+        """
+        提交一条立即执行的命令
+        :return: 命令结果的 Future
+        """
+        future = Future()
+        self.schedule(0, fn, *args, future=future)
+        return future
+
+    def schedule_batch(self, items: Iterable[Tuple[int, Any, tuple]]):
+        """
+        批量预约命令（不返回结果），只唤醒一次引擎线程
+        :param items: (执行时间ns, 命令, 参数元组) 的序列
+        """
+        seq = self._seq
+        self._inbox.extend((due_ns, next(seq), fn, args, None) for due_ns, fn, args in items)
+        self._wake.set()
+
+    def submit_batch(self, commands: Iterable[Tuple[Any, tuple]]) -> List[Future]:
+        """
+        批量提交立即执行的命令，按顺序执行
+        :param commands: (命令, 参数元组) 的序列
+        :return: 与命令一一对应的 Future 列表
+        """
+        seq = self._seq
+        futures = []
+        items = []
+        for fn, args in commands:
+            future = Future()
+            futures.append(future)
+            items.append((0, next(seq), fn, args, future))
+        self._inbox.extend(items)
+        self._wake.set()
+        return futures
+
+    def pending(self) -> int:
+        """尚未执行的命令数量"""
+        return len(self._inbox) + len(self._heap)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有已提交的命令执行完毕
+        :param timeout: 超时时间(秒)，None表示一直等待
+        :return: 全部执行完毕返回True
+        """
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: not self._inbox and not self._heap and not self._busy, timeout)
+
+    def consume_errors(self) -> int:
+        """
+        读取并清零自上次调用以来无 Future 命令的执行失败次数
+        :return: 失败次数
+        """
+        with self._error_lock:
+            count = self._unread_errors
+            self._unread_errors = 0
+            return count
+
+    # ==================== 引擎线程 ====================
+
+    def _thread_main(self):
+        """引擎线程入口，子类可在此前后做线程相关的初始化/清理"""
+        self._run()
+
+    def _resolve(self, fn: Any) -> Callable:
+        """把命令解析为可调用对象，子类可覆盖"""
+        return fn
+
+    def _run(self):
+        """引擎主循环"""
+        inbox = self._inbox
+        heap = self._heap
+        wake = self._wake
+        spin_ns = self.spin_threshold_ns
+        while self._running:
+            wake.clear()
+            if inbox:
+                self._busy = True
+                while inbox:
+                    heapq.heappush(heap, inbox.popleft())
+            if not heap:
+                if self._busy:
+                    with self._idle:
+                        self._busy = bool(inbox)
+                        self._idle.notify_all()
+                wake.wait()
+                continue
+            wait_ns = heap[0][0] - time.perf_counter_ns()
+            if wait_ns > spin_ns:
+                wake.wait((wait_ns - spin_ns) / _NS_PER_SEC)
+                continue
+
+            self._busy = True
+            due_ns, _, fn, args, future = heapq.heappop(heap)
+            while time.perf_counter_ns() < due_ns:
+                time.sleep(0)  # 自旋时让出GIL，避免饿死其他线程
+            self._execute_safely(fn, args, future)
+
+        # 停止：按顺序执行或丢弃剩余命令
+        while inbox:
+            heapq.heappush(heap, inbox.popleft())
+        drain = self._drain_on_stop
+        while heap:
+            _, _, fn, args, future = heapq.heappop(heap)
+            if drain:
+                self._execute_safely(fn, args, future)
+            elif future is not None:
+                future.cancel()
+        with self._idle:
+            self._busy = False
+            self._idle.notify_all()
+
+    def _execute_safely(self, fn: Any, args: tuple, future: Optional[Future]):
+        """执行命令；子类的钩子等抛出的意外异常只记录日志，引擎线程继续运行"""
+        try:
+            self._execute(fn, args, future)
+        except Exception as e:
+            logger.error("❌ 引擎执行命令时出错: %s", e)
+            if future is not None and not future.done():
+                future.set_exception(e)
+
+    def _execute(self, fn: Any, args: tuple, future: Optional[Future]) -> Any:
+        """
+        执行单条命令，结果写入 Future，无 Future 时记录错误
+        :return: 命令返回值；抛出异常时返回 FAILED
+        """
+        try:
+            result = self._resolve(fn)(*args)
+        except Exception as e:
+            with self._error_lock:
+                self.error_count += 1
+                self.last_error = e
+                if future is None:
+                    self._unread_errors += 1
+            if future is not None:
+                future.set_exception(e)
+            else:
+                logger.error("❌ 定时命令执行失败: %s", e)
+            return FAILED
+        self.executed_count += 1
+        if future is not None:
+            future.set_result(result)
+        return result
+
+
+class ButtonChannel:
+    """
+    单个按键/按钮的按下-松开时序通道
+    每次点击被拆成"按下"和"按住时长后松开"两条定时命令。
+    同一通道的下一次按下排在上一次松开之后，不同通道互不阻塞。
+    """
+
+    def __init__(self, engine: TimedCommandEngine, down: Any, up: Any,
+                 hold: float = 0.01, release_gap: float = 0.0, min_hold: float = 0.001,
+                 compress_hold: bool = False):
+        """
+        :param engine: 定时命令引擎
+        :param down: 按下命令
+        :param up: 松开命令
+        :param hold: 按住时长(秒)
+        :param release_gap: 松开到下一次按下之间的最小间隔(秒)
+        :param min_hold: 允许压缩时按住时长的下限(秒)
+        :param compress_hold: 点击请求间隔不足两倍按住时长时，是否把按住时长压缩为间隔的一半；
+                              不压缩时按住时长保持不变，点击顺延到上一次松开之后（速率被按住时长限制）
+        """
+        self.engine = engine
+        self.down = down
+        self.up = up
+        self.hold_ns = int(hold * _NS_PER_SEC)
+        self.release_gap_ns = int(release_gap * _NS_PER_SEC)
+        self.min_hold_ns = int(min_hold * _NS_PER_SEC)
+        self.compress_hold = compress_hold
+        # 统计：最近一次点击的实际按住时长、被压缩/被顺延的点击数
+        self.effective_hold_ns = self.hold_ns
+        self.compressed = 0
+        self.delayed = 0
+        self._warned = False
+        self._busy_until_ns = 0
+        self._last_request_ns = 0
+        self._lock = threading.Lock()
+
+    def set_hold(self, hold: float, compress: Optional[bool] = None):
+        """
+        设置按住时长
+        :param hold: 按住时长(秒)
+        :param compress: 是否允许压缩，None 表示不变
+        """
+        self.hold_ns = int(hold * _NS_PER_SEC)
+        if compress is not None:
+            self.compress_hold = compress
+        self._warned = False
+
+    def plan(self, args: tuple = (), at_ns: int = 0) -> Tuple[Tuple[int, Any, tuple], Tuple[int, Any, tuple]]:
+        """
+        规划一次点击但不提交，供调用方与其他命令合并为一批提交
+        :param args: 传给按下/松开命令的参数（如按键名）
+        :param at_ns: 期望的按下时间(ns)，0 表示立即
+        :return: (按下命令, 松开命令)，格式同 schedule_batch 的元素
+        """
+        now = at_ns or time.perf_counter_ns()
+        with self._lock:
+            # 允许压缩时，点击请求过密则压缩按住时长，避免积压无限增长；
+            # 按住时长不超过请求间隔的一半，松开到下一次按下之间始终留有真实的松开时间
+            hold = self.hold_ns
+            compressed = False
+            if self.compress_hold and self._last_request_ns:
+                spacing = now - self._last_request_ns - self.release_gap_ns
+                if spacing < 2 * hold:
+                    hold = max(self.min_hold_ns, spacing // 2)
+                    compressed = hold < self.hold_ns
+            self._last_request_ns = now
+
+            down_at = max(now, self._busy_until_ns + self.release_gap_ns)
+            up_at = down_at + hold
+            self._busy_until_ns = up_at
+            self.effective_hold_ns = hold
+            self.compressed += compressed
+            delayed = down_at > now
+            self.delayed += delayed
+            warn = (compressed or delayed) and not self._warned
+            if warn:
+                self._warned = True
+        if warn:
+            # 每次设置按住时长后只提示一次，详细计数见 get_stats()
+            if compressed:
+                logger.warning("⚠️ %s 点击过密，按住时长由 %.1f ms 压缩为 %.1f ms",
+                               self.down, self.hold_ns / 1e6, hold / 1e6)
+            else:
+                logger.warning("⚠️ %s 点击请求快于按住时长 %.1f ms 允许的速率，点击顺延到上一次松开之后",
+                               self.down, self.hold_ns / 1e6)
+        return (down_at, self.down, args), (up_at, self.up, args)
+
+    def click(self, args: tuple = (), at_ns: int = 0) -> int:
+        """
+        预约一次点击
+        :param args: 传给按下/松开命令的参数（如按键名）
+        :param at_ns: 期望的按下时间(ns)，0 表示立即
+        :return: 预约的按下时间(ns)
+        """
+        items = self.plan(args, at_ns)
+        self.engine.schedule_batch(items)
+        return items[0][0]
+
+    def get_stats(self) -> dict:
+        """
+        :return: {'hold_ms', 'effective_hold_ms', 'compress_hold', 'compressed', 'delayed'}
+        """
+        return {
+            'hold_ms': self.hold_ns / 1e6,
+            'effective_hold_ms': self.effective_hold_ns / 1e6,
+            'compress_hold': self.compress_hold,
+            'compressed': self.compressed,
+            'delayed': self.delayed,
+        }
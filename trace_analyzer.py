@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+设备命令追踪分析 - subLD项目
+用 NumPy 读取 device_trace.CommandTracer 写出的追踪文件，离线分析：
+  实际速率、按下间隔、抖动分位数、按住时长分布、设备调用耗时、连续失败（失败突发）
+指定 --diff 时对比两个追踪（如新旧版本各录一段），列出各项指标的变化。
+
+用法: python trace_analyzer.py trace.sldt [--diff old.sldt] [--button auto|left|right|middle|key:A]
+                              [--bins 10] [--min-burst 2] [--json]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from device_trace import (MAGIC, BLOCK_MAGIC, VERSION, COLUMNS, OP_OTHER, RESULT_OK, RESULT_ERROR,
+                          FILE_HEADER, BLOCK_HEADER)
+
+# 按钮 -> (按下命令, 松开命令)
+BUTTON_OPS = {
+    'left': ("LeftDown", "LeftUp"),
+    'right': ("RightDown", "RightUp"),
+    'middle': ("MiddleDown", "MiddleUp"),
+    'key': ("KeyDown", "KeyUp"),
+}
+PERCENTILES = (50, 90, 99)
+
+# 对比时列出的指标：(报告中的路径, 名称, 数值越大越好, 绝对噪声阈值)
+# 变化量不超过绝对阈值、或相对变化不超过 --noise-pct 时视为噪声，不标记变好/变差
+DIFF_METRICS = (
+    ("achieved_cps", "实际速率 CPS", True, 0.5),
+    ("gaps_ms.mean", "平均间隔 ms", None, 0.01),
+    ("gaps_ms.p99", "间隔 p99 ms", None, 0.05),
+    ("jitter_ms.p50", "抖动 p50 ms", False, 0.01),
+    ("jitter_ms.p90", "抖动 p90 ms", False, 0.02),
+    ("jitter_ms.p99", "抖动 p99 ms", False, 0.05),
+    ("jitter_ms.std", "间隔标准差 ms", False, 0.01),
+    ("hold_ms.p50", "按住 p50 ms", None, 0.01),
+    ("hold_ms.p99", "按住 p99 ms", None, 0.05),
+    ("call_us.p50", "设备调用 p50 µs", False, 1.0),
+    ("call_us.p99", "设备调用 p99 µs", False, 5.0),
+    ("failures.failed", "失败命令数", False, 0),
+    ("failures.bursts", "失败突发次数", False, 0),
+    ("failures.longest", "最长连续失败", False, 0),
+)
+# 默认相对噪声阈值(%)
+DEFAULT_NOISE_PCT = 2.0
+
+
+class Trace:
+    """一个追踪文件的全部记录（列式 NumPy 数组）"""
+
+    def __init__(self, path: str, meta: dict, strings: List[str], columns: Dict[str, np.ndarray],
+                 truncated: bool = False):
+        """
+        :param path: 文件路径
+        :param meta: 文件头元数据
+        :param strings: 字符串参数表
+        :param columns: 列名 -> 数组，见 device_trace.COLUMNS
+        :param truncated: 文件末尾是否有不完整的数据块（如程序异常退出）
+        """
+        self.path = path
+        self.meta = meta
+        self.ops: List[str] = list(meta.get('ops', ()))
+        self.strings = strings
+        self.columns = columns
+        self.truncated = truncated
+
+    def __len__(self) -> int:
+        return len(self.columns['t_ns'])
+
+    def op_code(self, name: str) -> int:
+        """命令名 -> 命令码，追踪中没有该命令时返回 OP_OTHER"""
+        return self.ops.index(name) if name in self.ops else OP_OTHER
+
+    def op_name(self, code: int) -> str:
+        return self.ops[code] if code < len(self.ops) else "other"
+
+    def string_index(self, text: str) -> int:
+        """字符串参数 -> 下标，追踪中没有时返回 -1"""
+        return self.strings.index(text) if text in self.strings else -1
+
+
+def load_trace(path: str) -> Trace:
+    """
+    读取追踪文件
+    :raises ValueError: 不是追踪文件或版本不支持
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"不是 subLD 追踪文件: {path}")
+    magic, version, meta_len = FILE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"不是 subLD 追踪文件: {path}")
+    if version != VERSION:
+        raise ValueError(f"不支持的追踪文件版本: {version}")
+    offset = FILE_HEADER.size
+    meta = json.loads(data[offset:offset + meta_len].decode("utf-8"))
+    offset += meta_len
+
+    strings: List[str] = []
+    parts: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+    record_size = sum(np.dtype(code).itemsize for _, code in COLUMNS)
+    truncated = False
+    while offset < len(data):
+        if len(data) - offset < BLOCK_HEADER.size:
+            truncated = True
+            break
+        magic, count, strings_len = BLOCK_HEADER.unpack_from(data, offset)
+        end = offset + BLOCK_HEADER.size + strings_len + count * record_size
+        if magic != BLOCK_MAGIC or end > len(data):
+            truncated = True
+            break
+        offset += BLOCK_HEADER.size
+        if strings_len:
+            strings.extend(json.loads(data[offset:offset + strings_len].decode("utf-8")))
+            offset += strings_len
+        for name, code in COLUMNS:
+            column = np.frombuffer(data, dtype=np.dtype(code).newbyteorder("<"), count=count, offset=offset)
+            parts[name].append(column)
+            offset += column.nbytes
+    columns = {name: (np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.dtype(code)))
+               for (name, code), chunks in zip(COLUMNS, parts.values())}
+    return Trace(path, meta, strings, columns, truncated)
+
+
+def _stats(values: np.ndarray) -> dict:
+    """数组的计数、均值、标准差、最值和分位数（空数组时数值为None）"""
+    result = {'count': int(len(values))}
+    keys = ['mean', 'std', 'min'] + [f"p{p}" for p in PERCENTILES] + ['max']
+    if not len(values):
+        result.update(dict.fromkeys(keys))
+        return result
+    quantiles = np.percentile(values, PERCENTILES)
+    result.update({'mean': float(values.mean()), 'std': float(values.std()), 'min': float(values.min())})
+    result.update({f"p{p}": float(q) for p, q in zip(PERCENTILES, quantiles)})
+    result['max'] = float(values.max())
+    return result
+
+
+def _histogram(values: np.ndarray, bins: int) -> List[Tuple[float, float, int]]:
+    """[(下界, 上界, 计数)]"""
+    if not len(values):
+        return []
+    counts, edges = np.histogram(values, bins=bins)
+    return [(float(edges[i]), float(edges[i + 1]), int(counts[i])) for i in range(len(counts))]
+
+
+def _pick_button(trace: Trace, button: str) -> Tuple[str, np.ndarray, np.ndarray]:
+    """
+    选出要分析的按钮的按下/松开记录
+    :param button: "left"/"right"/"middle"/"key:名称"，"auto" 表示按下次数最多的按钮
+    :return: (按钮名, 按下记录的布尔掩码, 松开记录的布尔掩码)
+    """
+    op = trace.columns['op']
+    a0 = trace.columns['a0']
+    if button == "auto":
+        candidates = ['left', 'right', 'middle']
+        for code in np.unique(a0[op == trace.op_code("KeyDown")]):
+            if 0 <= code < len(trace.strings):
+                candidates.append(f"key:{trace.strings[code]}")
+        best = max(candidates, key=lambda name: int(_pick_button(trace, name)[1].sum()))
+        return _pick_button(trace, best)
+    name, _, key = button.partition(":")
+    if name not in BUTTON_OPS:
+        raise ValueError(f"未知的按钮: {button}")
+    down, up = BUTTON_OPS[name]
+    down_mask = op == trace.op_code(down)
+    up_mask = op == trace.op_code(up)
+    if name == "key":
+        index = trace.string_index(key)
+        down_mask &= a0 == index
+        up_mask &= a0 == index
+    return button, down_mask, up_mask
+
+
+def _failure_runs(trace: Trace, min_burst: int) -> dict:
+    """连续失败（抛出异常或返回0）的命令段"""
+    t = trace.columns['t_ns']
+    dur = trace.columns['dur_ns']
+    result = trace.columns['result']
+    failed = result != RESULT_OK
+    edges = np.diff(np.concatenate(([0], failed.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    lengths = ends - starts
+    spans_ms = (t[ends - 1] + dur[ends - 1] - t[starts]) / 1e6 if len(starts) else np.zeros(0)
+    bursts = np.flatnonzero(lengths >= min_burst)
+    origin = t[0] if len(t) else 0
+    worst = bursts[np.argsort(lengths[bursts])[::-1][:5]]
+    return {
+        'failed': int(failed.sum()),
+        'errors': int((result == RESULT_ERROR).sum()),
+        'runs': int(len(starts)),
+        'bursts': int(len(bursts)),
+        'longest': int(lengths.max()) if len(lengths) else 0,
+        'longest_ms': float(spans_ms.max()) if len(spans_ms) else 0.0,
+        'worst': [{'at_s': float((t[starts[i]] - origin) / 1e9), 'length': int(lengths[i]),
+                   'span_ms': float(spans_ms[i]), 'op': trace.op_name(int(trace.columns['op'][starts[i]]))}
+                  for i in worst],
+    }
+
+
+def analyze(trace: Trace, button: str = "auto", bins: int = 10, min_burst: int = 2) -> dict:
+    """
+    分析一个追踪
+    :param trace: load_trace() 的结果
+    :param button: 分析间隔和按住时长的按钮，见 _pick_button
+    :param bins: 按住时长直方图的分组数
+    :param min_burst: 连续失败多少条算一次失败突发
+    :return: 报告字典（可直接输出为JSON）
+    """
+    t = trace.columns['t_ns']
+    dur = trace.columns['dur_ns']
+    op = trace.columns['op']
+    span_s = float((t[-1] + dur[-1] - t[0]) / 1e9) if len(t) else 0.0
+    codes, counts = np.unique(op, return_counts=True)
+    by_op = {trace.op_name(int(code)): int(count) for code, count in zip(codes, counts)}
+
+    name, down_mask, up_mask = _pick_button(trace, button) if len(t) else (button, op == 0, op == 0)
+    downs = t[down_mask]
+    ups = t[up_mask]
+    clicks = len(downs)
+    achieved = (clicks - 1) / ((downs[-1] - downs[0]) / 1e9) if clicks > 1 and downs[-1] > downs[0] else 0.0
+
+    # 间隔与抖动：抖动为每个间隔与间隔中位数之差的绝对值
+    gaps = np.diff(downs) / 1e6
+    jitter = np.abs(gaps - np.median(gaps)) if len(gaps) else gaps
+    jitter_stats = _stats(jitter)
+    jitter_stats['std'] = float(gaps.std()) if len(gaps) else None
+
+    # 按住时长：每次按下配对其后第一次松开
+    hold = np.zeros(0)
+    if clicks and len(ups):
+        index = np.searchsorted(ups, downs, side="left")
+        valid = index < len(ups)
+        hold = (ups[index[valid]] - downs[valid]) / 1e6
+
+    click_mask = down_mask | up_mask
+    by_op_call = {}
+    for code in codes:
+        by_op_call[trace.op_name(int(code))] = _stats(dur[op == code] / 1e3)
+
+    return {
+        'path': trace.path,
+        'backend': trace.meta.get('backend'),
+        'truncated': trace.truncated,
+        'commands': len(trace),
+        'span_s': span_s,
+        'by_op': by_op,
+        'button': name,
+        'clicks': clicks,
+        'achieved_cps': float(achieved),
+        'gaps_ms': _stats(gaps),
+        'jitter_ms': jitter_stats,
+        'hold_ms': _stats(hold),
+        'hold_histogram': _histogram(hold, bins),
+        'call_us': _stats(dur[click_mask] / 1e3),
+        'call_us_by_op': by_op_call,
+        'failures': _failure_runs(trace, min_burst),
+    }
+
+
+def _lookup(report: dict, path: str) -> Optional[float]:
+    value = report
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def diff_reports(old: dict, new: dict, noise_pct: float = DEFAULT_NOISE_PCT) -> List[dict]:
+    """
+    对比两个报告
+    :param noise_pct: 相对噪声阈值(%)，相对变化不超过它的视为噪声
+    :return: [{'metric', 'name', 'old', 'new', 'delta', 'change_pct', 'significant', 'better'}]，
+             significant 表示变化超过绝对和相对噪声阈值；
+             better 为 True/False 表示变好/变差，变化不显著或无法判断时为 None
+    """
+    rows = []
+    for path, name, higher_is_better, noise_abs in DIFF_METRICS:
+        a = _lookup(old, path)
+        b = _lookup(new, path)
+        delta = change = better = None
+        significant = False
+        if a is not None and b is not None:
+            delta = b - a
+            change = delta / a * 100 if a else None
+            # 旧值为0时相对变化无意义，只看绝对阈值
+            significant = abs(delta) > noise_abs and (change is None or abs(change) > noise_pct)
+            if higher_is_better is not None and significant:
+                better = (delta > 0) == higher_is_better
+        rows.append({'metric': path, 'name': name, 'old': a, 'new': b, 'delta': delta,
+                     'change_pct': change, 'significant': significant, 'better': better})
+    return rows
+
+
+def _fmt(value, digits: int = 3) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, int):
+        return str(value)
+    return f"{value:.{digits}f}"
+
+
+def format_report(report: dict) -> str:
+    """报告转为文本"""
+    lines = [f"📼 追踪: {report['path']}（{report['backend'] or '未知后端'}）"]
+    if report['truncated']:
+        lines.append("⚠️ 文件末尾的数据块不完整，已忽略")
+    lines.append(f"命令: {report['commands']} 条，时长 {report['span_s']:.3f} 秒")
+    lines.append("  " + ", ".join(f"{op} {count}" for op, count in report['by_op'].items()))
+    lines.append(f"按钮 {report['button']}: 点击 {report['clicks']} 次，实际速率 {report['achieved_cps']:.1f} CPS")
+
+    def stats_line(title: str, stats: dict, unit: str) -> str:
+        quantiles = "  ".join(f"p{p} {_fmt(stats[f'p{p}'])}" for p in PERCENTILES)
+        return (f"{title}（{unit}）: 平均 {_fmt(stats['mean'])}  标准差 {_fmt(stats['std'])}  "
+                f"最小 {_fmt(stats['min'])}  {quantiles}  最大 {_fmt(stats['max'])}")
+
+    lines.append(stats_line("间隔", report['gaps_ms'], "ms"))
+    lines.append(stats_line("抖动", report['jitter_ms'], "ms"))
+    lines.append(stats_line("按住时长", report['hold_ms'], "ms"))
+    histogram = report['hold_histogram']
+    if histogram:
+        peak = max(count for _, _, count in histogram) or 1
+        for low, high, count in histogram:
+            lines.append(f"  {low:8.3f} - {high:8.3f} ms | {'█' * round(count / peak * 40):<40} {count}")
+    lines.append(stats_line("设备调用", report['call_us'], "µs"))
+
+    failures = report['failures']
+    lines.append(f"失败: {failures['failed']} 条（异常 {failures['errors']}），连续失败段 {failures['runs']}，"
+                 f"失败突发 {failures['bursts']}，最长 {failures['longest']} 条 / {failures['longest_ms']:.1f} ms")
+    for burst in failures['worst']:
+        lines.append(f"  {burst['at_s']:9.3f} 秒: 连续 {burst['length']} 条失败，"
+                     f"持续 {burst['span_ms']:.1f} ms（从 {burst['op']} 开始）")
+    return "\n".join(lines)
+
+
+def format_diff(old: dict, new: dict, rows: List[dict]) -> str:
+    """对比结果转为文本"""
+    lines = [f"旧: {old['path']}", f"新: {new['path']}",
+             f"{'指标':<16}{'旧':>12}{'新':>12}{'变化':>12}{'变化%':>10}"]
+    for row in rows:
+        mark = {True: " ✅", False: " ⚠️", None: ""}[row['better']]
+        lines.append(f"{row['name']:<16}{_fmt(row['old']):>12}{_fmt(row['new']):>12}"
+                     f"{_fmt(row['delta']):>12}{_fmt(row['change_pct'], 1):>10}{mark}")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="subLD 设备命令追踪分析")
+    parser.add_argument("trace", help="追踪文件（--trace 或 GhostMouse.start_trace 生成）")
+    parser.add_argument("--diff", default=None, metavar="旧追踪", help="与另一个追踪对比（作为基准）")
+    parser.add_argument("--button", default="auto", help="分析的按钮：auto/left/right/middle/key:按键名")
+    parser.add_argument("--bins", type=int, default=10, help="按住时长直方图分组数")
+    parser.add_argument("--min-burst", type=int, default=2, help="连续失败多少条算一次失败突发")
+    parser.add_argument("--noise-pct", type=float, default=DEFAULT_NOISE_PCT,
+                        help="对比时的相对噪声阈值(%%)，不超过它的变化不标记变好/变差")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        report = analyze(load_trace(args.trace), args.button, args.bins, args.min_burst)
+        old = analyze(load_trace(args.diff), args.button, args.bins, args.min_burst) if args.diff else None
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if old is None:
+        print(json.dumps(report, indent=2, ensure_ascii=False) if args.json else format_report(report))
+        return 0
+    rows = diff_reports(old, report, args.noise_pct)
+    if args.json:
+        print(json.dumps({'old': old, 'new': report, 'diff': rows}, indent=2, ensure_ascii=False))
+    else:
+        print(format_report(old))
+        print()
+        print(format_report(report))
+        print()
+        print(format_diff(old, report, rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
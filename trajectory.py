@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+鼠标轨迹生成模块 - subLD项目
+用 NumPy 批量生成平滑的拟人轨迹（贝塞尔曲线或最小加加速度直线，带噪声、过冲和速度曲线），
+量化为带误差累积的整数相对位移，编译为宏程序后以固定设备更新频率通过 MoveR 流式发送。
+"""
+import math
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from macro import MacroProgram, OP_MOVE_R
+
+# 路径形状
+SHAPE_BEZIER = "bezier"      # 三次贝塞尔曲线，控制点随机偏离直线
+SHAPE_MIN_JERK = "minjerk"   # 直线路径，最小加加速度时间曲线
+SHAPES = (SHAPE_BEZIER, SHAPE_MIN_JERK)
+
+# 速度曲线：进度 u∈[0,1] -> 路径参数 s∈[0,1]
+PROFILE_MIN_JERK = "minjerk"
+PROFILE_LINEAR = "linear"
+PROFILE_EASE_OUT = "ease_out"
+PROFILE_EASE_IN_OUT = "ease_in_out"
+
+
+def _min_jerk(u: np.ndarray) -> np.ndarray:
+    return u * u * u * (10.0 - 15.0 * u + 6.0 * u * u)
+
+
+SPEED_PROFILES = {
+    PROFILE_MIN_JERK: _min_jerk,
+    PROFILE_LINEAR: lambda u: u,
+    PROFILE_EASE_OUT: lambda u: 1.0 - (1.0 - u) ** 3,
+    PROFILE_EASE_IN_OUT: lambda u: 0.5 - 0.5 * np.cos(np.pi * u),
+}
+
+
+def fitts_duration(distance: float, target_width: float = 20.0,
+                   a: float = 0.08, b: float = 0.12) -> float:
+    """
+    按费茨定律估算移动时长
+    :param distance: 移动距离(像素)
+    :param target_width: 目标宽度(像素)
+    :param a: 固定开销(秒)
+    :param b: 每比特难度的耗时(秒)
+    :return: 时长(秒)
+    """
+    return a + b * math.log2(1.0 + distance / target_width)
+
+
+def quantize_deltas(points: np.ndarray) -> np.ndarray:
+    """
+    把浮点位置序列量化为整数相对位移，舍入误差累积到后续步（不会漂移）
+    :param points: (..., n, 2) 相对起点的位置
+    :return: 同形状的 int32 位移，逐步累加等于 round(points)
+    """
+    rounded = np.rint(points).astype(np.int64)
+    deltas = np.diff(rounded, axis=-2, prepend=np.zeros_like(rounded[..., :1, :]))
+    return deltas.astype(np.int32)
+
+
+class TrajectoryGenerator:
+    """
+    拟人轨迹生成器
+    同一路线一次批量生成多条变体（形状 (variants, n, 2) 的数组运算），量化并编译为宏程序后缓存；
+    重复路线轮流使用缓存的变体，回放循环每步只是数组下标访问。
+    """
+
+    def __init__(self, rate_hz: float = 250.0, shape: str = SHAPE_BEZIER,
+                 profile: str = PROFILE_MIN_JERK, curvature: float = 0.15,
+                 noise: float = 1.0, overshoot: float = 0.04, variants: int = 4,
+                 cache_size: int = 128, seed: Optional[int] = None):
+        """
+        :param rate_hz: 设备更新频率（每秒发送的 MoveR 次数上限）
+        :param shape: 路径形状，SHAPE_BEZIER 或 SHAPE_MIN_JERK
+        :param profile: 速度曲线名，见 SPEED_PROFILES
+        :param curvature: 贝塞尔控制点偏离直线的最大比例（相对距离）
+        :param noise: 垂直于路径的平滑噪声幅度(像素)，两端为0
+        :param overshoot: 过冲比例（相对距离），0 表示不过冲
+        :param variants: 每条路线预生成的变体数
+        :param cache_size: 最多缓存的路线数
+        :param seed: 随机数种子
+        """
+        if shape not in SHAPES:
+            raise ValueError(f"未知的路径形状: {shape}")
+        if profile not in SPEED_PROFILES:
+            raise ValueError(f"未知的速度曲线: {profile}")
+        self.rate_hz = rate_hz
+        self.shape = shape
+        self.profile = profile
+        self.curvature = curvature
+        self.noise = noise
+        self.overshoot = overshoot
+        self.variants = max(1, variants)
+        self.cache_size = cache_size
+        self.rng = np.random.default_rng(seed)
+        # 路线键 -> [变体宏程序列表, 下一个变体下标]
+        self._cache: "OrderedDict[tuple, list]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # ==================== 路径生成 ====================
+
+    def generate(self, dx: float, dy: float, duration: Optional[float] = None,
+                 count: int = 1) -> np.ndarray:
+        """
+        批量生成浮点路径
+        :param dx: 目标X偏移(像素)
+        :param dy: 目标Y偏移(像素)
+        :param duration: 移动时长(秒)，None 按费茨定律估算
+        :param count: 生成的变体数
+        :return: (count, n, 2) 相对起点的位置，第 i 个点对应第 i 个设备更新周期，最后一点为 (dx, dy)
+        """
+        distance = math.hypot(dx, dy)
+        if duration is None:
+            duration = fitts_duration(distance)
+        steps = max(1, int(math.ceil(duration * self.rate_hz)))
+        u = np.arange(1, steps + 1, dtype=np.float64) / steps        # (n,)
+        end = np.array([dx, dy], dtype=np.float64)
+        if distance == 0:
+            return np.zeros((count, steps, 2))
+
+        direction = end / distance
+        normal = np.array([-direction[1], direction[0]])
+        rng = self.rng
+
+        if self.overshoot > 0 and distance > 1:
+            # 主段冲过目标，再用约15%的时间修正回来
+            over = distance * self.overshoot * rng.uniform(0.5, 1.0, count)
+            target = end + over[:, None] * direction                  # (count, 2)
+            main_steps = max(1, int(round(steps * 0.85)))
+        else:
+            target = np.broadcast_to(end, (count, 2))
+            main_steps = steps
+
+        s = SPEED_PROFILES[self.profile](np.arange(1, main_steps + 1) / main_steps)
+        if self.shape == SHAPE_BEZIER:
+            # 控制点位于 1/3、2/3 处并沿法线随机偏移
+            bend = rng.uniform(-self.curvature, self.curvature, (count, 2)) * distance
+            p1 = target / 3.0 + bend[:, :1] * normal
+            p2 = target * (2.0 / 3.0) + bend[:, 1:] * normal
+            s1 = (1.0 - s)[None, :, None]
+            s2 = s[None, :, None]
+            main = (3.0 * s1 * s1 * s2 * p1[:, None, :]
+                    + 3.0 * s1 * s2 * s2 * p2[:, None, :]
+                    + s2 * s2 * s2 * target[:, None, :])
+        else:
+            main = s[None, :, None] * target[:, None, :]
+
+        if main_steps < steps:
+            tail_steps = steps - main_steps
+            c = _min_jerk(np.arange(1, tail_steps + 1) / tail_steps)[None, :, None]
+            last = main[:, -1:, :]
+            tail = last + c * (end - last)
+            path = np.concatenate([main, tail], axis=1)
+        else:
+            path = main
+
+        if self.noise > 0 and steps > 2:
+            # 在少量锚点上取随机值并线性插值得到平滑噪声，用 sin 包络使两端为0
+            anchors = max(2, steps // 8)
+            knots = rng.normal(0.0, self.noise, (count, anchors))
+            grid = np.linspace(0.0, 1.0, anchors)
+            wobble = np.stack([np.interp(u, grid, k) for k in knots])
+            wobble *= np.sin(np.pi * u)
+            path = path + wobble[:, :, None] * normal
+
+        path[:, -1, :] = end
+        return path
+
+    def compile(self, deltas: np.ndarray) -> MacroProgram:
+        """
+        把一条量化后的位移序列编译为宏程序，零位移的周期不发送
+        :param deltas: (n, 2) int32 位移，第 i 步在 i/rate_hz 秒发送
+        """
+        period_ns = 1e9 / self.rate_hz
+        moving = np.flatnonzero(np.any(deltas != 0, axis=1))
+        program = MacroProgram()
+        program.ops = array('B', bytes([OP_MOVE_R]) * len(moving))
+        program.arg_a = array('i', deltas[moving, 0].astype(np.int32).tobytes())
+        program.arg_b = array('i', deltas[moving, 1].astype(np.int32).tobytes())
+        program.times = array('q', np.rint(moving * period_ns).astype(np.int64).tobytes())
+        return program
+
+    # ==================== 缓存 ====================
+
+    def route(self, dx: int, dy: int, duration: Optional[float] = None) -> MacroProgram:
+        """
+        获取一条路线的宏程序（缓存命中时轮流返回预生成的变体）
+        :param dx: 目标X偏移(像素)
+        :param dy: 目标Y偏移(像素)
+        :param duration: 移动时长(秒)，None 按费茨定律估算
+        :return: 只包含 MoveR 事件的宏程序
+        """
+        key = (int(dx), int(dy), duration)
+        entry = self._cache.get(key)
+        if entry is None:
+            self.cache_misses += 1
+            paths = self.generate(dx, dy, duration, count=self.variants)
+            deltas = quantize_deltas(paths)
+            entry = [[self.compile(d) for d in deltas], 0]
+            self._cache[key] = entry
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+        programs, index = entry
+        entry[1] = (index + 1) % len(programs)
+        return programs[index]
+
+    def clear_cache(self):
+        """清空路线缓存"""
+        self._cache.clear()
+
+    def get_stats(self) -> dict:
+        """缓存统计"""
+        return {
+            'routes': len(self._cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'rate_hz': self.rate_hz,
+        }
+
+
+def path_endpoint(program: MacroProgram) -> Tuple[int, int]:
+    """宏程序中所有 MoveR 位移之和（用于校验量化没有漂移）"""
+    return sum(program.arg_a), sum(program.arg_b)
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    print("=== 轨迹生成测试 - subLD ===")
+    generator = TrajectoryGenerator(seed=1)
+    start = time.perf_counter()
+    for i in range(100):
+        generator.route(300 + i, -150, duration=0.4)
+    elapsed = time.perf_counter() - start
+    print(f"生成 100 条路线 x {generator.variants} 个变体: {elapsed * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    for i in range(10000):
+        program = generator.route(300 + i % 100, -150, duration=0.4)
+    print(f"缓存命中 10000 次: {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert path_endpoint(program) == (300 + 9999 % 100, -150)
+    print(f"事件数: {len(program)}, 时长: {program.duration_ns / 1e6:.1f} ms, 统计: {generator.get_stats()}")